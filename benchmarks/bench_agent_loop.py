@@ -0,0 +1,223 @@
+"""
+Benchmark of the whole agent loop, run offline against FakeClient. Every run replays a session on a fresh copy of the
+calculator working directory and reports:
+- Per-turn overhead: time the agent spends between API responses that is not spent waiting on tools
+- Tool latency: time spent running the function calls of each turn
+- Size of the conversation sent with each request, and how much it grows per turn
+- Peak memory allocated by Python during the run
+
+Results can be saved as a baseline and later runs compared against it:
+python -m benchmarks.bench_agent_loop --save baseline.json
+python -m benchmarks.bench_agent_loop --compare baseline.json
+A live session can be recorded with --record session.json "prompt" (needs GEMINI_API_KEY) and replayed with
+--session session.json.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import functions.get_agent_response
+from benchmarks.fake_client import FakeClient, RecordingClient, load_session
+from functions.call_function import use_working_directory
+from functions.get_agent_response import get_agent_response
+from functions.workspace import close_workspace
+
+
+# Session replayed when no --session is given, a typical investigate, reproduce, fix and verify loop
+DEFAULT_SESSION = {
+    "prompt": "fix the bug: 3 + 7 * 2 shouldn't be 20",
+    "turns": [
+        {"function_calls": [
+            {"name": "get_files_info", "args": {"directory": ".", "recursive": True}},
+            {"name": "search_files", "args": {"query": "precedence"}},
+        ]},
+        {"function_calls": [{"name": "get_file_content", "args": {"file_path": "pkg/calculator.py"}}]},
+        {"function_calls": [{"name": "run_python_file", "args": {"file_path": "main.py", "args": ["3 + 7 * 2"]}}]},
+        {"text": "Operator precedence is handled correctly, the comment about it is missing.",
+         "function_calls": [{"name": "edit_file", "args": {"file_path": "pkg/calculator.py", "edits": [
+             {"old_text": '            "/": 2,\n', "new_text": '            "/": 2,  # Applied before + and -\n'}
+         ]}}]},
+        {"function_calls": [{"name": "run_python_file", "args": {"file_path": "tests.py"}}]},
+        {"function_calls": [{"name": "get_file_content", "args": {"file_path": "pkg/calculator.py"}}]},
+        {"text": "3 + 7 * 2 evaluates to 17 and all tests pass."},
+    ],
+}
+
+# Metrics compared against a baseline, and how much worse (as a fraction) they may get before being reported
+TOLERANCES = {
+    "turn_overhead_ms": 0.25,
+    "tool_latency_ms": 0.25,
+    "final_prompt_chars": 0.05,
+    "peak_memory_kb": 0.25,
+}
+
+
+def run_session(session, latency, stream, trace_memory=False):
+    """
+    Runs the agent loop once against a fake client, in a temporary copy of the calculator directory
+    :param session: Session dictionary to replay
+    :param latency: Seconds the fake client waits before every response
+    :param stream: True to use the streaming agent loop
+    :param trace_memory: True to measure peak memory, which slows everything else down so timings are left out
+    :return: Dictionary of measurements from the run
+    """
+
+    client = FakeClient(session, latency=latency)
+    tool_times = []
+    call_functions = functions.get_agent_response.call_functions
+
+    def timed_call_functions(function_calls, verbose=False):
+        start = time.perf_counter()
+        results = call_functions(function_calls, verbose)
+        tool_times.append(time.perf_counter() - start)
+        return results
+
+    args = argparse.Namespace(user_prompt=session["prompt"], verbose=False, stream=stream)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        working_directory = shutil.copytree("calculator", os.path.join(temp_dir, "calculator"))
+
+        functions.get_agent_response.call_functions = timed_call_functions
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), use_working_directory(working_directory):
+                status = get_agent_response(client, args)
+            end = time.perf_counter()
+            peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        finally:
+            tracemalloc.stop()
+            functions.get_agent_response.call_functions = call_functions
+            close_workspace(working_directory)
+
+    if trace_memory:
+        return {"peak_memory_kb": peak_memory / 1024}
+
+    # Streamed turns run their tools while the response is still arriving, so their tool time cannot be separated
+    # from the overhead and is left in it
+    starts = [request["start"] for request in client.requests] + [end]
+    turn_times = [starts[index + 1] - starts[index] - latency for index in range(len(client.requests))]
+    turn_overheads = [
+        turn_time - (tool_times[index] if index < len(tool_times) else 0)
+        for index, turn_time in enumerate(turn_times)
+    ]
+
+    prompt_chars = [request["prompt_chars"] for request in client.requests]
+    return {
+        "status": status,
+        "turns": len(client.requests),
+        "turn_overhead_ms": statistics.median(turn_overheads) * 1000,
+        "tool_latency_ms": statistics.median(tool_times) * 1000 if tool_times else None,
+        "final_prompt_chars": prompt_chars[-1],
+        "prompt_growth_chars": (prompt_chars[-1] - prompt_chars[0]) / max(len(prompt_chars) - 1, 1),
+    }
+
+
+def summarize(runs, memory_run):
+    """
+    Combines the measurements of repeated runs, taking the median of each
+    :param runs: List of dictionaries returned by run_session()
+    :param memory_run: Dictionary returned by run_session() with trace_memory set
+    :return: Dictionary of median measurements
+    """
+
+    summary = {"status": runs[-1]["status"], "turns": runs[-1]["turns"], "runs": len(runs)}
+    for key in ("turn_overhead_ms", "tool_latency_ms", "final_prompt_chars", "prompt_growth_chars"):
+        values = [run[key] for run in runs if run[key] is not None]
+        summary[key] = float(statistics.median(values)) if values else None
+    summary["peak_memory_kb"] = memory_run["peak_memory_kb"]
+    return summary
+
+
+def compare(summary, baseline):
+    """
+    Prints how each measurement changed against a baseline
+    :return: List of the names of measurements that got worse by more than their tolerance
+    """
+
+    if summary.get("mode") != baseline.get("mode"):
+        print(f"  Warning: baseline was measured in {baseline.get('mode')} mode, not {summary.get('mode')} mode")
+
+    regressions = []
+    for key, value in summary.items():
+        if not isinstance(value, float) or not baseline.get(key):
+            continue
+        change = (value - baseline[key]) / baseline[key]
+        regressed = change > TOLERANCES.get(key, float("inf"))
+        if regressed:
+            regressions.append(key)
+        print(f"  {key}: {baseline[key]:.1f} -> {value:.1f} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def record(prompt, path):
+    """
+    Runs a live agent session and saves its responses so they can be replayed by FakeClient
+    """
+
+    from dotenv import load_dotenv
+    from google import genai
+
+    load_dotenv()
+    client = RecordingClient(genai.Client(api_key=os.environ.get("GEMINI_API_KEY")), prompt)
+    get_agent_response(client, argparse.Namespace(user_prompt=prompt, verbose=False, stream=False))
+    client.save(path)
+    print(f"Recorded {len(client.session['turns'])} turns to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop offline")
+    parser.add_argument("--session", help="Session JSON file to replay instead of the default session")
+    parser.add_argument("--repeats", type=int, default=10, help="Number of runs to take the median of")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fake API waits before responding")
+    parser.add_argument("--stream", action="store_true", help="Benchmark the streaming agent loop")
+    parser.add_argument("--save", metavar="BASELINE", help="Save the results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare the results against a baseline JSON file")
+    parser.add_argument("--record", metavar="SESSION", help="Record a live session for PROMPT to a JSON file")
+    parser.add_argument("prompt", nargs="?", help="Prompt of the session to record")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.prompt:
+            parser.error("--record needs a prompt")
+        record(args.prompt, args.record)
+        return
+
+    session = load_session(args.session) if args.session else DEFAULT_SESSION
+    runs = [run_session(session, args.latency, args.stream) for _ in range(args.repeats)]
+    summary = summarize(runs, run_session(session, args.latency, args.stream, trace_memory=True))
+    summary["mode"] = "stream" if args.stream else "standard"
+
+    print(f"Agent loop ({summary['mode']} mode, {summary['turns']} turns, {summary['runs']} runs, "
+          f"{args.latency * 1000:.0f} ms API latency, status {summary['status']})")
+    if args.stream:
+        print(f"  per-turn overhead (including tools): {summary['turn_overhead_ms']:.2f} ms")
+    else:
+        print(f"  per-turn overhead: {summary['turn_overhead_ms']:.2f} ms")
+        print(f"  tool latency per turn: {summary['tool_latency_ms']:.2f} ms")
+    print(f"  final request size: {summary['final_prompt_chars']:.0f} chars "
+          f"(+{summary['prompt_growth_chars']:.0f} chars per turn)")
+    print(f"  peak memory: {summary['peak_memory_kb']:.0f} KiB")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(summary, file, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"Compared to {args.compare}")
+        if compare(summary, baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
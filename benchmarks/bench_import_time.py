@@ -0,0 +1,99 @@
+"""
+Benchmark of the agent's startup time, checked against a budget. Each measurement runs a new interpreter:
+- Import of main.py, parsed from python -X importtime, with the slowest modules it pulls in
+- python main.py --help, which should never need the Gemini SDK
+- Time until the agent is ready to send its first request (SDK, agent loop and tool schemas loaded)
+Times are the minimum over several runs, less the time to start a bare interpreter. Exits with code 1 if any
+measurement is over its budget.
+python -m benchmarks.bench_import_time [repeats]
+"""
+
+import subprocess
+import sys
+import time
+
+
+# Maximum milliseconds each measurement may take, on top of starting the interpreter
+BUDGETS_MS = {
+    "import main": 30,
+    "main.py --help": 60,
+    "ready for first request": 2000,
+}
+
+# Code run to measure the time until the first request could be sent
+FIRST_REQUEST_CODE = (
+    "import main; "
+    "from google import genai; "
+    "from functions.get_agent_response import build_generate_content_config; "
+    "build_generate_content_config()"
+)
+
+
+def time_command(command, repeats):
+    """
+    Runs a command repeatedly
+    :return: Fastest run time in milliseconds
+    """
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def get_import_times(module):
+    """
+    Imports a module in a new interpreter with -X importtime
+    :return: List of (cumulative milliseconds, nesting depth, module name) tuples for every module imported by it
+    """
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+
+    import_times = []
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:       466 |       4416 |   name", indented by nesting depth
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        import_times.append((int(cumulative) / 1000, (len(name) - len(name.lstrip())) // 2, name.strip()))
+
+    # -X importtime reports a module after everything it imports, so the module's own entry is the last top-level one
+    # and the ones it pulled in are the nested entries just before it
+    end = max(index for index, entry in enumerate(import_times) if entry[1] == 0 and entry[2] == module)
+    start = end
+    while start > 0 and import_times[start - 1][1] > 0:
+        start -= 1
+    return import_times[start:end + 1]
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    interpreter_ms = time_command([sys.executable, "-c", "pass"], repeats)
+    import_times = get_import_times("main")
+    results = {
+        "import main": import_times[-1][0],
+        "main.py --help": time_command([sys.executable, "main.py", "--help"], repeats) - interpreter_ms,
+        "ready for first request": time_command([sys.executable, "-c", FIRST_REQUEST_CODE], repeats) - interpreter_ms,
+    }
+
+    print(f"Startup time ({repeats} runs each, {interpreter_ms:.1f} ms to start the interpreter not included)")
+    over_budget = False
+    for name, milliseconds in results.items():
+        within_budget = milliseconds <= BUDGETS_MS[name]
+        over_budget = over_budget or not within_budget
+        print(f"  {name}: {milliseconds:.1f} ms (budget {BUDGETS_MS[name]} ms){'' if within_budget else '  OVER BUDGET'}")
+
+    print("Slowest modules imported by main.py")
+    for cumulative, depth, name in sorted(import_times[:-1], reverse=True)[:10]:
+        print(f"  {cumulative:7.1f} ms  {'  ' * depth}{name}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark comparing the per-call latency of run_python_file when each script starts a new interpreter (cold) and when
+it is run from the warm fork server. Also checks that both paths produce exactly the same output.
+"""
+
+import statistics
+import sys
+import time
+from functions.run_python_file import run_python_file
+from functions.warm_python_runner import set_warm_runner_enabled
+
+
+# Scripts to run from the calculator working directory, with their arguments
+CASES = [
+    ("main.py", ["3 + 5"]),
+    ("tests.py", None),
+]
+
+
+def time_calls(file_path, args, repeats):
+    """
+    Runs a python file repeatedly through run_python_file
+    :return: Tuple of the last output and the latency in milliseconds of every call
+    """
+
+    latencies = []
+    output = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = run_python_file("calculator", file_path, args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return output, latencies
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    for file_path, args in CASES:
+        set_warm_runner_enabled(False)
+        cold_output, cold_latencies = time_calls(file_path, args, repeats)
+
+        set_warm_runner_enabled(True)
+        warm_output, warm_latencies = time_calls(file_path, args, repeats)
+
+        cold_median = statistics.median(cold_latencies)
+        warm_median = statistics.median(warm_latencies)
+        print(f"{file_path} {args or ''} ({repeats} calls each)")
+        print(f"  cold: median {cold_median:.1f} ms, min {min(cold_latencies):.1f} ms")
+        print(f"  warm: median {warm_median:.1f} ms, min {min(warm_latencies):.1f} ms")
+        print(f"  speedup: {cold_median / warm_median:.1f}x")
+        print(f"  identical output: {cold_output.splitlines()[:-3] == warm_output.splitlines()[:-3]}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Module to define an offline stand-in for the Gemini API client. FakeClient has the parts of genai.Client the agent
+uses (models.generate_content, models.generate_content_stream and aio.models.generate_content) and replays a scripted
+or recorded session instead of calling the API, after a configurable delay. Responses are real
+types.GenerateContentResponse objects, so usage_metadata, function_calls, candidates and text behave exactly as they do
+with the live API.
+
+A session is a JSON file (or dictionary) holding the user prompt and the agent's response for every turn:
+{
+    "prompt": "fix the calculator",
+    "turns": [
+        {"function_calls": [{"name": "get_files_info", "args": {"directory": "pkg"}}]},
+        {"text": "The calculator is fixed."}
+    ]
+}
+RecordingClient wraps a real client and saves the responses it receives in the same format, so a live session can be
+replayed later without the API.
+
+Faults and slow requests can be injected to test how the agent copes with an unreliable API. A request that is made
+again with the same conversation, such as a retry or a hedged duplicate, gets the same turn instead of the next one.
+"""
+
+import asyncio
+import datetime
+import json
+import threading
+import time
+from config import CHARS_PER_TOKEN
+from google.genai import errors, types
+
+
+class FakeClient:
+    """
+    Replays the turns of a session, one per request, in the order they were made. Every request made is kept in
+    .requests for benchmarks to inspect.
+    """
+
+    def __init__(self, session, latency=0.0, chunk_latency=0.0, faults=None, latencies=None):
+        """
+        :param session: Session dictionary, or path to a session JSON file
+        :param latency: Seconds every request waits before responding, like the time to first token of the API
+        :param chunk_latency: Seconds between the chunks of a streamed response
+        :param faults: List of what goes wrong with each request, in the order they are made: None for nothing, an HTTP
+                       status code to fail with (e.g. 429 or 503), or "empty" for a response without usage metadata
+        :param latencies: List of seconds each request waits instead of latency, in the order they are made
+        """
+
+        if isinstance(session, str):
+            session = load_session(session)
+
+        self.prompt = session.get("prompt", "")
+        self.turns = list(session["turns"])
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.faults = list(faults or [])
+        self.latencies = list(latencies or [])
+        self.attempts = 0
+        self.requests = []
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+        self.caches = _FakeCaches()
+        self._config_sizes = {}
+        self._answers = {}
+        self._lock = threading.Lock()
+
+    def start_request(self):
+        """
+        Counts a request made to the fake API, including ones that fail
+        :return: Tuple of the fault to inject into the request and the seconds it waits before responding
+        """
+
+        with self._lock:
+            index = self.attempts
+            self.attempts += 1
+
+        fault = self.faults[index] if index < len(self.faults) else None
+        latency = self.latencies[index] if index < len(self.latencies) else None
+        return fault, self.latency if latency is None else latency
+
+    def next_response(self, contents, config=None, fault=None):
+        """
+        Records a request and gets the scripted response for it. Once the script runs out, the agent is told it is done.
+        :param contents: List of types.Content objects sent as the conversation
+        :param config: types.GenerateContentConfig object sent with the request
+        :param fault: Fault from start_request() to inject into the response
+        :return: Tuple of the turn dictionary and the types.GenerateContentResponse built from it
+        :raises errors.APIError: If the fault is an HTTP status code
+        """
+
+        if isinstance(fault, int):
+            error_class = errors.ServerError if fault >= 500 else errors.ClientError
+            error = {"code": fault, "message": f"Injected fault {fault}"}
+            if fault == 429:
+                error["details"] = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "0.1s"}]
+            raise error_class(fault, {"error": error})
+
+        start = time.perf_counter()
+        cached_chars = self.caches.get_size(config.cached_content) if config and config.cached_content else 0
+        config_chars = self._get_config_size(config) if config and not config.cached_content else 0
+
+        # Requests are measured the way the API bills them, by the size of the whole conversation resent every call.
+        # Serializing it costs about as much as the real client does before sending it.
+        prompt_chars = sum(len(content.model_dump_json(exclude_none=True)) for content in contents)
+
+        with self._lock:
+            # The same conversation object at the same length is the same request made again
+            answer = self._answers.get(id(contents))
+            if answer is not None and answer[0] is contents and answer[1] == len(contents):
+                turn = answer[2]
+            else:
+                index = len(self.requests)
+                turn = self.turns[index] if index < len(self.turns) else {"text": "Done."}
+                self.requests.append({"start": start, "messages": len(contents), "prompt_chars": prompt_chars})
+                self._answers[id(contents)] = (contents, len(contents), turn)
+
+        response = build_response(turn, prompt_chars + config_chars + cached_chars)
+        response.usage_metadata.cached_content_token_count = cached_chars // CHARS_PER_TOKEN or None
+        if fault == "empty":
+            response.usage_metadata = None
+        return turn, response
+
+
+    def _get_config_size(self, config):
+        """
+        Helper function for next_response()
+        The agent reuses a single configuration object, so its size is only measured once
+        :return: Number of characters of system prompt and tool declarations sent with a request
+        """
+
+        if id(config) not in self._config_sizes:
+            self._config_sizes[id(config)] = (config, _get_prefix_size(config))
+        return self._config_sizes[id(config)][1]
+
+
+class _FakeModels:
+    """
+    Stand-in for client.models
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        fault, latency = self._client.start_request()
+        time.sleep(latency)
+        turn, response = self._client.next_response(contents, config, fault)
+        return response
+
+    def generate_content_stream(self, model, contents, config=None):
+        fault, latency = self._client.start_request()
+        time.sleep(latency)
+        turn, response = self._client.next_response(contents, config, fault)
+        for index, chunk in enumerate(_split_response(turn, response)):
+            if index:
+                time.sleep(self._client.chunk_latency)
+            yield chunk
+
+
+class _FakeAio:
+    """
+    Stand-in for client.aio
+    """
+
+    def __init__(self, client):
+        self.models = _FakeAsyncModels(client)
+
+
+class _FakeAsyncModels:
+    """
+    Stand-in for client.aio.models
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_content(self, model, contents, config=None):
+        fault, latency = self._client.start_request()
+        await asyncio.sleep(latency)
+        turn, response = self._client.next_response(contents, config, fault)
+        return response
+
+
+class _FakeCaches:
+    """
+    Stand-in for client.caches. Cached content expires after its TTL like on the API, and requests that refer to
+    expired or unknown cached content fail with the same error. expire() ends a cached content's life early.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def create(self, model, config):
+        size = _get_prefix_size(config)
+        with self._lock:
+            self.created += 1
+            name = f"cachedContents/fake-{self.created}"
+            self._caches[name] = [size, 0.0]
+        return self._set_ttl(name, config.ttl)
+
+    def update(self, name, config):
+        self.get_size(name)
+        with self._lock:
+            self.updated += 1
+        return self._set_ttl(name, config.ttl)
+
+    def expire(self, name):
+        with self._lock:
+            self._caches.pop(name, None)
+
+    def get_size(self, name):
+        """
+        :return: Number of characters held by a cached content
+        :raises errors.ClientError: If the cached content does not exist or has expired
+        """
+
+        with self._lock:
+            entry = self._caches.get(name)
+        if entry is None or entry[1] <= time.time():
+            raise errors.ClientError(404, {"error": {"code": 404, "status": "NOT_FOUND",
+                                                     "message": "CachedContent not found (or permission denied)"}})
+        return entry[0]
+
+    def _set_ttl(self, name, ttl):
+        expire_time = time.time() + float(ttl.rstrip("s"))
+        with self._lock:
+            self._caches[name][1] = expire_time
+        return types.CachedContent(name=name, expire_time=datetime.datetime.fromtimestamp(expire_time,
+                                                                                         datetime.timezone.utc))
+
+
+class RecordingClient:
+    """
+    Wraps a real genai.Client and records every non-streamed response it receives as a session that FakeClient can
+    replay. Only the parts of the client the agent uses are wrapped.
+    """
+
+    def __init__(self, client, prompt):
+        """
+        :param client: genai.Client object used to make the real requests
+        :param prompt: User prompt of the session being recorded
+        """
+
+        self.session = {"prompt": prompt, "turns": []}
+        self.models = _RecordingModels(client, self.session)
+
+    def save(self, path):
+        """
+        Writes the recorded session to a JSON file
+        :param path: Path of the file to write
+        """
+
+        with open(path, "w") as file:
+            json.dump(self.session, file, indent=2)
+
+
+class _RecordingModels:
+    """
+    Stand-in for client.models that passes requests on to the real client
+    """
+
+    def __init__(self, client, session):
+        self._client = client
+        self._session = session
+
+    def generate_content(self, model, contents, config=None):
+        response = self._client.models.generate_content(model=model, contents=contents, config=config)
+        turn = {}
+        if response.function_calls:
+            turn["function_calls"] = [{"name": call.name, "args": dict(call.args or {})}
+                                      for call in response.function_calls]
+        # response.text warns when the response also holds function calls, so the text parts are joined here
+        parts = response.candidates[0].content.parts if response.candidates and response.candidates[0].content else []
+        text = "".join(part.text for part in parts or [] if part.text and not part.thought)
+        if text:
+            turn["text"] = text
+        self._session["turns"].append(turn)
+        return response
+
+
+def load_session(path):
+    """
+    Loads a recorded or scripted session
+    :param path: Path to a session JSON file
+    :return: Session dictionary
+    """
+
+    with open(path) as file:
+        session = json.load(file)
+
+    if not isinstance(session.get("turns"), list):
+        raise ValueError(f'Session "{path}" does not have a list of turns')
+    return session
+
+
+def build_response(turn, prompt_chars):
+    """
+    Builds the response the API would have sent for a turn
+    :param turn: Dictionary with the optional "text" and "function_calls" of the agent's response
+    :param prompt_chars: Size of the request, used to estimate its prompt token count
+    :return: types.GenerateContentResponse object
+    """
+
+    parts = []
+    if turn.get("text"):
+        parts.append(types.Part(text=turn["text"]))
+    for call in turn.get("function_calls", []):
+        parts.append(types.Part(function_call=types.FunctionCall(name=call["name"], args=call.get("args", {}))))
+
+    response_chars = sum(len(part.model_dump_json(exclude_none=True)) for part in parts)
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=parts),
+                                    finish_reason=types.FinishReason.STOP)],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_chars // CHARS_PER_TOKEN,
+            candidates_token_count=response_chars // CHARS_PER_TOKEN,
+            total_token_count=(prompt_chars + response_chars) // CHARS_PER_TOKEN,
+        ),
+    )
+
+
+def _get_prefix_size(config):
+    """
+    :return: Number of characters of the system prompt and tool declarations in a configuration
+    """
+
+    return len(config.model_dump_json(include={"system_instruction", "tools"}, exclude_none=True))
+
+
+def _split_response(turn, response):
+    """
+    Helper function for _FakeModels.generate_content_stream()
+    Splits a response into the chunks the API would stream it in: the text a few words at a time, then the function
+    calls, with the usage of the whole response on the last chunk
+    :return: List of types.GenerateContentResponse objects
+    """
+
+    text = turn.get("text") or ""
+    words = text.split(" ")
+    pieces = [" ".join(words[index:index + 5]) + (" " if index + 5 < len(words) else "")
+              for index in range(0, len(words), 5)] if text else []
+
+    chunks = [
+        types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=piece)]))]
+        )
+        for piece in pieces
+    ]
+
+    function_call_parts = [part for part in response.candidates[0].content.parts if part.function_call]
+    if function_call_parts or not chunks:
+        chunks.append(types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=function_call_parts))]
+        ))
+
+    chunks[-1].candidates[0].finish_reason = types.FinishReason.STOP
+    chunks[-1].usage_metadata = response.usage_metadata
+    return chunks
@@ -1,8 +1,9 @@
 # calculator/main.py
 
 import sys
+from pkg.bulk import evaluate_stream
 from pkg.calculator import Calculator
-from pkg.render import format_json_output
+from pkg.render import format_json_output, write_json_lines
 
 
 def main():
@@ -10,9 +11,14 @@ def main():
     if len(sys.argv) <= 1:
         print("Calculator App")
         print('Usage: python main.py "<expression>"')
+        print('       python main.py --bulk [file] [--workers N]')
         print('Example: python main.py "3 + 5"')
         return
 
+    if sys.argv[1] == "--bulk":
+        bulk(sys.argv[2:])
+        return
+
     expression = " ".join(sys.argv[1:])
     try:
         result = calculator.evaluate(expression)
@@ -25,5 +31,29 @@ def main():
         print(f"Error: {e}")
 
 
+def bulk(args):
+    # Reads newline-separated expressions from a file (or stdin) and writes one compact JSON line per expression
+    workers = None
+    if "--workers" in args:
+        index = args.index("--workers")
+        try:
+            workers = int(args[index + 1])
+        except (IndexError, ValueError):
+            print("Error: --workers requires a number")
+            return
+        args = args[:index] + args[index + 2:]
+
+    path = args[0] if args else "-"
+    if path == "-":
+        write_json_lines(evaluate_stream(sys.stdin, workers), sys.stdout)
+        return
+
+    try:
+        with open(path, "r") as input_file:
+            write_json_lines(evaluate_stream(input_file, workers), sys.stdout)
+    except OSError as e:
+        print(f"Error: {e}")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
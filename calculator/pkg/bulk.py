@@ -0,0 +1,52 @@
+# calculator/pkg/bulk.py
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pkg.calculator import Calculator
+from pkg.render import format_json_error_line, format_json_line
+
+# Each worker process keeps its own calculator so compiled expressions are reused across chunks
+_calculator = None
+
+
+def evaluate_lines(lines):
+    global _calculator
+    if _calculator is None:
+        _calculator = Calculator()
+
+    rendered = []
+    for line in lines:
+        expression = line.strip()
+        try:
+            result = _calculator.evaluate(expression)
+            rendered.append(format_json_line(expression, result))
+        except Exception as e:
+            rendered.append(format_json_error_line(expression, str(e)))
+    return rendered
+
+
+def evaluate_stream(input_file, workers=None, chunk_size=1000):
+    # Yields one rendered JSON line per non-blank input line, in input order. Inputs larger than one chunk are spread
+    # across a process pool with a bounded number of chunks in flight, so memory stays constant for any input size.
+    expressions = (line for line in input_file if line.strip())
+    chunks = iter(lambda: list(islice(expressions, chunk_size)), [])
+
+    first_chunk = next(chunks, [])
+    if len(first_chunk) < chunk_size or workers == 1:
+        yield from evaluate_lines(first_chunk)
+        for chunk in chunks:
+            yield from evaluate_lines(chunk)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque([pool.submit(evaluate_lines, first_chunk)])
+        for chunk in chunks:
+            pending.append(pool.submit(evaluate_lines, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
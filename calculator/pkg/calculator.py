@@ -1,7 +1,10 @@
 # calculator/pkg/calculator.py
 
+from functools import lru_cache
+
+
 class Calculator:
-    def __init__(self):
+    def __init__(self, cache_size=1024):
         self.operators = {
             "+": lambda a, b: a + b,
             "-": lambda a, b: a - b,
@@ -14,62 +17,131 @@ class Calculator:
             "*": 2,
             "/": 2,
         }
+        # Compiled programs are cached per calculator, keyed by the expression with its whitespace normalized
+        self._compile_normalized = lru_cache(maxsize=cache_size)(self._compile_tokens)
 
-    def evaluate(self, expression):
+    def evaluate(self, expression, variables=None):
         if not expression or expression.isspace():
             return None
-        tokens = expression.replace("(", " ( ").replace(")", " ) ").strip().split()
-        return self._evaluate_infix(tokens)
+        return self.run(self.compile(expression), variables)
 
-    def _evaluate_infix(self, tokens):
-        values = []
-        operators = []
+    def run(self, program, variables=None):
+        # Evaluates a program returned by compile(), so callers that keep their programs skip the cache lookup
+        return self._run(program, variables or {})
 
-        i = 0
-        while i < len(tokens):
-            token = tokens[i]
+    def evaluate_batch(self, expression, columns):
+        # Evaluates the expression once over whole arrays. Each column is an array of values for the variable with
+        # its name, and all columns must broadcast to the same shape. Rows that divide by zero are masked.
+        import numpy as np
 
-            if token == "(":
-                operators.append(token)
-            elif token == ")":
-                while operators and operators[-1] != "(":
-                    self._apply_operator(operators, values)
-                if not operators or operators[-1] != "(":
-                    raise ValueError("mismatched parentheses")
-                operators.pop()  # Pop the opening parenthesis
-            elif token in self.operators:
-                while (
-                    operators
-                    and operators[-1] in self.operators
-                    and self.precedence[operators[-1]] >= self.precedence[token]
-                ):
-                    self._apply_operator(operators, values)
-                operators.append(token)
+        if not expression or expression.isspace():
+            return None
+
+        arrays = {name: np.asarray(values, dtype=float) for name, values in columns.items()}
+        shape = np.broadcast_shapes(*(array.shape for array in arrays.values()))
+        divide = self.operators["/"]
+        mask = np.zeros(shape, dtype=bool)
+        values = []
+
+        for instruction in self.compile(expression):
+            if type(instruction) is float:
+                values.append(instruction)
+            elif type(instruction) is str:
+                values.append(self._get_variable(arrays, instruction))
+            elif type(instruction) is ValueError:
+                raise ValueError(*instruction.args)
             else:
-                try:
-                    values.append(float(token))
-                except ValueError:
-                    raise ValueError(f"invalid token: {token}")
-            i += 1
+                b = values.pop()
+                a = values.pop()
+                if instruction is divide:
+                    division_by_zero = np.equal(b, 0)
+                    mask |= division_by_zero
+                    b = np.where(division_by_zero, 1.0, b)
+                values.append(instruction(a, b))
 
-        while operators:
-            if operators[-1] == "(":
-                raise ValueError("mismatched parentheses")
-            self._apply_operator(operators, values)
+        return np.ma.masked_array(np.broadcast_to(values[0], shape).astype(float), mask=mask)
 
-        if len(values) != 1:
-            raise ValueError("invalid expression")
+    def compile(self, expression):
+        return self._compile_normalized(" ".join(expression.split()))
 
-        return values[0]
+    def cache_info(self):
+        return self._compile_normalized.cache_info()
 
-    def _apply_operator(self, operators, values):
-        if not operators:
-            return
+    def _compile_tokens(self, expression):
+        # Shunting-yard into a postfix program of floats and variable names (push) and operator functions (apply).
+        # Operand counts are tracked with a depth counter instead of values. An invalid expression compiles to the valid
+        # part followed by its error, so errors are raised at the same point evaluation would have reached them.
+        tokens = expression.replace("(", " ( ").replace(")", " ) ").strip().split()
+        program = []
+        operators = []
+        depth = 0
+
+        try:
+            for token in tokens:
+                if token == "(":
+                    operators.append(token)
+                elif token == ")":
+                    while operators and operators[-1] != "(":
+                        depth = self._compile_operator(operators, program, depth)
+                    if not operators or operators[-1] != "(":
+                        raise ValueError("mismatched parentheses")
+                    operators.pop()  # Pop the opening parenthesis
+                elif token in self.operators:
+                    while (
+                        operators
+                        and operators[-1] in self.operators
+                        and self.precedence[operators[-1]] >= self.precedence[token]
+                    ):
+                        depth = self._compile_operator(operators, program, depth)
+                    operators.append(token)
+                else:
+                    # Numbers come first so names float() accepts, like inf and nan, stay numbers
+                    try:
+                        program.append(float(token))
+                    except ValueError:
+                        if not token.isidentifier():
+                            raise ValueError(f"invalid token: {token}")
+                        program.append(token)
+                    depth += 1
+
+            while operators:
+                if operators[-1] == "(":
+                    raise ValueError("mismatched parentheses")
+                depth = self._compile_operator(operators, program, depth)
+
+            if depth != 1:
+                raise ValueError("invalid expression")
+        except ValueError as e:
+            program.append(ValueError(*e.args))
+
+        return tuple(program)
 
+    def _compile_operator(self, operators, program, depth):
         operator = operators.pop()
-        if len(values) < 2:
+        if depth < 2:
             raise ValueError(f"not enough operands for operator {operator}")
 
-        b = values.pop()
-        a = values.pop()
-        values.append(self.operators[operator](a, b))
+        program.append(self.operators[operator])
+        return depth - 1
+
+    def _run(self, program, variables):
+        values = []
+        for instruction in program:
+            if type(instruction) is float:
+                values.append(instruction)
+            elif type(instruction) is str:
+                values.append(self._get_variable(variables, instruction))
+            elif type(instruction) is ValueError:
+                # A new error each time, as the cached one is shared by every evaluation of the expression
+                raise ValueError(*instruction.args)
+            else:
+                b = values.pop()
+                a = values.pop()
+                values.append(instruction(a, b))
+
+        return values[0]
+
+    def _get_variable(self, variables, name):
+        if name not in variables:
+            raise ValueError(f"unknown variable: {name}")
+        return variables[name]
@@ -4,13 +4,38 @@ import json
 
 
 def format_json_output(expression: str, result: float, indent: int = 2) -> str:
-    if isinstance(result, float) and result.is_integer():
-        result_to_dump = int(result)
-    else:
-        result_to_dump = result
+    output_data = {
+        "expression": expression,
+        "result": _to_json_number(result),
+    }
+    return json.dumps(output_data, indent=indent)
 
+
+def format_json_line(expression: str, result: float) -> str:
     output_data = {
         "expression": expression,
-        "result": result_to_dump,
+        "result": _to_json_number(result),
     }
-    return json.dumps(output_data, indent=indent)
\ No newline at end of file
+    return json.dumps(output_data, separators=(",", ":"))
+
+
+def format_json_error_line(expression: str, error: str) -> str:
+    output_data = {
+        "expression": expression,
+        "error": error,
+    }
+    return json.dumps(output_data, separators=(",", ":"))
+
+
+def write_json_lines(lines, output) -> None:
+    # Lines are written as they are produced, so memory does not grow with the number of records
+    for line in lines:
+        output.write(line)
+        output.write("\n")
+    output.flush()
+
+
+def _to_json_number(result: float):
+    if isinstance(result, float) and result.is_integer():
+        return int(result)
+    return result
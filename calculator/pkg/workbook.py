@@ -0,0 +1,159 @@
+# calculator/pkg/workbook.py
+
+from pkg.calculator import Calculator
+
+
+class CycleError(ValueError):
+    pass
+
+
+class _CellValues(dict):
+    # Values of the cells, passed to the calculator as its variables. A cell whose evaluation failed holds its error,
+    # which is raised again for every cell that refers to it. get() returns the stored value or error as it is.
+    def __getitem__(self, name):
+        value = dict.__getitem__(self, name)
+        if isinstance(value, Exception):
+            raise type(value)(*value.args)
+        return value
+
+
+class Workbook:
+    # Spreadsheet-style cells holding either a number or an expression that refers to other cells by name. Each cell is
+    # compiled once when it is set. Setting a cell recomputes only the cells downstream of it, in topological order, and
+    # stops early along any path where a recomputed value did not change.
+    def __init__(self, calculator=None):
+        self.calculator = calculator or Calculator()
+        self.recalculated = 0  # Number of cells evaluated by the latest change
+        self._programs = {}  # Compiled program of every expression cell
+        self._values = _CellValues()
+        self._dependencies = {}  # Names each expression cell refers to
+        self._dependents = {}  # Expression cells referring to each name, including names that are not defined yet
+
+    def set(self, name, value):
+        # Sets a cell to a number or an expression. Raises CycleError, leaving the workbook unchanged, if the
+        # expression refers back to the cell through other cells.
+        # Names like inf and nan are read as numbers in expressions, so they could never be referred to
+        if not isinstance(name, str) or not name.isidentifier() or _is_number(name):
+            raise ValueError(f"invalid cell name: {name}")
+
+        if isinstance(value, str):
+            program = self.calculator.compile(value)
+            dependencies = {instruction for instruction in program if type(instruction) is str}
+            if name in dependencies or self._is_upstream(dependencies, name):
+                raise CycleError(f"circular reference: {name}")
+        else:
+            program = None
+            dependencies = set()
+            value = float(value)
+
+        self._unlink(name)
+        self._dependencies[name] = dependencies
+        for dependency in dependencies:
+            self._dependents.setdefault(dependency, set()).add(name)
+
+        if program is None:
+            self._programs.pop(name, None)
+            self.recalculated = 0
+        else:
+            self._programs[name] = program
+            value = self._evaluate(name)
+            self.recalculated = 1
+
+        # Nothing downstream can change if the cell kept its value
+        unchanged = name in self._values and _same_value(value, self._values.get(name))
+        self._values[name] = value
+        if not unchanged:
+            self._recalculate(name)
+
+    def get(self, name):
+        if name not in self._values:
+            raise ValueError(f"unknown cell: {name}")
+        return self._values[name]
+
+    def remove(self, name):
+        # Cells referring to a removed cell fail with an unknown variable error until it is set again
+        if name not in self._values:
+            raise ValueError(f"unknown cell: {name}")
+        self._unlink(name)
+        self._programs.pop(name, None)
+        del self._values[name]
+        self.recalculated = 0
+        self._recalculate(name)
+
+    def dependents(self, name):
+        return set(self._dependents.get(name, ()))
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def _evaluate(self, name):
+        try:
+            return self.calculator.run(self._programs[name], self._values)
+        except (ValueError, ArithmeticError) as e:
+            return e
+
+    def _is_upstream(self, dependencies, name):
+        # True if any of the dependencies is the cell itself or downstream of it
+        seen = {name}
+        stack = [name]
+        while stack:
+            for dependent in self._dependents.get(stack.pop(), ()):
+                if dependent in dependencies:
+                    return True
+                if dependent not in seen:
+                    seen.add(dependent)
+                    stack.append(dependent)
+        return False
+
+    def _unlink(self, name):
+        for dependency in self._dependencies.pop(name, ()):
+            dependents = self._dependents[dependency]
+            dependents.discard(name)
+            if not dependents:
+                del self._dependents[dependency]
+
+    def _recalculate(self, name):
+        # Collects every cell downstream of the changed one, then evaluates them with Kahn's algorithm, counting for
+        # each cell how many of its dependencies are still waiting to be evaluated
+        dirty = set()
+        stack = [name]
+        while stack:
+            for dependent in self._dependents.get(stack.pop(), ()):
+                if dependent not in dirty:
+                    dirty.add(dependent)
+                    stack.append(dependent)
+
+        waiting = {cell: len(self._dependencies[cell] & dirty) for cell in dirty}
+        ready = [cell for cell, count in waiting.items() if count == 0]
+        changed = {name}
+        while ready:
+            cell = ready.pop()
+            if not self._dependencies[cell].isdisjoint(changed):
+                value = self._evaluate(cell)
+                self.recalculated += 1
+                if not _same_value(value, self._values.get(cell)):
+                    self._values[cell] = value
+                    changed.add(cell)
+
+            for dependent in self._dependents.get(cell, ()):
+                if dependent in waiting:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        ready.append(dependent)
+
+
+def _is_number(name):
+    try:
+        float(name)
+    except ValueError:
+        return False
+    return True
+
+
+def _same_value(a, b):
+    if isinstance(a, Exception) or isinstance(b, Exception):
+        return type(a) is type(b) and a.args == b.args
+    return a == b
@@ -1,7 +1,17 @@
 # calculator/tests.py
 
+import io
+import json
+import math
 import unittest
+from pkg.bulk import evaluate_stream
 from pkg.calculator import Calculator
+from pkg.workbook import CycleError, Workbook
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestCalculator(unittest.TestCase):
@@ -44,6 +54,153 @@ class TestCalculator(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.calculator.evaluate("+ 3")
 
+    def test_cached_expression(self):
+        self.calculator.evaluate("2 * (3 + 4)")
+        result = self.calculator.evaluate("  2 *  (3 + 4) ")
+        self.assertEqual(result, 14)
+        self.assertEqual(self.calculator.cache_info().hits, 1)
+
+    def test_cached_error_message(self):
+        for _ in range(2):
+            with self.assertRaisesRegex(ValueError, "mismatched parentheses"):
+                self.calculator.evaluate("(3 + 4")
+
+    def test_error_raised_in_evaluation_order(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.calculator.evaluate("1 / 0 + $")
+
+    def test_variables(self):
+        result = self.calculator.evaluate("x * (y + 2)", {"x": 3, "y": 1})
+        self.assertEqual(result, 9)
+
+    def test_unknown_variable(self):
+        with self.assertRaisesRegex(ValueError, "unknown variable: y"):
+            self.calculator.evaluate("x + y", {"x": 3})
+
+    def test_special_float_values(self):
+        self.assertEqual(self.calculator.evaluate("inf + 1"), float("inf"))
+        self.assertEqual(self.calculator.evaluate("infinity * x", {"x": 2}), float("inf"))
+        self.assertTrue(math.isnan(self.calculator.evaluate("nan * 2")))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_evaluate_batch(self):
+        result = self.calculator.evaluate_batch("x * 2 + y", {"x": [1, 2, 3], "y": [10, 20, 30]})
+        self.assertEqual(result.tolist(), [12, 24, 36])
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_evaluate_batch_division_by_zero(self):
+        result = self.calculator.evaluate_batch("x / y", {"x": [1, 2, 3], "y": [1, 0, 2]})
+        self.assertEqual(result.mask.tolist(), [False, True, False])
+        self.assertEqual(result.compressed().tolist(), [1, 1.5])
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_evaluate_batch_invalid_expression(self):
+        with self.assertRaisesRegex(ValueError, "mismatched parentheses"):
+            self.calculator.evaluate_batch("(x + 1", {"x": [1, 2]})
+
+
+class TestBulkEvaluation(unittest.TestCase):
+    def test_results_in_input_order(self):
+        lines = list(evaluate_stream(io.StringIO("3 + 5\n\n10 / 4\n"), workers=1))
+        self.assertEqual([json.loads(line) for line in lines], [
+            {"expression": "3 + 5", "result": 8},
+            {"expression": "10 / 4", "result": 2.5},
+        ])
+
+    def test_bad_line_produces_error_record(self):
+        lines = list(evaluate_stream(io.StringIO("(3 + 5\n2 * 2\n"), workers=1))
+        self.assertEqual(json.loads(lines[0]), {"expression": "(3 + 5", "error": "mismatched parentheses"})
+        self.assertEqual(json.loads(lines[1]), {"expression": "2 * 2", "result": 4})
+
+    def test_sharded_across_processes(self):
+        expressions = "".join(f"{i} * 2\n" for i in range(50))
+        lines = list(evaluate_stream(io.StringIO(expressions), workers=2, chunk_size=10))
+        self.assertEqual([json.loads(line)["result"] for line in lines], [i * 2 for i in range(50)])
+
+
+class TestWorkbook(unittest.TestCase):
+    def setUp(self):
+        self.workbook = Workbook()
+        self.workbook.set("price", 10)
+        self.workbook.set("quantity", 3)
+        self.workbook.set("subtotal", "price * quantity")
+        self.workbook.set("total", "subtotal + shipping")
+        self.workbook.set("shipping", 5)
+
+    def test_cells_refer_to_other_cells(self):
+        self.assertEqual(self.workbook.get("subtotal"), 30)
+        self.assertEqual(self.workbook.get("total"), 35)
+
+    def test_change_recomputes_dependents(self):
+        self.workbook.set("quantity", 4)
+        self.assertEqual(self.workbook.get("total"), 45)
+        self.assertEqual(self.workbook.recalculated, 2)
+
+    def test_change_skips_unaffected_cells(self):
+        self.workbook.set("shipping", 7)
+        self.assertEqual(self.workbook.get("total"), 37)
+        self.assertEqual(self.workbook.recalculated, 1)
+
+    def test_unchanged_value_stops_recalculation(self):
+        self.workbook.set("subtotal", "quantity * price")
+        self.assertEqual(self.workbook.recalculated, 1)
+
+    def test_cycle_is_rejected(self):
+        with self.assertRaisesRegex(CycleError, "circular reference: price"):
+            self.workbook.set("price", "total / 2")
+        with self.assertRaises(CycleError):
+            self.workbook.set("shipping", "shipping + 1")
+        self.workbook.set("quantity", 1)
+        self.assertEqual(self.workbook.get("total"), 15)
+
+    def test_names_read_as_numbers_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "invalid cell name: inf"):
+            self.workbook.set("inf", 1)
+
+    def test_errors_propagate_to_dependents(self):
+        self.workbook.set("quantity", "price / zero")
+        with self.assertRaisesRegex(ValueError, "unknown variable: zero"):
+            self.workbook.get("total")
+        self.workbook.set("zero", 0)
+        with self.assertRaises(ZeroDivisionError):
+            self.workbook.get("total")
+        self.workbook.set("zero", 2)
+        self.assertEqual(self.workbook.get("total"), 55)
+
+    def test_remove_cell(self):
+        self.workbook.remove("shipping")
+        self.assertNotIn("shipping", self.workbook)
+        with self.assertRaisesRegex(ValueError, "unknown variable: shipping"):
+            self.workbook.get("total")
+
+    def test_update_touches_only_dependents(self):
+        workbook = Workbook()
+        for i in range(100):
+            workbook.set(f"input{i}", i)
+        for i in range(10000):
+            workbook.set(f"cell{i}", f"input{i % 100} * 2 + {i}")
+        workbook.set("input7", 1000)
+        self.assertEqual(workbook.recalculated, 100)
+        self.assertEqual(workbook.get("cell107"), 2107)
+
+    def test_shared_dependency_evaluated_once(self):
+        workbook = Workbook()
+        workbook.set("a", 1)
+        workbook.set("b", "a * 2")
+        workbook.set("c", "a + b")
+        workbook.set("d", "b + c")
+        workbook.set("a", 2)
+        self.assertEqual(workbook.get("d"), 10)
+        self.assertEqual(workbook.recalculated, 3)
+
+    def test_long_chain_in_topological_order(self):
+        workbook = Workbook()
+        workbook.set("cell0", 1)
+        for i in range(1, 5000):
+            workbook.set(f"cell{i}", f"cell{i - 1} + 1")
+        workbook.set("cell0", 2)
+        self.assertEqual(workbook.get("cell4999"), 5001)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
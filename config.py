@@ -2,6 +2,9 @@
 File to hold constants for the project
 """
 
+# Gemini model the agent sends requests to
+MODEL = "gemini-2.5-flash"
+
 # Maximum number of times the Gemini API can be called during a single agent query
 MAX_API_CALLS = 20
 
@@ -13,3 +16,95 @@ MAX_TIME = 30
 
 # Working directory the agent is restricted to operate within
 WORKING_DIRECTORY = ("./calculator")
+
+# Maximum number of function calls from a single agent turn that can run at the same time
+MAX_TOOL_WORKERS = 4
+
+# Default maximum number of agent sessions that can run at the same time in batch mode
+MAX_CONCURRENT_SESSIONS = 8
+
+# Number of prompt tokens after which earlier tool outputs in the conversation are compacted
+CONTEXT_TOKEN_BUDGET = 30000
+
+# Number of most recent agent turns whose tool outputs are never compacted unless a newer version exists
+KEEP_RECENT_TURNS = 2
+
+# Rough number of characters per token, used to estimate the size of conversation messages
+CHARS_PER_TOKEN = 4
+
+# Maximum amount of memory in bytes the file cache of a single working directory can use
+FILE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Run python files from a pre-warmed fork server instead of starting a new interpreter for every call
+USE_WARM_RUNNER = False
+
+# Modules imported once by the fork server so that scripts run from it do not pay to import them again
+WARM_RUNNER_PRELOAD = ("argparse", "json", "re", "traceback", "unittest")
+
+# Maximum number of bytes a python file can write to stdout and stderr combined before it is stopped early
+MAX_OUTPUT_BYTES = 1000000
+
+# Number of bytes kept from the start and from the end of each output stream of a python file
+OUTPUT_HEAD_BYTES = 5000
+OUTPUT_TAIL_BYTES = 5000
+
+# Maximum number of entries get_files_info returns in a single page
+MAX_LIST_ENTRIES = 200
+
+# Names that recursive listings always skip
+DEFAULT_LIST_EXCLUDES = (".git", "__pycache__")
+
+# Files listing patterns to skip in the directory they are found in, followed in recursive listings
+IGNORE_FILES = (".gitignore",)
+
+# Number of bytes from the start of a file checked for NUL bytes to decide if it is a binary file
+BINARY_CHECK_BYTES = 8192
+
+# Files larger than this many bytes are not indexed or searched by search_files
+MAX_INDEX_FILE_BYTES = 1000000
+
+# Maximum number of matching lines search_files returns
+MAX_SEARCH_RESULTS = 50
+
+# Seconds a cached system prompt and tool declarations live on the Gemini API after they were last refreshed
+CONTEXT_CACHE_TTL = 3600
+
+# Seconds to send the full system prompt for after the cached content could not be created because of a temporary
+# problem, such as a rate limit or a dropped connection, before trying to create it again
+CONTEXT_CACHE_RETRY_DELAY = 60
+
+# File recording the cached content handle, so later sessions can reuse it
+CONTEXT_CACHE_FILE = "~/.cache/aiagent/context_cache.json"
+
+# Directory agent sessions are saved in so they can be resumed with --resume
+SESSIONS_DIRECTORY = "~/.cache/aiagent/sessions"
+
+# Seconds between rescans of the workspace tree on systems where inotify cannot keep it current
+WORKSPACE_POLL_INTERVAL = 1.0
+
+# Unix socket the agent server listens on with --serve, and that --connect sends requests to
+SERVE_SOCKET = "~/.cache/aiagent/agent.sock"
+
+# Rate limits of the Gemini API shared by every session of a run, None for no limit. Requests are only throttled when a
+# limit is set here or with --rpm/--tpm, e.g. 10 requests and 250000 tokens per minute on the free tier of MODEL.
+REQUESTS_PER_MINUTE = None
+TOKENS_PER_MINUTE = None
+
+# Number of times a request that hit a rate limit, server error or dropped connection is retried
+MAX_RETRIES = 5
+
+# Seconds of backoff before the first retry of a request, doubling for every retry after it up to the maximum
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Pattern of the file names run_tests looks for unittest cases in
+TEST_FILE_PATTERN = "test*.py"
+
+# Maximum number of processes run_tests spreads the tests over, and the estimated seconds of tests each process after
+# the first must have to be worth starting
+MAX_TEST_WORKERS = 4
+TEST_WORKER_MIN_SECONDS = 0.5
+
+# Maximum number of failures run_tests reports tracebacks for, and the number of characters kept from the end of each
+MAX_REPORTED_FAILURES = 5
+MAX_TRACEBACK_CHARS = 2000
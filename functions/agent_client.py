@@ -0,0 +1,37 @@
+"""
+Module to define the thin client for server mode. It sends a request to an agent server started with --serve and
+prints the agent's output as it streams back. It only imports the standard library, so a request costs little more
+than starting the interpreter.
+"""
+
+import json
+import os
+import socket
+import sys
+from config import SERVE_SOCKET
+
+
+def send_request(request, socket_path=SERVE_SOCKET, output=None):
+    """
+    Sends a request to the agent server and writes its output as it arrives
+    :param request: Dictionary with the request's "prompt", "working_directory" and options, see agent_server.py
+    :param socket_path: Path of the Unix socket the server listens on
+    :param output: Stream to write the agent's output to, defaults to sys.stdout
+    :return: Dictionary of the final reply, holding the request's "status" and "session_id"
+    :raises OSError: If no server is listening on the socket
+    """
+
+    output = output or sys.stdout
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(os.path.expanduser(socket_path))
+        connection.sendall((json.dumps(request) + "\n").encode())
+
+        with connection.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                reply = json.loads(line)
+                if "output" not in reply:
+                    return reply
+                output.write(reply["output"])
+                output.flush()
+
+    return {"status": "error", "error": "The agent server closed the connection before the request finished"}
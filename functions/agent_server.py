@@ -0,0 +1,242 @@
+"""
+Module to define server mode for the AI agent. Started with --serve, one long-lived process keeps the Gemini SDK
+imported, the client and its connection pool open, and the file caches, search indexes and workspace trees warm, and
+runs agent requests sent to it over a Unix socket by the thin client in agent_client.py.
+
+Each connection carries one request, a JSON line such as
+"
+{"prompt": "fix the calculator", "working_directory": "/home/user/calculator", "verbose": false, "stream": false}
+"
+with an optional "resume" session id instead of or as well as the prompt. The server answers with JSON lines: any
+number of {"output": TEXT} lines holding what the agent printed, as it prints it, then a final line with the request's
+"status" ("success", "failure" or "error") and "session_id".
+
+Requests run concurrently, each on its own thread with its own working directory. Everything printed to stdout while
+handling a request, including by the function calls it runs on worker threads, is sent to that request's client.
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from config import SERVE_SOCKET, SESSIONS_DIRECTORY
+from functions.call_function import use_working_directory
+from functions.get_agent_response import build_generate_content_config, get_agent_response
+from functions.sessions import AgentSession
+
+
+# Output of the request being handled, or None to write to the server's own stdout
+_request_output = contextvars.ContextVar("request_output", default=None)
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server running each agent request on its own thread. Creating it starts sending stdout to the client
+    of the request it is written for.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, client, socket_path=SERVE_SOCKET, context_cache=None, sessions_directory=SESSIONS_DIRECTORY):
+        """
+        :param client: Gemini API client object shared by every request
+        :param socket_path: Path of the Unix socket to listen on
+        :param context_cache: Optional ContextCache object shared by every request
+        :param sessions_directory: Directory the sessions of requests are saved in
+        """
+
+        self.client = client
+        self.context_cache = context_cache
+        self.sessions_directory = sessions_directory
+        self.socket_path = os.path.expanduser(socket_path)
+
+        # Only the user running the server can send it requests, as they run with the user's API key and files
+        os.makedirs(os.path.dirname(self.socket_path) or ".", mode=0o700, exist_ok=True)
+        _remove_stale_socket(self.socket_path)
+        super().__init__(self.socket_path, _RequestHandler)
+        os.chmod(self.socket_path, 0o600)
+
+        if not isinstance(sys.stdout, _OutputRouter):
+            sys.stdout = _OutputRouter(sys.stdout)
+
+        # The tool declarations are built and validated now rather than during the first request
+        build_generate_content_config()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles the single request sent over a connection
+    """
+
+    def handle(self):
+        start = time.perf_counter()
+        output = _ClientOutput(self.wfile)
+        line = self.rfile.readline()
+        if not line.strip():
+            # The client closed the connection without sending a request, e.g. a probe for a stale socket
+            return
+
+        try:
+            request = json.loads(line)
+            session, args = _prepare_request(request, self.server.sessions_directory)
+        except (ValueError, TypeError) as e:
+            _send_quietly(output, {"status": "error", "error": str(e)})
+            return
+        except Exception as e:
+            # The session could not be created or loaded, e.g. the disk is full or its session file is damaged
+            _send_quietly(output, {"status": "error", "error": f"Unable to start the session: {e!r}"})
+            return
+
+        token = _request_output.set(output)
+        try:
+            with use_working_directory(session.working_directory):
+                status = get_agent_response(self.server.client, args, self.server.context_cache, session)
+            reply = {"status": status, "session_id": session.session_id}
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, so there is no one left to report to
+            reply = None
+            status = "disconnected"
+        except Exception as e:
+            reply = {"status": "error", "error": str(e), "session_id": session.session_id}
+            status = "error"
+        finally:
+            _request_output.reset(token)
+
+        if reply is not None and not _send_quietly(output, reply):
+            status = "disconnected"
+        print(f"Session {session.session_id}: {status} after {time.perf_counter() - start:.2f} seconds",
+              file=sys.stderr)
+
+
+class _ClientOutput:
+    """
+    Stream sending everything written to it to a client as {"output": TEXT} lines. Function calls can print from
+    several threads at once, so writes are serialized.
+    """
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        if text:
+            self.send({"output": text})
+        return len(text)
+
+    def send(self, reply):
+        with self._lock:
+            self._wfile.write((json.dumps(reply) + "\n").encode())
+            self._wfile.flush()
+
+    def flush(self):
+        pass
+
+
+class _OutputRouter:
+    """
+    Stand-in for sys.stdout that sends writes to the client of the request they are made for, and anything written
+    outside a request to the server's stdout
+    """
+
+    def __init__(self, stdout):
+        self._stdout = stdout
+
+    def write(self, text):
+        return (_request_output.get() or self._stdout).write(text)
+
+    def flush(self):
+        (_request_output.get() or self._stdout).flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stdout, name)
+
+
+def serve(client, socket_path=SERVE_SOCKET, context_cache=None):
+    """
+    Runs agent requests sent over a Unix socket until interrupted
+    :param client: Gemini API client object shared by every request
+    :param socket_path: Path of the Unix socket to listen on
+    :param context_cache: Optional ContextCache object shared by every request
+    """
+
+    with AgentServer(client, socket_path, context_cache) as server:
+        print(f"Serving agent requests on {server.socket_path}, stop with Ctrl+C", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def _prepare_request(request, sessions_directory):
+    """
+    Helper function for _RequestHandler
+    Checks a request and creates or loads the session it runs in
+    :param request: Dictionary sent by the client
+    :param sessions_directory: Directory sessions are saved in
+    :return: Tuple of the AgentSession object and the arguments for get_agent_response()
+    :raises ValueError: If the request is not valid
+    """
+
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+
+    prompt = request.get("prompt")
+    if prompt is not None and not isinstance(prompt, str):
+        raise ValueError("prompt must be a string")
+
+    # A resumed session keeps running in the working directory it was started in
+    if request.get("resume"):
+        session = AgentSession.load(request["resume"], sessions_directory)
+    elif prompt is None:
+        raise ValueError("Request needs a prompt or a session id to resume")
+    elif not os.path.isdir(request.get("working_directory") or ""):
+        raise ValueError(f"Working directory \"{request.get('working_directory')}\" does not exist")
+    else:
+        session = AgentSession.create(prompt, request["working_directory"], sessions_directory)
+
+    args = argparse.Namespace(user_prompt=prompt, verbose=bool(request.get("verbose")),
+                              stream=bool(request.get("stream")))
+    return session, args
+
+
+def _send_quietly(output, reply):
+    """
+    Helper function for _RequestHandler
+    Sends a reply to a client that may already have gone away
+    :return: True if the reply was sent
+    """
+
+    try:
+        output.send(reply)
+        return True
+    except (BrokenPipeError, ConnectionResetError):
+        return False
+
+
+def _remove_stale_socket(socket_path):
+    """
+    Helper function for AgentServer
+    Removes a socket file left behind by a server that did not shut down cleanly
+    :raises RuntimeError: If another server is still listening on the socket
+    """
+
+    if not os.path.exists(socket_path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socket_path)
+            return
+    raise RuntimeError(f"An agent server is already listening on {socket_path}")
@@ -1,23 +1,88 @@
 """
-Module that groups all of the functions available for the LLM agent to call
+Module that groups all of the functions available for the LLM agent to call. Tool modules are only imported when a
+function is first called or the schemas are first needed, so importing this module stays cheap.
+
+Function calls run in WORKING_DIRECTORY unless a different working directory is set for the current request with
+use_working_directory(), which lets one process run requests for several directories at once.
 """
 
+import contextvars
+import importlib
+import sys
+from contextlib import contextmanager
+from functools import cache
 from config import WORKING_DIRECTORY
 from google.genai import types
-from functions.get_file_content import schema_get_file_content, get_file_content
-from functions.get_files_info import schema_get_files_info, get_files_info
-from functions.run_python_file import schema_run_python_file, run_python_file
-from functions.write_file import schema_write_file, write_file
+from functions.overlay import resolve_working_directory
+from functions.tracing import span
+
+
+# Module that defines each function the agent can call. Every module defines the function with the same name and its
+# schema as schema_<name>.
+TOOL_MODULES = {
+    "edit_file": "functions.edit_file",
+    "get_file_content": "functions.get_file_content",
+    "get_files_info": "functions.get_files_info",
+    "run_python_file": "functions.run_python_file",
+    "run_tests": "functions.run_tests",
+    "search_files": "functions.search_files",
+    "write_file": "functions.write_file",
+}
+
+# Functions that only read from the working directory and can safely run alongside each other
+READ_ONLY_FUNCTIONS = {"get_file_content", "get_files_info", "search_files"}
+
+# Working directory of the request being handled, or None to use WORKING_DIRECTORY
+_working_directory = contextvars.ContextVar("working_directory", default=None)
+
+
+def get_working_directory():
+    """
+    :return: Working directory the function calls of the current request run in
+    """
+
+    return _working_directory.get() or WORKING_DIRECTORY
+
+
+@contextmanager
+def use_working_directory(working_directory):
+    """
+    Runs the function calls made inside the with block, and on threads started from it with the context copied, in a
+    different working directory
+    :param working_directory: Directory the function calls are restricted to
+    """
 
+    token = _working_directory.set(working_directory)
+    try:
+        yield
+    finally:
+        _working_directory.reset(token)
 
-available_functions = types.Tool(
-    function_declarations=[
-        schema_get_file_content,
-        schema_get_files_info,
-        schema_run_python_file,
-        schema_write_file,
-    ]
-)
+
+@cache
+def get_available_functions():
+    """
+    Builds the tool declaring every function the agent can call, importing the tool modules the first time
+    :return: types.Tool object holding the schema of every function
+    """
+
+    return types.Tool(
+        function_declarations=[
+            getattr(importlib.import_module(module), f"schema_{name}") for name, module in TOOL_MODULES.items()
+        ]
+    )
+
+
+def get_function(name):
+    """
+    Gets a function the agent can call, importing its module the first time
+    :param name: Name of the function
+    :return: The function, or None if the agent cannot call a function with that name
+    """
+
+    if name not in TOOL_MODULES:
+        return None
+    return getattr(importlib.import_module(TOOL_MODULES[name]), name)
 
 
 def call_function(function_call, verbose=False):
@@ -33,17 +98,10 @@ def call_function(function_call, verbose=False):
     else:
         print(f" - Calling function: {function_call.name}")
 
-    # Define mapping of functions to help define which function to call
-    func_map = {
-        "get_file_content": get_file_content,
-        "get_files_info": get_files_info,
-        "run_python_file": run_python_file,
-        "write_file": write_file,
-    }
-
     func_name = function_call.name or ""
+    func = get_function(func_name)
 
-    if not func_name in func_map:
+    if func is None:
         return types.Content(
             role="tool",
             parts=[
@@ -56,9 +114,17 @@ def call_function(function_call, verbose=False):
 
     args = dict(function_call.args) if function_call.args else {}
 
-    args["working_directory"] = WORKING_DIRECTORY
+    # With an overlay active, calls that may change files run against its scratch directory
+    args["working_directory"] = resolve_working_directory(get_working_directory(), func_name, args)
+
+    # Show the output of python files while they are still running
+    if func_name == "run_python_file":
+        args["on_output"] = _print_output if verbose else None
 
-    func_result = func_map[func_name](**args)
+    with span(func_name, "tool", args=dict(function_call.args or {})) as trace:
+        func_result = func(**args)
+        if trace is not None:
+            trace["bytes_in"] = len(str(func_result).encode())
 
     return types.Content(
         role="tool",
@@ -69,3 +135,14 @@ def call_function(function_call, verbose=False):
             )
         ],
     )
+
+
+def _print_output(chunk):
+    """
+    Helper function for call_function()
+    Prints a chunk of output from a running python file as soon as it is produced
+    :param chunk: Bytes written by the python file to stdout or stderr
+    """
+
+    sys.stdout.write(chunk.decode(errors="replace"))
+    sys.stdout.flush()
@@ -0,0 +1,196 @@
+"""
+Module to define context compaction for the list of conversation messages sent to the Gemini API. Every API call
+resends the whole conversation, so earlier tool outputs are paid for again on every turn. Once the conversation passes
+a token budget, stale tool outputs are replaced with short stubs:
+- Reads, listings and searches that were followed by a newer identical call
+- Reads of files that were later rewritten or edited, and the content of writes that were later overwritten, edited or
+  read back whole, without being truncated at MAX_CHARS
+- Outputs of scripts that were run again later with the same arguments, and test results followed by a newer test run
+If the conversation is still over budget after that, the oldest script outputs, test results, directory listings and
+search results outside the most recent turns are stubbed as well. Reads and writes are only stubbed when a later call
+makes them out of date, so the latest content of a file stays in the conversation unless it was edited since, in which
+case the stub tells the agent to read it again.
+"""
+
+import os
+from config import CHARS_PER_TOKEN, CONTEXT_TOKEN_BUDGET, KEEP_RECENT_TURNS, MAX_CHARS
+from google.genai import types
+
+
+# Start of every stub so outputs that were already compacted are not compacted again
+STUB_PREFIX = "[Compacted:"
+
+# Functions whose outputs can be stubbed to fit the budget even if no newer version exists
+COMPACTABLE_FUNCTIONS = ("run_python_file", "run_tests", "get_files_info", "search_files")
+
+
+def compact_messages(messages, prompt_tokens, token_budget=CONTEXT_TOKEN_BUDGET, keep_recent=KEEP_RECENT_TURNS):
+    """
+    Compacts the conversation in place if it has grown past the token budget
+    :param messages: List of types.Content objects making up the conversation
+    :param prompt_tokens: Number of prompt tokens the conversation used in the latest API call
+    :param token_budget: Number of prompt tokens the conversation should be kept under
+    :param keep_recent: Number of most recent agent turns that are only compacted if a newer version exists
+    :return: Estimated number of tokens removed from the conversation
+    """
+
+    if not prompt_tokens or prompt_tokens <= token_budget:
+        return 0
+
+    tool_calls = _get_tool_calls(messages)
+    saved_chars = 0
+
+    # Stub every output that a later call has made out of date
+    for index, tool_call in enumerate(tool_calls):
+        reason = _get_stale_reason(tool_call, tool_calls[index + 1:])
+        if reason:
+            saved_chars += _stub_tool_call(tool_call, reason)
+
+    # Stub the oldest script outputs, listings and searches until the conversation fits the budget
+    recent_turns = sorted({tool_call["turn"] for tool_call in tool_calls})[-keep_recent:] if keep_recent else []
+    for tool_call in tool_calls:
+        if prompt_tokens - saved_chars // CHARS_PER_TOKEN <= token_budget:
+            break
+        if tool_call["turn"] in recent_turns or tool_call["name"] not in COMPACTABLE_FUNCTIONS:
+            continue
+        saved_chars += _stub_tool_call(tool_call, "output from an earlier turn removed to save context")
+
+    return saved_chars // CHARS_PER_TOKEN
+
+
+def _get_tool_calls(messages):
+    """
+    Helper function for compact_messages()
+    Pairs every function call the agent made with the function response sent back for it. Responses are sent in the
+    order the calls were made, in the message that directly follows the agent's message.
+    :param messages: List of types.Content objects making up the conversation
+    :return: List of dictionaries describing each function call, in the order they were made
+    """
+
+    tool_calls = []
+    for turn, (message, next_message) in enumerate(zip(messages, messages[1:])):
+        call_parts = [(index, part) for index, part in enumerate(message.parts or []) if part.function_call]
+        response_parts = [(index, part) for index, part in enumerate(next_message.parts or []) if part.function_response]
+
+        for (call_index, call_part), (response_index, response_part) in zip(call_parts, response_parts):
+            if call_part.function_call.name != response_part.function_response.name:
+                continue
+
+            args = dict(call_part.function_call.args) if call_part.function_call.args else {}
+            path = args.get("file_path") or args.get("directory") or "."
+            tool_calls.append({
+                "turn": turn,
+                "name": call_part.function_call.name,
+                "path": os.path.normpath(path) if isinstance(path, str) else path,
+                "args": args,
+                "call_message": message,
+                "call_index": call_index,
+                "response_message": next_message,
+                "response_index": response_index,
+            })
+
+    return tool_calls
+
+
+def _get_stale_reason(tool_call, later_calls):
+    """
+    Helper function for compact_messages()
+    :param tool_call: Dictionary describing a function call
+    :param later_calls: Dictionaries describing every function call made after tool_call
+    :return: Reason the output of tool_call is out of date, or None if it is still the latest version
+    """
+
+    name, path = tool_call["name"], tool_call["path"]
+    for later_call in later_calls:
+        if later_call["path"] != path:
+            continue
+        if name == "get_file_content" and later_call["name"] in ("write_file", "edit_file"):
+            return f'earlier read of "{path}" removed, the file was {_describe_change(later_call)} later in the ' \
+                   f'conversation'
+        if name == "write_file" and later_call["name"] in ("write_file", "edit_file"):
+            return f'content written to "{path}" removed, the file was {_describe_change(later_call)} later in the ' \
+                   f'conversation'
+        if name == "write_file" and later_call["name"] == "get_file_content" and _is_whole_read(later_call):
+            return f'content written to "{path}" removed, the file was read again later in the conversation'
+        if name in ("get_file_content", "get_files_info", "search_files") and later_call["name"] == name \
+                and _get_options(later_call) == _get_options(tool_call):
+            return f'earlier output of {name} for "{path}" removed, a newer one is later in the conversation'
+        if name == "run_python_file" and later_call["name"] == name \
+                and list(later_call["args"].get("args") or []) == list(tool_call["args"].get("args") or []):
+            return f'earlier output of running "{path}" removed, it was run again with the same arguments later in ' \
+                   f'the conversation'
+        if name == "run_tests" and later_call["name"] == name and not later_call["args"].get("tests"):
+            # Every test that did not pass is run again by a later run, unless it only ran the tests it was asked for
+            return "earlier test results removed, the tests were run again later in the conversation"
+
+    return None
+
+
+def _describe_change(tool_call):
+    """
+    Helper function for _get_stale_reason()
+    :return: How a write_file or edit_file call changed its file, e.g. "rewritten"
+    """
+
+    return "edited" if tool_call["name"] == "edit_file" else "rewritten"
+
+
+def _is_whole_read(tool_call):
+    """
+    Helper function for _get_stale_reason()
+    Only a read of the whole file holds everything a write did. Reads without a range are cut off after MAX_CHARS
+    characters, with a note saying so after the content.
+    :param tool_call: Dictionary describing a get_file_content call
+    :return: True if the call returned the whole file
+    """
+
+    function_response = tool_call["response_message"].parts[tool_call["response_index"]].function_response
+    result = str((function_response.response or {}).get("result", ""))
+    return not _get_options(tool_call) and not result.startswith((STUB_PREFIX, "Error:")) \
+        and "truncated at" not in result[MAX_CHARS:]
+
+
+def _get_options(tool_call):
+    """
+    Helper function for _get_stale_reason()
+    :return: Arguments of a function call other than its path, e.g. the line range of a read
+    """
+
+    return {key: value for key, value in tool_call["args"].items() if key not in ("file_path", "directory")}
+
+
+def _stub_tool_call(tool_call, reason):
+    """
+    Helper function for compact_messages()
+    Replaces the output of a function call (or the content of a write) with a short stub
+    :param tool_call: Dictionary describing a function call
+    :param reason: Short description of why the output was removed
+    :return: Number of characters removed from the conversation
+    """
+
+    stub = f"{STUB_PREFIX} {reason}]"
+
+    if tool_call["name"] == "write_file":
+        parts = tool_call["call_message"].parts
+        function_call = parts[tool_call["call_index"]].function_call
+        content = tool_call["args"].get("content")
+        if not isinstance(content, str) or content.startswith(STUB_PREFIX) or len(content) <= len(stub):
+            return 0
+
+        tool_call["args"] = {**tool_call["args"], "content": stub}
+        parts[tool_call["call_index"]] = types.Part(
+            function_call=types.FunctionCall(id=function_call.id, name=function_call.name, args=tool_call["args"])
+        )
+        return len(content) - len(stub)
+
+    parts = tool_call["response_message"].parts
+    function_response = parts[tool_call["response_index"]].function_response
+    result = str((function_response.response or {}).get("result", ""))
+    if result.startswith(STUB_PREFIX) or len(result) <= len(stub):
+        return 0
+
+    parts[tool_call["response_index"]] = types.Part(
+        function_response=types.FunctionResponse(id=function_response.id, name=function_response.name,
+                                                 response={"result": stub})
+    )
+    return len(result) - len(stub)
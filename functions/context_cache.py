@@ -0,0 +1,225 @@
+"""
+Module to define explicit context caching of the fixed prefix of every request: the system prompt and the tool
+declarations. The prefix is stored once as cached content on the Gemini API, and requests refer to it by name instead
+of resending it, so its tokens are billed at the cached rate.
+
+The cached content's name is recorded in CONTEXT_CACHE_FILE, keyed by a fingerprint of the model, system prompt and
+tools, so later sessions reuse it until any of them change. Its TTL is refreshed once less than half of it is left.
+If the cached content cannot be created or expires in the middle of a request, requests fall back to sending the full
+configuration. Caching is turned off for the rest of the run if the API rejects it (e.g. the prefix is below its minimum
+size), and tried again after CONTEXT_CACHE_RETRY_DELAY seconds after a temporary problem such as a rate limit.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import httpx
+from config import CONTEXT_CACHE_FILE, CONTEXT_CACHE_RETRY_DELAY, CONTEXT_CACHE_TTL, MODEL
+from google.genai import errors, types
+from functions.call_function import get_available_functions
+from functions.get_agent_response import build_generate_content_config
+from functions.request_scheduler import is_retryable
+from prompts import system_prompt
+
+
+class ContextCache:
+    """
+    Handle to the cached system prompt and tool declarations, shared by every session of a run. Thread safe, so
+    concurrent batch sessions can share it.
+    """
+
+    def __init__(self, client, cache_file=CONTEXT_CACHE_FILE, ttl=CONTEXT_CACHE_TTL):
+        """
+        :param client: Gemini API client object
+        :param cache_file: File recording the cached content names
+        :param ttl: Seconds the cached content lives after it is created or refreshed
+        """
+
+        self.client = client
+        self.cache_file = os.path.expanduser(cache_file)
+        self.ttl = ttl
+        self.fingerprint = _get_fingerprint()
+        self.name = None
+        self.expire_time = 0.0
+        self.disabled = False
+        self.retry_at = 0.0  # Time before which a failed attempt to create the cached content is not repeated
+        self._lock = threading.Lock()
+
+    def get_config(self):
+        """
+        Gets the configuration for the next request, creating or refreshing the cached content if needed
+        :return: types.GenerateContentConfig object referring to the cached content, or the full configuration if
+                 caching is not available
+        """
+
+        with self._lock:
+            if self.disabled or time.time() < self.retry_at:
+                return build_generate_content_config()
+
+            try:
+                if self.name is None:
+                    self._load()
+                if self.name is not None and self.expire_time - time.time() < self.ttl / 2:
+                    self._refresh()
+                if self.name is None:
+                    self._create()
+            except (errors.APIError, httpx.HTTPError, OSError) as e:
+                # Caching is an optimization, so any problem with it falls back to sending the full configuration. Only
+                # an error the API would give again turns it off for good.
+                if isinstance(e, errors.APIError) and not is_retryable(e):
+                    self.disabled = True
+                    print(f"Context caching unavailable, sending the full system prompt instead: {e.message}",
+                          file=sys.stderr)
+                else:
+                    self.retry_at = time.time() + CONTEXT_CACHE_RETRY_DELAY
+                    print(f"Context caching failed, sending the full system prompt for the next "
+                          f"{CONTEXT_CACHE_RETRY_DELAY} seconds: {getattr(e, 'message', None) or e}", file=sys.stderr)
+                return build_generate_content_config()
+
+            return _build_cached_config(self.name)
+
+    def generate(self, request):
+        """
+        Makes a request with the cached configuration. If the cached content has expired or been deleted, it is dropped
+        and the request is made again with the full configuration, and the next request creates new cached content.
+        :param request: Function that makes the request given a types.GenerateContentConfig object
+        :return: Result of the request
+        """
+
+        config = self.get_config()
+        try:
+            return request(config)
+        except errors.APIError as e:
+            if config.cached_content is None or not _is_cache_error(e):
+                raise
+            self.invalidate(config.cached_content)
+            return request(build_generate_content_config())
+
+    async def generate_async(self, request):
+        """
+        Async version of generate()
+        :param request: Async function that makes the request given a types.GenerateContentConfig object
+        :return: Result of the request
+        """
+
+        # Creating or refreshing the cached content makes a blocking API call, which must not hold up other sessions
+        config = await asyncio.to_thread(self.get_config)
+        try:
+            return await request(config)
+        except errors.APIError as e:
+            if config.cached_content is None or not _is_cache_error(e):
+                raise
+            self.invalidate(config.cached_content)
+            return await request(build_generate_content_config())
+
+    def invalidate(self, name):
+        """
+        Forgets cached content that the API no longer has
+        :param name: Name of the cached content
+        """
+
+        with self._lock:
+            if self.name == name:
+                self.name = None
+                self.expire_time = 0.0
+                self._save()
+
+    def _load(self):
+        entry = _read_cache_file(self.cache_file).get(self.fingerprint)
+        if entry and entry["expire_time"] > time.time():
+            self.name = entry["name"]
+            self.expire_time = entry["expire_time"]
+
+    def _refresh(self):
+        try:
+            cached_content = self.client.caches.update(
+                name=self.name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s")
+            )
+        except errors.APIError as e:
+            if not _is_cache_error(e):
+                raise
+            self.name = None
+            return
+        self._set(cached_content)
+
+    def _create(self):
+        cached_content = self.client.caches.create(
+            model=MODEL,
+            config=types.CreateCachedContentConfig(
+                display_name="aiagent system prompt and tools",
+                system_instruction=system_prompt,
+                tools=[get_available_functions()],
+                ttl=f"{self.ttl}s",
+            ),
+        )
+        self._set(cached_content)
+
+    def _set(self, cached_content):
+        self.name = cached_content.name
+        self.expire_time = cached_content.expire_time.timestamp() if cached_content.expire_time else \
+            time.time() + self.ttl
+        self._save()
+
+    def _save(self):
+        entries = _read_cache_file(self.cache_file)
+        if self.name is None:
+            entries.pop(self.fingerprint, None)
+        else:
+            entries[self.fingerprint] = {"name": self.name, "expire_time": self.expire_time}
+
+        # Drop entries that have expired so the file does not grow as the prompt and tools change
+        entries = {key: entry for key, entry in entries.items() if entry["expire_time"] > time.time()}
+
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        temp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(entries, file, indent=2)
+        os.replace(temp_path, self.cache_file)
+
+
+def _build_cached_config(name):
+    """
+    Helper function for ContextCache.get_config()
+    The system prompt and tools are part of the cached content, and the API rejects requests that send them again
+    :return: types.GenerateContentConfig object referring to the cached content
+    """
+
+    return types.GenerateContentConfig(cached_content=name)
+
+
+def _get_fingerprint():
+    """
+    Helper function for ContextCache
+    :return: Hash identifying the model, system prompt and tool declarations a cached content was made from
+    """
+
+    tools = get_available_functions().model_dump_json(exclude_none=True)
+    return hashlib.sha256(f"{MODEL}\n{system_prompt}\n{tools}".encode()).hexdigest()
+
+
+def _read_cache_file(cache_file):
+    """
+    Helper function for ContextCache
+    :return: Dictionary of {fingerprint: {"name": ..., "expire_time": ...}} entries, empty if the file is missing or
+             unreadable
+    """
+
+    try:
+        with open(cache_file) as file:
+            entries = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+def _is_cache_error(error):
+    """
+    Helper function for ContextCache
+    :return: True if an API error says the cached content does not exist or has expired
+    """
+
+    return error.code in (400, 403, 404) and "cache" in str(error.message or "").lower()
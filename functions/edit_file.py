@@ -0,0 +1,266 @@
+"""
+This module provides a function that edits part of a specified file. A file is valid if it is within the
+working_directory. The function is intended to be used by an AI agent via the Gemini API. The agent is restricted to
+only access files within the working directory.
+
+Edits are given either as search/replace hunks (old_text is replaced with new_text) or as a unified diff, so a small fix
+only costs the tokens of the lines that change instead of the whole file. Every hunk is checked against the current
+content of the file before anything is written, and the file is written atomically once all hunks apply.
+"""
+
+import os
+import re
+import stat
+from google.genai import types
+from functions.workspace import get_workspace
+from functions.write_file import write_file_atomic
+
+
+# Header of a unified diff hunk, e.g. "@@ -12,3 +12,4 @@"
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def edit_file(working_directory, file_path, edits=None, diff=None):
+    """
+    Edits a file within the working directory by applying search/replace hunks or a unified diff
+    :param working_directory: Directory valid files must be located within
+    :param file_path: Path to target file
+    :param edits: List of {"old_text": ..., "new_text": ...} dictionaries, applied in order
+    :param diff: Unified diff of the changes to the file
+    :return: Success or failure of editing the target file
+    """
+
+    try:
+        # Check for valid arguments
+        working_dir_abs = os.path.abspath(working_directory)
+        target_file_path, entry = get_workspace(working_dir_abs).resolve(file_path)
+
+        if target_file_path is None:
+            return f"Error: Cannot edit \"{file_path}\" as it is outside the permitted working directory"
+
+        if entry is not None and stat.S_ISDIR(entry.st_mode):
+            return f"Error: Cannot edit \"{file_path}\" as it is a directory"
+
+        if entry is None or not stat.S_ISREG(entry.st_mode):
+            return f"Error: \"{file_path}\" file not found. Use write_file to create new files"
+
+        if (edits is None) == (diff is None):
+            return "Error: Provide either edits or diff, but not both"
+
+        with open(target_file_path, "r", newline="") as file:
+            content = file.read()
+
+        if edits is not None:
+            new_content, changed_lines = _apply_edits(content, edits)
+        else:
+            new_content, changed_lines = _apply_diff(content, diff)
+
+        if new_content == content:
+            return f"No changes made to \"{file_path}\", the edits leave the file as it was"
+
+        chars_written = write_file_atomic(working_dir_abs, target_file_path, new_content)
+        if chars_written != len(new_content):
+            return f"Error: Unable to write edited content to \"{file_path}\", the file was left unchanged"
+
+        line_ranges = ", ".join(f"{start}-{end}" if start != end else f"{start}" for start, end in changed_lines)
+        return f"Successfully edited \"{file_path}\" (changed lines: {line_ranges})"
+
+    except PermissionError as e:
+        return f"Error: {e}"
+    except OSError as e:
+        return f"Error: {e}"
+    except TypeError as e:
+        return f"Error: {e}"
+    except ValueError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def _apply_edits(content, edits):
+    """
+    Helper function for edit_file()
+    Applies search/replace hunks in order. Each old_text must appear exactly once in the file as it is when that hunk is
+    applied, so a hunk can never change a different place than the agent intended.
+    :param content: Current content of the file
+    :param edits: List of {"old_text": ..., "new_text": ...} dictionaries
+    :return: Tuple of the edited content and a list of (first, last) line numbers of the changed text
+    """
+
+    if not edits:
+        raise ValueError("edits cannot be empty")
+
+    changed_lines = []
+    for number, edit in enumerate(edits, start=1):
+        old_text, new_text = edit.get("old_text"), edit.get("new_text", "")
+        if not isinstance(old_text, str) or not old_text:
+            raise ValueError(f"edit {number} has no old_text")
+        if not isinstance(new_text, str):
+            raise TypeError(f"edit {number} new_text must be a string")
+
+        count = content.count(old_text)
+        if count == 0:
+            raise ValueError(f"edit {number} old_text was not found in the file. Read the file again to get its "
+                             f"current content")
+        if count > 1:
+            raise ValueError(f"edit {number} old_text appears {count} times in the file. Include more surrounding "
+                             f"lines to make it unique")
+
+        index = content.index(old_text)
+        content = content[:index] + new_text + content[index + len(old_text):]
+        first_line = content.count("\n", 0, index) + 1
+
+        # Lines changed by earlier hunks further down the file move if this hunk changes the number of lines
+        line_shift = new_text.count("\n") - old_text.count("\n")
+        changed_lines = [
+            (first, last) if first < first_line else (first + line_shift, last + line_shift)
+            for first, last in changed_lines
+        ]
+        changed_lines.append((first_line, first_line + max(new_text.count("\n") - new_text.endswith("\n"), 0)))
+
+    return content, sorted(changed_lines)
+
+
+def _apply_diff(content, diff):
+    """
+    Helper function for edit_file()
+    Applies the hunks of a unified diff. The context and removed lines of each hunk must match the file exactly. A hunk
+    is looked for at the line its header gives first, then at the nearest place it matches, in case the line numbers
+    are off.
+    :param content: Current content of the file
+    :param diff: Unified diff of the changes
+    :return: Tuple of the edited content and a list of (first, last) line numbers of the changed text
+    """
+
+    lines = content.splitlines(keepends=True)
+    hunks = _parse_diff(diff)
+    if not hunks:
+        raise ValueError("diff does not contain any hunks starting with a '@@ -a,b +c,d @@' header")
+
+    result = []
+    position = 0
+    changed_lines = []
+    for number, (start, old_lines, new_lines) in enumerate(hunks, start=1):
+        index = _find_hunk(lines, old_lines, position, max(start - 1, position))
+        if index is None:
+            raise ValueError(f"hunk {number} of the diff does not match the file. Read the file again to get its "
+                             f"current content")
+
+        result.extend(lines[position:index])
+        first_line = len(result) + 1
+        result.extend(new_lines)
+        changed_lines.append((first_line, max(len(result), first_line)))
+        position = index + len(old_lines)
+
+    result.extend(lines[position:])
+    return "".join(result), changed_lines
+
+
+def _parse_diff(diff):
+    """
+    Helper function for _apply_diff()
+    :param diff: Unified diff of the changes
+    :return: List of (old start line, old lines, new lines) tuples, one per hunk. Lines keep their line endings.
+    """
+
+    hunks = []
+    hunk = None
+    kind = None
+    lines = diff.splitlines(keepends=True)
+    for index, line in enumerate(lines):
+        header = HUNK_HEADER.match(line)
+        if header:
+            hunk = (int(header.group(1)), [], [])
+            hunks.append(hunk)
+        elif hunk is None or _is_file_header(lines, index) or _is_file_header(lines, index - 1):
+            # Text before the first hunk, or the "--- a/file" and "+++ b/file" lines starting another section. Inside a
+            # hunk the same prefixes can be a removed line starting with "-- " or an added line starting with "++ ".
+            continue
+        elif line.startswith("\\"):
+            # "\ No newline at end of file" applies to the line before it
+            if kind in (" ", "-"):
+                hunk[1][-1] = hunk[1][-1].rstrip("\r\n")
+            if kind in (" ", "+"):
+                hunk[2][-1] = hunk[2][-1].rstrip("\r\n")
+        else:
+            # Models often drop the single space that marks an empty context line
+            kind, text = (line[0], line[1:]) if line[0] in " -+" else (" ", line)
+            if kind in (" ", "-"):
+                hunk[1].append(text)
+            if kind in (" ", "+"):
+                hunk[2].append(text)
+
+    return hunks
+
+
+def _is_file_header(lines, index):
+    """
+    Helper function for _parse_diff()
+    :return: True if lines[index] is the "--- " line of a file header, followed by its "+++ " line and a hunk header
+    """
+
+    return 0 <= index and index + 2 < len(lines) and lines[index].startswith("--- ") \
+        and lines[index + 1].startswith("+++ ") and HUNK_HEADER.match(lines[index + 2]) is not None
+
+
+def _find_hunk(lines, old_lines, position, expected):
+    """
+    Helper function for _apply_diff()
+    :param lines: Lines of the file
+    :param old_lines: Context and removed lines of the hunk
+    :param position: First line the hunk may start at, after the end of the previous hunk
+    :param expected: Line the hunk header says the hunk starts at
+    :return: Index of the line the hunk starts at, or None if it does not match anywhere
+    """
+
+    # Line endings are ignored, so a file without a final newline still matches a diff that has one
+    old_text = [line.rstrip("\r\n") for line in old_lines]
+    size = len(old_lines)
+    matches = [
+        index for index in range(position, len(lines) - size + 1)
+        if [line.rstrip("\r\n") for line in lines[index:index + size]] == old_text
+    ]
+    if not matches:
+        return None
+    return min(matches, key=lambda index: abs(index - expected))
+
+
+# Schema to describe edit_file() to LLM
+schema_edit_file = types.FunctionDeclaration(
+    name="edit_file",
+    description="Edits part of an existing file, relative to the working directory, without resending the whole file. "
+                "Give either edits (search/replace hunks) or diff (a unified diff). Prefer this over write_file for "
+                "changes to existing files.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "file_path": types.Schema(
+                type=types.Type.STRING,
+                description="The path to the file being edited, relative to the working directory. e.g. './foo.py'",
+            ),
+            "edits": types.Schema(
+                type=types.Type.ARRAY,
+                description="Search/replace hunks applied in order. Each old_text must appear exactly once in the file.",
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "old_text": types.Schema(
+                            type=types.Type.STRING,
+                            description="Exact text to replace, with enough surrounding lines to be unique",
+                        ),
+                        "new_text": types.Schema(
+                            type=types.Type.STRING,
+                            description="Text to replace old_text with",
+                        ),
+                    },
+                    required=["old_text", "new_text"],
+                ),
+            ),
+            "diff": types.Schema(
+                type=types.Type.STRING,
+                description="Unified diff of the changes, with '@@ -a,b +c,d @@' hunk headers and context lines",
+            ),
+        },
+        required=["file_path"],
+    ),
+)
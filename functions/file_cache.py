@@ -0,0 +1,192 @@
+"""
+Module to define a cache for the file-reading tools. There is one cache per working directory. Entries are keyed by the
+resolved path of a file or directory and are only served while the path's (mtime_ns, size, inode) still match the
+values recorded when the entry was stored, so a changed file is always read again from disk. write_file invalidates the
+entries of the paths it writes to. The cache is an LRU with a limit on the memory its entries use.
+
+The cache is shared by every session using a working directory, but whether a session has already been given an output
+is tracked per session, with the agent loop decorated by tracks_seen_outputs.
+"""
+
+import contextvars
+import inspect
+import os
+import sys
+import threading
+from collections import OrderedDict
+from functools import wraps
+from config import FILE_CACHE_MAX_BYTES
+
+
+# One cache per absolute working directory, shared by every tool call made within it
+_file_caches = {}
+_file_caches_lock = threading.Lock()
+
+# Outputs already given to the agent session in progress, as (kind, path, validator), or None outside of a session
+_seen_outputs = contextvars.ContextVar("seen_outputs", default=None)
+
+
+class FileCache:
+    """
+    LRU cache of tool outputs. Function calls can run concurrently, so every method is thread safe.
+    """
+
+    def __init__(self, max_bytes=FILE_CACHE_MAX_BYTES):
+        """
+        :param max_bytes: Maximum amount of memory in bytes the cached values can use
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind, path, validator):
+        """
+        Gets a cached value if the path has not changed since it was stored
+        :param kind: Kind of value that was cached for the path, e.g. "content" or "listing"
+        :param path: Absolute path the value was cached for
+        :param validator: Current validator of the path from get_validator()
+        :return: Cached value, or None if there is no up to date value for the path
+        """
+
+        with self._lock:
+            entry = self._entries.get((kind, path))
+            if entry is None or entry[0] != validator:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end((kind, path))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, kind, path, validator, value):
+        """
+        Stores a value for a path, evicting the least recently used values if the cache is over its memory limit
+        :param kind: Kind of value being cached for the path, e.g. "content" or "listing"
+        :param path: Absolute path the value is cached for
+        :param validator: Validator of the path from get_validator() at the time the value was produced
+        :param value: Value to cache
+        """
+
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove((kind, path))
+            self._entries[(kind, path)] = (validator, value, size)
+            self._size += size
+
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, path):
+        """
+        Removes every value cached for a path and for the listings of its parent directories
+        :param path: Absolute path that was changed
+        """
+
+        with self._lock:
+            for kind, cached_path in list(self._entries):
+                is_changed_path = cached_path == path
+                is_parent_listing = kind == "listing" and os.path.commonpath([cached_path, path]) == cached_path
+                if is_changed_path or is_parent_listing:
+                    self._remove((kind, cached_path))
+
+    def invalidate_listings(self):
+        """
+        Removes every cached directory listing. Used after running code that may have changed file sizes without
+        changing the directories that hold them
+        """
+
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == "listing"]:
+                self._remove(key)
+
+    def stats(self):
+        """
+        :return: String describing how well the cache is performing
+        """
+
+        with self._lock:
+            return f"File cache: {self.hits} hits, {self.misses} misses, {len(self._entries)} entries using " \
+                   f"{self._size} bytes"
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+
+def get_file_cache(working_directory):
+    """
+    Gets the cache for a working directory, creating it the first time it is used
+    :param working_directory: Directory the cached tool calls are restricted to
+    :return: FileCache object for the working directory
+    """
+
+    working_dir_abs = os.path.abspath(working_directory)
+    with _file_caches_lock:
+        if working_dir_abs not in _file_caches:
+            _file_caches[working_dir_abs] = FileCache()
+        return _file_caches[working_dir_abs]
+
+
+def get_validator(stat_result):
+    """
+    Builds the values used to check that a cached path has not changed
+    :param stat_result: os.stat_result of the path
+    :return: Tuple of the path's modification time in nanoseconds, size, and inode
+    """
+
+    return stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino
+
+
+def tracks_seen_outputs(function):
+    """
+    Decorator giving every call of an agent loop, sync or async, its own record of the outputs it has been given. Tool
+    calls made from the loop, including on threads started with its context copied, share that record.
+    :param function: Function running an agent session
+    :return: Decorated function
+    """
+
+    if inspect.iscoroutinefunction(function):
+        @wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            token = _seen_outputs.set(set())
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                _seen_outputs.reset(token)
+        return async_wrapper
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _seen_outputs.set(set())
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _seen_outputs.reset(token)
+    return wrapper
+
+
+def mark_seen(kind, path, validator):
+    """
+    Records that the current agent session has been given an output
+    :param kind: Kind of output, e.g. "content" or "listing"
+    :param path: Absolute path the output is for
+    :param validator: Validator of the path from get_validator() when the output was produced
+    :return: True if the session had already been given the same output, False if not or outside of a session
+    """
+
+    seen = _seen_outputs.get()
+    if seen is None:
+        return False
+
+    key = (kind, path, validator)
+    if key in seen:
+        return True
+    seen.add(key)
+    return False
@@ -0,0 +1,89 @@
+"""
+Module to define a streaming version of a single Gemini API call for the AI agent. The agent's text is printed as soon
+as each chunk arrives, and every function call starts running as soon as the part holding it has been received instead
+of after the whole response is complete. The chunks are then combined into a single response so the rest of the agent
+loop can treat it like a response from generate_content().
+"""
+
+from config import MODEL
+from google.genai import types
+from functions.tool_executor import ToolExecutor
+
+
+def generate_content_streamed(client, contents, config, verbose=False):
+    """
+    Function that streams a response from the Gemini API, printing text and running function calls as they arrive
+    :param client: Gemini API client object
+    :param contents: List of types.Content objects making up the conversation
+    :param config: types.GenerateContentConfig object sent with the request
+    :param verbose: Optional argument that enables detailed information about the functions being called
+    :return: Tuple of the combined types.GenerateContentResponse and a list of the types.Content results of its function
+             calls, in the order the agent made the calls
+    """
+
+    parts = []
+    usage_metadata = None
+    finish_reason = None
+    line_open = False
+
+    with ToolExecutor(verbose) as executor:
+        func_call_futures = []
+
+        for chunk in client.models.generate_content_stream(model=MODEL, contents=contents, config=config):
+            # Every chunk reports the usage of the response so far, so the last one holds the totals
+            if chunk.usage_metadata:
+                usage_metadata = chunk.usage_metadata
+
+            if not chunk.candidates:
+                continue
+            candidate = chunk.candidates[0]
+            finish_reason = candidate.finish_reason or finish_reason
+
+            for part in (candidate.content.parts or []) if candidate.content else []:
+                if part.function_call:
+                    # Keep the function call messages off the line of text being streamed
+                    if line_open:
+                        print()
+                        line_open = False
+                    func_call_futures.append(executor.submit(part.function_call))
+                elif part.text and not part.thought:
+                    print(part.text, end="", flush=True)
+                    line_open = not part.text.endswith("\n")
+                _append_part(parts, part)
+
+        func_call_results = [future.result() for future in func_call_futures]
+
+    if line_open:
+        print()
+
+    response_object = types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=parts), finish_reason=finish_reason)]
+        if parts else [],
+        usage_metadata=usage_metadata,
+    )
+    return response_object, func_call_results
+
+
+def _append_part(parts, part):
+    """
+    Helper function for generate_content_streamed()
+    Adds a streamed part to the combined response, joining consecutive text chunks into a single part
+    :param parts: List of types.Part objects received so far
+    :param part: Newly received types.Part object
+    """
+
+    if parts and _is_text_part(parts[-1]) and _is_text_part(part) and parts[-1].thought == part.thought:
+        parts[-1] = types.Part(text=parts[-1].text + part.text, thought=part.thought)
+    else:
+        parts.append(part)
+
+
+def _is_text_part(part):
+    """
+    Helper function for _append_part()
+    :return: True if the part only holds text
+    """
+
+    fields = part.model_dump(exclude_none=True)
+    fields.pop("thought", None)
+    return list(fields) == ["text"]
@@ -4,47 +4,71 @@ agent finishes calling functions or a maximum number of calls for a single query
 response and return if the agent failed to generate a response.
 """
 
-from config import MAX_API_CALLS
+from functools import cache, partial
+from config import MAX_API_CALLS, MODEL
 from google.genai import types
-from functions.call_function import available_functions, call_function
+from functions.call_function import get_available_functions, get_working_directory
+from functions.compact_messages import compact_messages
+from functions.file_cache import get_file_cache, tracks_seen_outputs
+from functions.generate_content_streamed import generate_content_streamed
+from functions.tool_executor import call_functions
+from functions.tracing import get_content_bytes, span
 from prompts import system_prompt
 
 
-def get_agent_response(client, args):
+@tracks_seen_outputs
+def get_agent_response(client, args, context_cache=None, session=None):
     """
     Function that calls the Gemini API to generate a response until the response doesn't include function calls or a
     maximum number of API calls has occurred. Tracks total token usage and prints the final API call response and total
     token usage.
     :param client: Gemini API client object
     :param args: arguments declared when the program was run containing the user's prompt for the AI agent
+    :param context_cache: Optional ContextCache object holding the system prompt and tools as cached content
+    :param session: Optional AgentSession object that every turn is saved to. If it already holds messages, the
+                    conversation continues from them.
     :return: string containing "success" if response was printed and "failure" if MAX_API_CALLS is reached
     """
 
-    # Initialize list of conversation messages with initial user prompt
-    messages = [types.Content(role="user", parts=[types.Part(text=args.user_prompt)])]
+    # Initialize list of conversation messages with initial user prompt, or with the conversation of a resumed session
+    if session is not None and session.messages:
+        messages = session.get_resume_messages(args.user_prompt)
+    else:
+        messages = [types.Content(role="user", parts=[types.Part(text=args.user_prompt)])]
 
     total_prompt_tokens = 0
     total_response_tokens = 0
+    total_cached_tokens = 0
 
-    for _ in range(MAX_API_CALLS):
+    # Estimated prompt tokens removed from the conversation by compaction, and the total saved across all API calls
+    context_tokens_saved = 0
+    total_saved_tokens = 0
+
+    for api_call in range(1, MAX_API_CALLS + 1):
         # Make a call to the Gemini API this creates a GenerateContentResponse object
-        response_object = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=messages,
-            config=types.GenerateContentConfig(
-                tools=[available_functions],
-                system_instruction=system_prompt,
-                #temperature=0 #makes outputs less creative and more consistent
-            ),
-        )
+        with span(f"API call {api_call}", "api", messages=len(messages)) as trace:
+            if trace is not None:
+                trace["bytes_out"] = get_content_bytes(messages)
+
+            request = partial(_generate_content, client, messages, args)
+            if context_cache is not None:
+                response_object, func_call_results = context_cache.generate(request)
+            else:
+                response_object, func_call_results = request(build_generate_content_config())
+
+            if trace is not None:
+                trace_response(trace, response_object)
 
         # Track token usage
         if not response_object.usage_metadata:
             raise RuntimeError("failed API request")
 
+        # Compacted tokens are saved again on every call made after the compaction
+        total_saved_tokens += context_tokens_saved
+
         # Add the Agen's responses to the conversation so it gets the full context on each call
         if response_object.candidates:
-            messages.extend(response_object.candidates)
+            messages.extend(candidate.content for candidate in response_object.candidates if candidate.content)
 
         prompt_tokens = response_object.usage_metadata.prompt_token_count
         response_tokens = response_object.usage_metadata.candidates_token_count
@@ -52,43 +76,130 @@ def get_agent_response(client, args):
             total_prompt_tokens += prompt_tokens
         if response_tokens:
             total_response_tokens += response_tokens
+        total_cached_tokens += response_object.usage_metadata.cached_content_token_count or 0
 
         # Print API response and token usage
         if args.verbose:
             print(f"User prompt: {args.user_prompt}")
             print(f"Prompt tokens: {prompt_tokens}")
             print(f"Response tokens: {response_tokens}")
+            if context_cache is not None:
+                print(f"Cached tokens: {response_object.usage_metadata.cached_content_token_count or 0}")
 
-        func_responses = []
         if response_object.function_calls:
 
-            for call in response_object.function_calls:
-                func_call_result = call_function(call)
-
-                if not func_call_result.parts:
-                    # check if this is the right type of exception to raise
-                    raise RuntimeError(f"Function call ({call}) returned types.Content object does not have .parts list")
-
-                if not func_call_result.parts[0].function_response:
-                    # check if this is the right type of exception to raise
-                    raise RuntimeError(f"First item of function call's ({call}).parts list's .function_response is None")
-
-                if not func_call_result.parts[0].function_response.response:
-                    # check if this is the right type of exception to raise
-                    raise RuntimeError(f"Function call {call} did not return a response (response was 'None')")
-
-                func_responses.append(func_call_result.parts[0])
+            # Independent calls run concurrently, results come back in the order the agent made the calls
+            if func_call_results is None:
+                with span(f"function calls {api_call}", "tool", calls=len(response_object.function_calls)):
+                    func_call_results = call_functions(response_object.function_calls, args.verbose)
+            func_responses = get_function_responses(response_object.function_calls, func_call_results)
 
             if args.verbose:
                 for result in func_responses:
                     print(f"-> {result.function_response.response}")
+                print(get_file_cache(get_working_directory()).stats())
 
         else:
-            print(f"TOKEN USAGE: {total_prompt_tokens} prompt tokens and {total_response_tokens} response tokens")
-            print(response_object.text)
+            if session is not None:
+                session.save_turn(messages)
+            print(f"TOKEN USAGE: {total_prompt_tokens} prompt tokens ({total_cached_tokens} from context cache) and "
+                  f"{total_response_tokens} response tokens ({total_saved_tokens} prompt tokens saved by compaction)")
+            # A streamed response has already been printed as it arrived
+            if not args.stream:
+                print(response_object.text)
             return "success"
 
         # Add function responses to messages passed to Agent
         messages.append(types.Content(role="user", parts=func_responses))
 
+        # Save the turn before compaction stubs out any of its outputs
+        if session is not None:
+            session.save_turn(messages)
+
+        # Replace stale tool outputs with short stubs once the conversation grows past the token budget
+        with span(f"compaction {api_call}", "agent") as trace:
+            tokens_saved = compact_messages(messages, prompt_tokens)
+            if trace is not None:
+                trace["tokens_saved"] = tokens_saved
+        context_tokens_saved += tokens_saved
+
     return "failure"
+
+
+def _generate_content(client, messages, args, config):
+    """
+    Helper function for get_agent_response()
+    Makes a single request to the Gemini API. When streaming, text is printed and function calls start running while
+    the response is still arriving.
+    :return: Tuple of the types.GenerateContentResponse object and the results of its function calls if they were
+             already run, otherwise None
+    """
+
+    if args.stream:
+        return generate_content_streamed(client, messages, config, args.verbose)
+
+    response_object = client.models.generate_content(
+        model=MODEL,
+        contents=messages,
+        config=config,
+    )
+    return response_object, None
+
+
+@cache
+def build_generate_content_config():
+    """
+    Builds the configuration sent with every request to the Gemini API. It is the same for every request, so it is
+    only built (and validated) once.
+    :return: types.GenerateContentConfig object holding the agent's tools and system prompt
+    """
+
+    return types.GenerateContentConfig(
+        tools=[get_available_functions()],
+        system_instruction=system_prompt,
+        #temperature=0 #makes outputs less creative and more consistent
+    )
+
+
+def trace_response(trace, response_object):
+    """
+    Adds the size and token usage of an API response to the details of its trace span
+    :param trace: Dictionary of span details
+    :param response_object: types.GenerateContentResponse object
+    """
+
+    contents = [candidate.content for candidate in response_object.candidates or [] if candidate.content]
+    trace["bytes_in"] = get_content_bytes(contents)
+    trace["function_calls"] = len(response_object.function_calls or [])
+    if response_object.usage_metadata:
+        trace["prompt_tokens"] = response_object.usage_metadata.prompt_token_count
+        trace["response_tokens"] = response_object.usage_metadata.candidates_token_count
+        trace["thought_tokens"] = response_object.usage_metadata.thoughts_token_count
+        trace["cached_tokens"] = response_object.usage_metadata.cached_content_token_count
+
+
+def get_function_responses(function_calls, func_call_results):
+    """
+    Checks the result of each function call and collects the function responses to send back to the agent
+    :param function_calls: The functions the Agent called, in the order it requested them
+    :param func_call_results: types.Content objects returned by call_function() in the same order
+    :return: List of types.Part objects holding each function response
+    """
+
+    func_responses = []
+    for call, func_call_result in zip(function_calls, func_call_results):
+        if not func_call_result.parts:
+            # check if this is the right type of exception to raise
+            raise RuntimeError(f"Function call ({call}) returned types.Content object does not have .parts list")
+
+        if not func_call_result.parts[0].function_response:
+            # check if this is the right type of exception to raise
+            raise RuntimeError(f"First item of function call's ({call}).parts list's .function_response is None")
+
+        if not func_call_result.parts[0].function_response.response:
+            # check if this is the right type of exception to raise
+            raise RuntimeError(f"Function call {call} did not return a response (response was 'None')")
+
+        func_responses.append(func_call_result.parts[0])
+
+    return func_responses
@@ -0,0 +1,106 @@
+"""
+Module to define an asyncio version of get_agent_response(). Many agent sessions can share one Gemini client and its
+connection pool while they wait on the Gemini API. Instead of printing the agent's final response, each session returns
+a dictionary describing its result so a caller running many sessions can report them as they finish.
+"""
+
+import asyncio
+from functools import partial
+from config import MAX_API_CALLS, MODEL
+from google.genai import types
+from functions.call_function import get_working_directory
+from functions.compact_messages import compact_messages
+from functions.file_cache import get_file_cache, tracks_seen_outputs
+from functions.get_agent_response import build_generate_content_config, get_function_responses
+from functions.tool_executor import call_functions
+
+
+@tracks_seen_outputs
+async def get_agent_response_async(client, user_prompt, verbose=False, context_cache=None):
+    """
+    Function that calls the Gemini API asynchronously to generate a response until the response doesn't include
+    function calls or a maximum number of API calls has occurred. Function calls run on a worker thread so other
+    sessions can keep making requests in the meantime.
+    :param client: Gemini API client object
+    :param user_prompt: The user's prompt for the AI agent
+    :param verbose: Optional argument that enables detailed information about each API call
+    :param context_cache: Optional ContextCache object holding the system prompt and tools as cached content
+    :return: Dictionary with the session's status ("success" or "failure"), final response, API calls, and token usage
+    """
+
+    # Initialize list of conversation messages with initial user prompt
+    messages = [types.Content(role="user", parts=[types.Part(text=user_prompt)])]
+
+    total_prompt_tokens = 0
+    total_response_tokens = 0
+    total_cached_tokens = 0
+
+    # Estimated prompt tokens removed from the conversation by compaction, and the total saved across all API calls
+    context_tokens_saved = 0
+    total_saved_tokens = 0
+
+    for api_calls in range(1, MAX_API_CALLS + 1):
+        request = partial(client.aio.models.generate_content, model=MODEL, contents=messages)
+        if context_cache is not None:
+            response_object = await context_cache.generate_async(lambda config: request(config=config))
+        else:
+            response_object = await request(config=build_generate_content_config())
+
+        # Track token usage
+        if not response_object.usage_metadata:
+            raise RuntimeError("failed API request")
+
+        # Compacted tokens are saved again on every call made after the compaction
+        total_saved_tokens += context_tokens_saved
+
+        if response_object.candidates:
+            messages.extend(candidate.content for candidate in response_object.candidates if candidate.content)
+
+        prompt_tokens = response_object.usage_metadata.prompt_token_count
+        response_tokens = response_object.usage_metadata.candidates_token_count
+        if prompt_tokens:
+            total_prompt_tokens += prompt_tokens
+        if response_tokens:
+            total_response_tokens += response_tokens
+        total_cached_tokens += response_object.usage_metadata.cached_content_token_count or 0
+
+        if verbose:
+            print(f"User prompt: {user_prompt}")
+            print(f"Prompt tokens: {prompt_tokens}")
+            print(f"Response tokens: {response_tokens}")
+
+        if not response_object.function_calls:
+            return _build_result("success", response_object.text, api_calls, total_prompt_tokens,
+                                 total_response_tokens, total_cached_tokens, total_saved_tokens)
+
+        # Run the tools off the event loop so other sessions are not blocked by slow function calls
+        func_call_results = await asyncio.to_thread(call_functions, response_object.function_calls, verbose)
+        func_responses = get_function_responses(response_object.function_calls, func_call_results)
+
+        if verbose:
+            for result in func_responses:
+                print(f"-> {result.function_response.response}")
+            print(get_file_cache(get_working_directory()).stats())
+
+        messages.append(types.Content(role="user", parts=func_responses))
+        context_tokens_saved += compact_messages(messages, prompt_tokens)
+
+    return _build_result("failure", None, MAX_API_CALLS, total_prompt_tokens, total_response_tokens,
+                         total_cached_tokens, total_saved_tokens)
+
+
+def _build_result(status, response, api_calls, prompt_tokens, response_tokens, cached_tokens, saved_tokens):
+    """
+    Helper function for get_agent_response_async()
+    :return: Dictionary describing the result of an agent session
+    """
+
+    return {
+        "status": status,
+        "response": response,
+        "api_calls": api_calls,
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "cached_tokens": cached_tokens,
+        "saved_tokens": saved_tokens,
+    }
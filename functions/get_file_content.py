@@ -2,40 +2,82 @@
 This module provides a function that gets file content for a specified file. A file path is valid if it is within the
 working_directory. The function is intended to be used by an AI agent via the Gemini API. The agent is restricted to
 only access files within the working directory.
+
+Parts of large files can be read by byte range (offset/length) or by line range (start_line/end_line). Ranges are read
+through mmap, and line ranges use an index of line start offsets that is built once per version of a file and kept in
+the file cache, so reading the end of a large file costs about the same as reading its start.
 """
 
+import mmap
 import os
-from config import MAX_CHARS
+import stat
+from array import array
+from contextlib import contextmanager
+from config import BINARY_CHECK_BYTES, MAX_CHARS
 from google.genai import types
+from functions.file_cache import get_file_cache, get_validator, mark_seen
+from functions.workspace import get_workspace
 
 
-def get_file_content(working_directory, file_path):
+def get_file_content(working_directory, file_path, offset=None, length=None, start_line=None, end_line=None):
     """
     Function that gets file content for a specified file
     :param working_directory: Directory valid files must be located within
     :param file_path: Path to target file
+    :param offset: Optional byte offset to start reading from
+    :param length: Optional number of bytes to read from offset, at most MAX_CHARS
+    :param start_line: Optional first line to read, counting from 1
+    :param end_line: Optional last line to read, inclusive
     :return: Content of file or failure of reading from target file
     """
 
     try:
-        # Check for valid arguments
+        # Check for valid arguments. The workspace tree both validates the target and has the metadata to check if
+        # a cached read is still up to date.
         working_dir_abs = os.path.abspath(working_directory)
-        target_file_path = os.path.normpath(os.path.join(working_dir_abs, file_path))
-        is_valid_target_file = os.path.commonpath([working_dir_abs, target_file_path]) == working_dir_abs
+        target_file_path, file_stat = get_workspace(working_dir_abs).resolve(file_path)
 
-        if not is_valid_target_file:
+        if target_file_path is None:
             return f'Error: Cannot read "{file_path}" as it is outside the permitted working directory'
 
-        if not os.path.isfile(target_file_path):
-            if os.path.isdir(target_file_path):
+        if file_stat is None:
+            return f"Error: \"{file_path}\" file not found"
+
+        if not stat.S_ISREG(file_stat.st_mode):
+            if stat.S_ISDIR(file_stat.st_mode):
                 return f"Error: \"{file_path}\" is a directory instead of a file and cannot be read"
             return f"Error: \"{file_path}\" file not found"
 
+        file_cache = get_file_cache(working_dir_abs)
+        validator = get_validator(file_stat)
+
+        if offset is not None or length is not None:
+            if start_line is not None or end_line is not None:
+                return "Error: Use either offset/length or start_line/end_line, not both"
+            return _read_byte_range(target_file_path, file_path, file_stat.st_size, offset, length)
+
+        if start_line is not None or end_line is not None:
+            return _read_line_range(target_file_path, file_path, file_cache, validator, start_line, end_line)
+
+        # Serve unchanged files from memory, and let the agent know if this session has already seen this content
+        file_content = file_cache.get("content", target_file_path, validator)
+        if file_content is not None:
+            if mark_seen("content", target_file_path, validator):
+                return f'[File "{file_path}" is unchanged since it was last read]\n' + file_content
+            return file_content
+
+        if _is_binary(target_file_path):
+            return f"Error: \"{file_path}\" appears to be a binary file and cannot be read"
+
         # Read from file and check if file continues beyond what is read
         with open(target_file_path, "r") as file:
             file_content = file.read(MAX_CHARS)
             if file.read(1):
-                file_content += f'[...File "{file_path}" truncated at {MAX_CHARS} characters]'
+                file_content += f'[...File "{file_path}" truncated at {MAX_CHARS} characters. Use start_line or ' \
+                                f'offset to read the rest]'
+
+        file_cache.put("content", target_file_path, validator, file_content)
+        mark_seen("content", target_file_path, validator)
 
         return file_content
 
@@ -43,17 +85,149 @@ def get_file_content(working_directory, file_path):
         return f"Error: {e}"
     except TypeError as e:
         return f"Error: {e}"
+    except ValueError as e:
+        return f"Error: {e}"
     except UnicodeEncodeError as e:
         return f"Error: {e}"
     except Exception as e:
         return f"Error: {e}"
 
 
+def _read_byte_range(target_file_path, file_path, file_size, offset, length):
+    """
+    Helper function for get_file_content()
+    Reads a range of bytes through mmap. Characters split by either end of the range are replaced.
+    :param target_file_path: Absolute path to the file
+    :param file_path: Path to the file as given by the agent
+    :param file_size: Size of the file in bytes
+    :param offset: Byte offset to start reading from, defaults to 0
+    :param length: Number of bytes to read, defaults to and is limited to MAX_CHARS
+    :return: Header describing the range followed by its content
+    """
+
+    offset = int(offset or 0)
+    length = min(int(length if length is not None else MAX_CHARS), MAX_CHARS)
+    if offset < 0 or length < 0:
+        return "Error: offset and length cannot be negative"
+
+    end = min(offset + length, file_size)
+    with _map_file(target_file_path, file_size) as file_map:
+        if _is_binary_sample(file_map[:BINARY_CHECK_BYTES]):
+            return f"Error: \"{file_path}\" appears to be a binary file and cannot be read"
+        content = file_map[offset:end].decode(errors="replace")
+
+    return f'[Bytes {offset}-{max(end, offset)} of {file_size} in "{file_path}"]\n' + content
+
+
+def _read_line_range(target_file_path, file_path, file_cache, validator, start_line, end_line):
+    """
+    Helper function for get_file_content()
+    Reads a range of lines through mmap, using the file's line index to find where the range starts and ends
+    :param target_file_path: Absolute path to the file
+    :param file_path: Path to the file as given by the agent
+    :param file_cache: FileCache object holding line indexes for the working directory
+    :param validator: Current validator of the file
+    :param start_line: First line to read counting from 1, defaults to 1
+    :param end_line: Last line to read inclusive, defaults to the end of the file. At most MAX_CHARS characters are read
+    :return: Header describing the range followed by its content
+    """
+
+    start_line = int(start_line or 1)
+    file_size = validator[1]
+    if start_line < 1 or (end_line is not None and int(end_line) < start_line):
+        return "Error: start_line must be at least 1 and end_line cannot be before start_line"
+
+    with _map_file(target_file_path, file_size) as file_map:
+        if _is_binary_sample(file_map[:BINARY_CHECK_BYTES]):
+            return f"Error: \"{file_path}\" appears to be a binary file and cannot be read"
+
+        line_index = file_cache.get("line_index", target_file_path, validator)
+        if line_index is None:
+            line_index = _build_line_index(file_map, file_size)
+            file_cache.put("line_index", target_file_path, validator, line_index)
+
+        total_lines = len(line_index)
+        if start_line > total_lines:
+            return f"Error: \"{file_path}\" only has {total_lines} lines"
+
+        end_line = min(int(end_line), total_lines) if end_line is not None else total_lines
+        start = line_index[start_line - 1]
+        end = line_index[end_line] if end_line < total_lines else file_size
+        content = file_map[start:min(end, start + MAX_CHARS)].decode(errors="replace")
+
+    # Stop at the last whole line that fits, and tell the agent where to continue from. A first line that does not fit
+    # on its own can only be continued by byte offset.
+    if end - start > MAX_CHARS and "\n" not in content:
+        end_line = start_line
+        content += f'[...Line {start_line} truncated at {MAX_CHARS} characters. Continue with ' \
+                   f'offset={start + MAX_CHARS}]'
+    elif end - start > MAX_CHARS:
+        content = content[:content.rfind("\n") + 1]
+        end_line = start_line + content.count("\n") - 1
+        content += f'[...Range truncated at {MAX_CHARS} characters. Continue with start_line={end_line + 1}]'
+
+    return f'[Lines {start_line}-{end_line} of {total_lines} in "{file_path}"]\n' + content
+
+
+def _build_line_index(file_map, file_size):
+    """
+    Helper function for _read_line_range()
+    :param file_map: mmap of the file
+    :param file_size: Size of the file in bytes
+    :return: array of the byte offset each line starts at
+    """
+
+    line_index = array("Q", [0] if file_size else [])
+    position = file_map.find(b"\n")
+    while position != -1 and position + 1 < file_size:
+        line_index.append(position + 1)
+        position = file_map.find(b"\n", position + 1)
+    return line_index
+
+
+@contextmanager
+def _map_file(target_file_path, file_size):
+    """
+    Helper context manager for the range readers
+    Maps a file into memory read-only. Empty files cannot be mapped, so they are given an empty bytes object instead.
+    """
+
+    if not file_size:
+        yield b""
+        return
+
+    with open(target_file_path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+            yield file_map
+
+
+def _is_binary(target_file_path):
+    """
+    Helper function for get_file_content()
+    :return: True if the start of the file looks like binary data, checked without decoding the file
+    """
+
+    with open(target_file_path, "rb") as file:
+        return _is_binary_sample(file.read(BINARY_CHECK_BYTES))
+
+
+def _is_binary_sample(sample):
+    """
+    Helper function for the binary checks
+    :param sample: Bytes from the start of a file
+    :return: True if the sample holds a NUL byte, which text files never do
+    """
+
+    return b"\0" in sample
+
+
 # Schema to describe get_file_content() to LLM
-# Only one 'parameter' because we pass the working dir so the LLM just needs to know to provide the other path
+# The working dir is passed in for the LLM so it only needs to know to provide the path and an optional range
 schema_get_file_content = types.FunctionDeclaration(
     name="get_file_content",
-    description="Function that gets file content for a specified file relative to the working directory",
+    description=f"Function that gets file content for a specified file relative to the working directory. Reads the "
+                f"first {MAX_CHARS} characters unless a byte range (offset/length) or line range "
+                f"(start_line/end_line) is given",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -61,7 +235,23 @@ schema_get_file_content = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="The path to open the file that content is being retrieved from, relative to the " \
                             "working directory. e.g. './main.py'"
-            )
+            ),
+            "offset": types.Schema(
+                type=types.Type.INTEGER,
+                description="Byte offset to start reading from. Cannot be combined with start_line/end_line"
+            ),
+            "length": types.Schema(
+                type=types.Type.INTEGER,
+                description=f"Number of bytes to read from offset, at most {MAX_CHARS}"
+            ),
+            "start_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="First line to read, counting from 1. Cannot be combined with offset/length"
+            ),
+            "end_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="Last line to read, inclusive (default is the end of the file, up to the character limit)"
+            ),
         },
         required=["file_path"]
     )
@@ -8,39 +8,82 @@ the files' information in the following format:
 - FILENAME: file_size = SIZE, is_dir = BOOL
 - FILENAME: file_size = SIZE, is_dir = BOOL
 "
+Listings can also walk the directory recursively, filtered by depth, glob patterns, and ignore files. Paths are then
+relative to the listed directory. Entries are sorted and returned in pages of at most MAX_LIST_ENTRIES, with a cursor
+to pass back in to get the next page.
 """
 
+import fnmatch
 import os
+import stat
+from config import DEFAULT_LIST_EXCLUDES, IGNORE_FILES, MAX_LIST_ENTRIES
 from google.genai import types
+from functions.file_cache import get_file_cache, get_validator, mark_seen
+from functions.workspace import get_workspace
 
 
-def get_files_info(working_directory, directory="."):
+def get_files_info(working_directory, directory=".", recursive=False, max_depth=None, include=None, exclude=None,
+                   cursor=None):
     """
     Gets information about all files in a given directory
     :param working_directory: The directory agent is allowed to access and work in
     :param directory: Relative file-path to target directory to get information about
+    :param recursive: List the contents of subdirectories as well, skipping anything matched by ignore files
+    :param max_depth: Maximum number of directory levels to list when recursive, 1 being the target directory only
+    :param include: Glob patterns, only entries whose path or name matches one of them are listed
+    :param exclude: Glob patterns, entries whose path or name matches one of them are skipped along with their contents
+    :param cursor: Path of the last entry of the previous page, to continue a listing that was cut short
     :return: String listing each file, its size, and if it is a directory
     """
 
     try:
         # Check for valid arguments
         working_dir_abs = os.path.abspath(working_directory)
-        target_dir = os.path.normpath(os.path.join(working_dir_abs, directory))
-        is_valid_target_dir = os.path.commonpath([working_dir_abs, target_dir]) == working_dir_abs
+        workspace = get_workspace(working_dir_abs)
+        target_dir, dir_entry = workspace.resolve(directory)
 
-        if not is_valid_target_dir:
+        if target_dir is None:
             return f"Error: Cannot list \"{directory}\" as it is outside permitted working directory"
 
-        if not os.path.exists(target_dir):
+        if dir_entry is None:
             return f"Error: \"{target_dir}\" does not exist"
 
-        if not os.path.isdir(target_dir):
+        if not stat.S_ISDIR(dir_entry.st_mode):
             return f"Error: \"{directory}\" exists but it is not a directory"
 
-        # Get information for all files in the directory
-        files_info = list(map(_build_file_str(target_dir), os.listdir(target_dir)))
+        # Only plain listings of a single directory are cached
+        is_plain_listing = not (recursive or include or exclude or cursor)
 
-        return '\n'.join(files_info)
+        # Serve unchanged directories from memory, and let the agent know if this session has already seen this listing
+        if is_plain_listing:
+            file_cache = get_file_cache(working_dir_abs)
+            validator = get_validator(dir_entry)
+            files_info = file_cache.get("listing", target_dir, validator)
+            if files_info is not None:
+                if mark_seen("listing", target_dir, validator):
+                    return f"[Directory \"{directory}\" is unchanged since it was last listed]\n" + files_info
+                return files_info
+
+        # Get information for all files in the directory, one page at a time
+        depth = (int(max_depth) if max_depth else None) if recursive else 1
+        excludes = list(exclude or []) + (list(DEFAULT_LIST_EXCLUDES) if recursive else [])
+        entries = _walk(workspace, target_dir, depth, include or [], excludes, recursive, _get_cursor_key(cursor))
+
+        files_info = []
+        for relative_path, entry in entries:
+            if len(files_info) == MAX_LIST_ENTRIES:
+                files_info.append(f"[Listing stopped after {MAX_LIST_ENTRIES} entries. Call get_files_info again with "
+                                  f"cursor=\"{last_path}\" to continue]")
+                break
+            files_info.append(_build_file_str(relative_path, workspace.follow(entry)))
+            last_path = relative_path
+
+        files_info = '\n'.join(files_info)
+        if is_plain_listing:
+            file_cache.put("listing", target_dir, validator, files_info)
+            mark_seen("listing", target_dir, validator)
+
+        return files_info
 
     except PermissionError as e:
         return f"Error: {e}"
@@ -52,25 +95,158 @@ def get_files_info(working_directory, directory="."):
         return f"Error: {e}"
 
 
-def _build_file_str(target_directory):
+def _walk(workspace, target_dir, max_depth, include, exclude, use_ignore_files, cursor_key):
+    """
+    Helper function for get_files_info()
+    Walks a directory tree depth first through the workspace tree, listing each directory's contents right after it in
+    sorted order so pages are stable. Entries come from memory, so a listing makes no stat calls.
+    :param workspace: Workspace object of the working directory
+    :param target_dir: Absolute path of the directory to list
+    :param max_depth: Maximum number of directory levels to list, or None for no limit
+    :param include: Glob patterns entries must match to be listed
+    :param exclude: Glob patterns of entries to skip along with their contents
+    :param use_ignore_files: Skip entries matched by the patterns in IGNORE_FILES
+    :param cursor_key: Path components of the last entry of the previous page, or None to start from the beginning
+    :return: Generator of (path relative to target_dir, WorkspaceEntry) tuples
+    """
+
+    # Stack of (iterator over a directory's sorted entries, its path components, ignore patterns that apply within it)
+    stack = [_scan(workspace, target_dir, (), [], use_ignore_files)]
+    while stack:
+        entries, dir_key, ignore_patterns = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+
+        key = dir_key + (entry.name,)
+        relative_path = "/".join(key)
+        # Symlinks are listed as what they point to, but never walked into
+        target = workspace.follow(entry)
+        is_dir = target is not None and stat.S_ISDIR(target.st_mode)
+
+        if _matches(relative_path, entry.name, exclude) or _is_ignored(key, is_dir, ignore_patterns):
+            continue
+
+        # Pre-order walk in sorted order, so subtrees that come entirely before the cursor were in earlier pages
+        is_before_cursor = cursor_key is not None and key <= cursor_key
+        if is_before_cursor and key != cursor_key[:len(key)]:
+            continue
+
+        if not is_before_cursor and (not include or _matches(relative_path, entry.name, include)):
+            yield relative_path, entry
+
+        if is_dir and target is entry and (max_depth is None or len(key) < max_depth):
+            stack.append(_scan(workspace, entry.path, key, ignore_patterns, use_ignore_files))
+
+
+def _scan(workspace, dir_path, dir_key, ignore_patterns, use_ignore_files):
+    """
+    Helper function for _walk()
+    :return: Tuple of an iterator over the directory's entries sorted by name, its path components, and the ignore
+             patterns that apply within it
+    """
+
+    entries = workspace.list_directory(dir_path)
+    if use_ignore_files:
+        names = {entry.name for entry in entries}
+        ignore_files = [os.path.join(dir_path, name) for name in IGNORE_FILES if name in names]
+        ignore_patterns = ignore_patterns + _read_ignore_files(ignore_files, dir_key)
+
+    return iter(entries), dir_key, ignore_patterns
+
+
+def _get_cursor_key(cursor):
+    """
+    Helper function for get_files_info()
+    :param cursor: Path of the last entry of the previous page
+    :return: Tuple of the cursor's path components, or None if there is no cursor
+    """
+
+    if not cursor:
+        return None
+    return tuple(part for part in os.path.normpath(cursor).split(os.sep) if part not in ("", "."))
+
+
+def _matches(relative_path, name, patterns):
+    """
+    Helper function for _walk()
+    :return: True if the entry's path or name matches one of the glob patterns
+    """
+
+    return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def _read_ignore_files(ignore_files, dir_key):
+    """
+    Helper function for _walk()
+    Reads the ignore files in a directory. Supports comments, trailing "/" for directories only, and patterns anchored
+    to the ignore file's directory when they contain a "/". Negated patterns are not supported and are skipped.
+    :param ignore_files: Absolute paths of the ignore files in the directory
+    :param dir_key: Path components of the directory relative to the listed directory
+    :return: List of (anchor path components, pattern, directories only, anchored) tuples
+    """
+
+    patterns = []
+    for ignore_file in ignore_files:
+        try:
+            with open(ignore_file, "r") as file:
+                lines = file.read().splitlines()
+        except (FileNotFoundError, NotADirectoryError, UnicodeDecodeError):
+            continue
+
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#") or line.startswith("!"):
+                continue
+            directories_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            patterns.append((dir_key, line.lstrip("/"), directories_only, anchored))
+
+    return patterns
+
+
+def _is_ignored(key, is_dir, ignore_patterns):
+    """
+    Helper function for _walk()
+    :param key: Path components of the entry relative to the listed directory
+    :param is_dir: True if the entry is a directory
+    :param ignore_patterns: Patterns from _read_ignore_files() that apply to the entry's directory
+    :return: True if an ignore file matches the entry
+    """
+
+    for anchor, pattern, directories_only, anchored in ignore_patterns:
+        if directories_only and not is_dir:
+            continue
+        if anchored:
+            if fnmatch.fnmatch("/".join(key[len(anchor):]), pattern):
+                return True
+        elif fnmatch.fnmatch(key[-1], pattern):
+            return True
+    return False
+
+
+def _build_file_str(relative_path, entry):
     """
     Helper function for get_files_info()
-    Builds a string containing name, size, and is_dir information about a file. Curried the function to work with map
-    and practice functional programming techniques.
-    :param target_directory: The directory the file is in
+    Builds a string containing name, size, and is_dir information about a file
+    :param relative_path: Path of the file relative to the listed directory
+    :param entry: WorkspaceEntry of the file with symlinks followed, or None for a broken symlink
     :return: String documenting file information
     """
 
-    def inner(file):
-        file_path = os.path.join(target_directory, file)
-        return f"- {file}: file_size={os.path.getsize(file_path)} bytes, is_dir={os.path.isdir(file_path)}"
-    return inner
+    if entry is None:
+        return f"- {relative_path}: file_size=unknown, is_dir=False"
+    return f"- {relative_path}: file_size={entry.st_size} bytes, is_dir={stat.S_ISDIR(entry.st_mode)}"
 
 
 # Schema to describe get_files_infor() to LLM
 schema_get_files_info = types.FunctionDeclaration(
     name="get_files_info",
-    description="Lists files in a specified directory relative to the working directory, providing file size and directory status",
+    description="Lists files in a specified directory relative to the working directory, providing file size and "
+                "directory status. Can list a whole directory tree in one call with recursive=true. Long listings "
+                "are returned in pages",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -78,7 +254,36 @@ schema_get_files_info = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="Directory path to list files from, relative to the working directory (default is the working directory itself)",
             ),
+            "recursive": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="List the contents of all subdirectories as well, skipping files matched by .gitignore "
+                            "(default is false)",
+            ),
+            "max_depth": types.Schema(
+                type=types.Type.INTEGER,
+                description="When recursive, the maximum number of directory levels to list. 1 lists only the "
+                            "directory itself (default is no limit)",
+            ),
+            "include": types.Schema(
+                type=types.Type.ARRAY,
+                description="Glob patterns, only list entries whose path or name matches one of them. e.g. ['*.py']",
+                items=types.Schema(
+                    type=types.Type.STRING,
+                )
+            ),
+            "exclude": types.Schema(
+                type=types.Type.ARRAY,
+                description="Glob patterns, skip entries whose path or name matches one of them along with their "
+                            "contents. e.g. ['tests']",
+                items=types.Schema(
+                    type=types.Type.STRING,
+                )
+            ),
+            "cursor": types.Schema(
+                type=types.Type.STRING,
+                description="Cursor given at the end of a listing that was cut short, to get the next page",
+            ),
         },
         required=["directory"],
     ),
-)
\ No newline at end of file
+)
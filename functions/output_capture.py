@@ -0,0 +1,121 @@
+"""
+This module provides memory-bounded capture of the stdout and stderr of a running python file. Output is read
+incrementally as the process writes it, and only the first OUTPUT_HEAD_BYTES and last OUTPUT_TAIL_BYTES of each stream
+are kept, so memory stays flat no matter how much the process prints. Once the process has written more than
+MAX_OUTPUT_BYTES in total it is stopped early.
+"""
+
+import contextvars
+import locale
+import os
+import sys
+import threading
+from config import MAX_OUTPUT_BYTES, OUTPUT_HEAD_BYTES, OUTPUT_TAIL_BYTES
+
+
+class BoundedBuffer:
+    """
+    Keeps the start and the end of a stream of bytes, counting how many bytes in between were dropped
+    """
+
+    def __init__(self, head_bytes=OUTPUT_HEAD_BYTES, tail_bytes=OUTPUT_TAIL_BYTES):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total_bytes = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    def write(self, chunk):
+        self.total_bytes += len(chunk)
+
+        head_space = self.head_bytes - len(self._head)
+        if head_space > 0:
+            self._head += chunk[:head_space]
+            chunk = chunk[head_space:]
+
+        self._tail += chunk[-self.tail_bytes:] if self.tail_bytes else b""
+        if len(self._tail) > self.tail_bytes:
+            del self._tail[:len(self._tail) - self.tail_bytes]
+
+    @property
+    def dropped_bytes(self):
+        return self.total_bytes - len(self._head) - len(self._tail)
+
+    def get_text(self):
+        """
+        Decodes the kept output the same way subprocess.run() does with text=True. If bytes were dropped, a marker is
+        placed where they were and characters split by the cut are replaced.
+        :return: String of the kept output
+        """
+
+        encoding = "utf-8" if sys.flags.utf8_mode else locale.getencoding()
+        if not self.dropped_bytes:
+            text = (self._head + self._tail).decode(encoding)
+        else:
+            text = self._head.decode(encoding, errors="replace") + \
+                   f"\n[...{self.dropped_bytes} bytes of output dropped...]\n" + \
+                   self._tail.decode(encoding, errors="replace")
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+class OutputCapture:
+    """
+    Reads the stdout and stderr pipes of a process on background threads into bounded buffers
+    """
+
+    def __init__(self, max_bytes=MAX_OUTPUT_BYTES, on_output=None):
+        """
+        :param max_bytes: Number of bytes the process can write in total before it is stopped
+        :param on_output: Optional function called with each chunk of bytes as soon as the process writes it
+        """
+        self.max_bytes = max_bytes
+        self.on_output = on_output
+        self.stdout = BoundedBuffer()
+        self.stderr = BoundedBuffer()
+        self.limit_exceeded = False
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop_process = None
+
+    def start(self, stdout_file, stderr_file, stop_process):
+        """
+        Starts reading from the process's pipes. The pipes are closed once the process closes its ends.
+        :param stdout_file: File object of the read end of the stdout pipe
+        :param stderr_file: File object of the read end of the stderr pipe
+        :param stop_process: Function that kills the process, called once if it writes more than max_bytes
+        """
+
+        self._stop_process = stop_process
+        for pipe, buffer in ((stdout_file, self.stdout), (stderr_file, self.stderr)):
+            # on_output runs in the context of the caller, so output printed by it reaches the request it belongs to
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(self._read, pipe, buffer),
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self, timeout=None):
+        """
+        Waits for the process to close its pipes
+        :param timeout: Maximum amount of time in seconds to wait for each pipe, as processes started by the python
+                        file may keep the pipes open after it exits
+        """
+
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _read(self, pipe, buffer):
+        try:
+            while chunk := os.read(pipe.fileno(), 65536):
+                with self._lock:
+                    buffer.write(chunk)
+                    total_bytes = self.stdout.total_bytes + self.stderr.total_bytes
+                    should_stop = total_bytes > self.max_bytes and not self.limit_exceeded
+                    if should_stop:
+                        self.limit_exceeded = True
+
+                if self.on_output:
+                    self.on_output(chunk)
+                if should_stop:
+                    self._stop_process()
+        finally:
+            pipe.close()
@@ -0,0 +1,319 @@
+"""
+Module to define a copy-on-write overlay of the working directory. While an overlay is active, writes and edits go to
+a scratch directory that holds only the files they touched: the first write or edit of a file copies it there, and
+reads of files that were never written keep going to the real working directory. Running code, or listing and
+searching a directory with pending changes, needs the whole tree in one place, so those calls first fill in the rest
+of the scratch directory and every call runs there from then on. The real working directory is left untouched until
+the overlay is committed:
+- commit() copies every file that was added or changed into place and removes deleted ones as a single batch. All new
+  content is staged next to its target first, then renamed into place, and the batch is rolled back if any rename fails.
+- discard() throws the scratch directory away, so speculative edits that did not work out cost nothing to undo.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from config import DEFAULT_LIST_EXCLUDES
+from functions.file_cache import get_file_cache
+from functions.search_index import get_search_index
+from functions.workspace import close_workspace, get_workspace
+
+
+# Functions that only read the file named by their file_path argument
+FILE_READ_FUNCTIONS = {"get_file_content"}
+
+# Functions that only change the file named by their file_path argument
+FILE_WRITE_FUNCTIONS = {"write_file", "edit_file"}
+
+# Functions that only read files under their directory argument
+DIRECTORY_READ_FUNCTIONS = {"get_files_info", "search_files"}
+
+# Overlay that function calls currently run against, or None to use the working directory directly
+_active_overlay = None
+
+
+class OverlayConflictError(Exception):
+    """
+    Raised when files in the real working directory changed while the overlay held pending changes to them
+    """
+
+
+class WorkspaceOverlay:
+    """
+    Pending changes to a working directory, held in a scratch directory
+    """
+
+    def __init__(self, working_directory):
+        """
+        :param working_directory: Directory the overlay covers
+        """
+
+        self.working_dir_abs = os.path.abspath(working_directory)
+        self.scratch_dir = None
+        self._is_complete = False
+        self._snapshot = {}
+        self._lock = threading.Lock()
+
+    def get_directory(self, function_name=None, args=None):
+        """
+        Gets the directory a function call should run in, copying into the scratch directory what the call needs there
+        :param function_name: Name of the function being called
+        :param args: Dictionary of the call's arguments
+        :return: Path of the scratch directory, or of the real working directory if the call only reads files that
+                 have no pending changes
+        """
+
+        args = args or {}
+        with self._lock:
+            if self._is_complete:
+                return self.scratch_dir
+
+            if function_name in FILE_READ_FUNCTIONS | FILE_WRITE_FUNCTIONS:
+                path = self._get_relative_path(args.get("file_path"))
+                if path is not None and function_name in FILE_READ_FUNCTIONS:
+                    return self.scratch_dir if path in self._snapshot else self.working_dir_abs
+                if path is not None:
+                    self._copy_file(path)
+                    return self.scratch_dir
+
+            if function_name in DIRECTORY_READ_FUNCTIONS:
+                directory = self._get_relative_path(args.get("directory", "."))
+                if directory is not None and not any(
+                    directory == "." or path == directory or path.startswith(directory + os.sep)
+                    for path in self._snapshot
+                ):
+                    return self.working_dir_abs
+
+            # Running code may open any file, and a listing or search must see pending changes next to untouched files
+            self._complete_scratch_dir()
+            return self.scratch_dir
+
+    def get_changes(self):
+        """
+        :return: Tuple of sorted lists of (added or modified relative paths, deleted relative paths)
+        """
+
+        if self.scratch_dir is None:
+            return [], []
+
+        current = _scan(self.scratch_dir)
+        changed = sorted(path for path, stat in current.items() if self._snapshot.get(path, (None,))[0] != stat)
+        deleted = sorted(path for path, (stat, _) in self._snapshot.items() if stat is not None and path not in current)
+        return changed, deleted
+
+    def commit(self):
+        """
+        Applies every pending change to the real working directory as one batch, then drops the scratch directory
+        :return: Number of files changed in the working directory
+        :raises OverlayConflictError: If a file the overlay changed was also changed in the working directory since it
+                                      was copied to the scratch directory. Nothing is applied and the scratch directory
+                                      is kept.
+        """
+
+        with self._lock:
+            changed, deleted = self.get_changes()
+            conflicts = [
+                path for path in changed + deleted
+                if _get_stat(os.path.join(self.working_dir_abs, path)) != self._snapshot.get(path, (None, None))[1]
+            ]
+            if conflicts:
+                raise OverlayConflictError(f"Files changed in {self.working_dir_abs} while the overlay was active: "
+                                           f"{', '.join(conflicts)}. Pending changes are kept in {self.scratch_dir}")
+
+            _apply_batch(self.scratch_dir, self.working_dir_abs, changed, deleted)
+
+            file_cache = get_file_cache(self.working_dir_abs)
+            workspace = get_workspace(self.working_dir_abs)
+            search_index = get_search_index(self.working_dir_abs)
+            for path in changed + deleted:
+                target_path = os.path.join(self.working_dir_abs, path)
+                file_cache.invalidate(target_path)
+                workspace.update_path(target_path)
+                search_index.update_file(target_path)
+
+            self._remove_scratch_dir()
+            return len(changed) + len(deleted)
+
+    def discard(self):
+        """
+        Drops every pending change
+        :return: Number of files that had pending changes
+        """
+
+        with self._lock:
+            changed, deleted = self.get_changes()
+            self._remove_scratch_dir()
+            return len(changed) + len(deleted)
+
+    def _get_relative_path(self, path):
+        """
+        Helper function for get_directory()
+        :return: Normalized path relative to the working directory, or None if it is not a path inside it
+        """
+
+        if not isinstance(path, str):
+            return None
+        path = os.path.relpath(os.path.join(self.working_dir_abs, path), self.working_dir_abs)
+        return None if path == os.pardir or path.startswith(os.pardir + os.sep) else path
+
+    def _copy_file(self, path):
+        """
+        Helper function for get_directory()
+        Copies a file into the scratch directory the first time a call may change it
+        :param path: Relative path of the file
+        """
+
+        if path in self._snapshot:
+            return
+
+        self._make_scratch_dir()
+        real_path = os.path.join(self.working_dir_abs, path)
+        scratch_path = os.path.join(self.scratch_dir, path)
+        real_stat = _get_stat(real_path)
+        if real_stat is not None and not os.path.isdir(real_path):
+            os.makedirs(os.path.dirname(scratch_path), exist_ok=True)
+            shutil.copy2(real_path, scratch_path, follow_symlinks=False)
+
+        # Each file is recorded with its stat in the scratch directory, to find what changed there, and its stat in the
+        # working directory, to find conflicting changes made there
+        self._snapshot[path] = (_get_stat(scratch_path), real_stat)
+
+    def _complete_scratch_dir(self):
+        """
+        Helper function for get_directory()
+        Copies every file that is not in the scratch directory yet, keeping the pending changes already there
+        """
+
+        self._make_scratch_dir()
+        exclude = shutil.ignore_patterns(*DEFAULT_LIST_EXCLUDES)
+
+        def ignore(dir_path, names):
+            relative_dir = os.path.relpath(dir_path, self.working_dir_abs)
+            return exclude(dir_path, names) | {
+                name for name in names if os.path.normpath(os.path.join(relative_dir, name)) in self._snapshot
+            }
+
+        shutil.copytree(self.working_dir_abs, self.scratch_dir, symlinks=True, ignore=ignore, dirs_exist_ok=True)
+        for path, stat in _scan(self.scratch_dir).items():
+            if path not in self._snapshot:
+                self._snapshot[path] = (stat, _get_stat(os.path.join(self.working_dir_abs, path)))
+
+        self._is_complete = True
+        get_workspace(self.scratch_dir).mark_stale()
+
+    def _make_scratch_dir(self):
+        if self.scratch_dir is None:
+            self.scratch_dir = os.path.join(tempfile.mkdtemp(prefix="aiagent-overlay-"), "workspace")
+            os.mkdir(self.scratch_dir)
+
+    def _remove_scratch_dir(self):
+        if self.scratch_dir is not None:
+            close_workspace(self.scratch_dir)
+            shutil.rmtree(os.path.dirname(self.scratch_dir), ignore_errors=True)
+        self.scratch_dir = None
+        self._is_complete = False
+        self._snapshot = {}
+
+
+def activate_overlay(overlay):
+    """
+    Makes function calls run against an overlay
+    :param overlay: WorkspaceOverlay object, or None to run against the working directory directly again
+    """
+
+    global _active_overlay
+    _active_overlay = overlay
+
+
+def resolve_working_directory(working_directory, function_name=None, args=None):
+    """
+    Gets the directory a function call for a working directory should run in
+    :param working_directory: The real working directory
+    :param function_name: Name of the function being called, or None for a call that may need the whole tree
+    :param args: Dictionary of the call's arguments
+    :return: The directory the active overlay chose if it covers the working directory, otherwise the working directory
+    """
+
+    overlay = _active_overlay
+    if overlay is None or overlay.working_dir_abs != os.path.abspath(working_directory):
+        return working_directory
+    return overlay.get_directory(function_name, args)
+
+
+def _apply_batch(source_dir, target_dir, changed, deleted):
+    """
+    Helper function for WorkspaceOverlay.commit()
+    Copies changed files from source_dir to target_dir and removes deleted ones. New content is staged in temporary
+    files first, and the originals are kept as hard links until every rename has succeeded so they can be restored.
+    :param source_dir: Directory holding the new versions of the files
+    :param target_dir: Directory to apply the changes to
+    :param changed: Relative paths of added or modified files
+    :param deleted: Relative paths of deleted files
+    """
+
+    staged = []
+    applied = []
+    try:
+        for path in changed:
+            target_path = os.path.join(target_dir, path)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), prefix=".tmp-")
+            os.close(file_descriptor)
+            shutil.copy2(os.path.join(source_dir, path), temp_path, follow_symlinks=False)
+            staged.append((temp_path, target_path))
+
+        for temp_path, target_path in staged + [(None, os.path.join(target_dir, path)) for path in deleted]:
+            backup_path = None
+            if os.path.lexists(target_path):
+                backup_path = f"{target_path}.overlay-backup"
+                os.link(target_path, backup_path, follow_symlinks=False)
+            applied.append((target_path, backup_path))
+
+            if temp_path is None:
+                os.remove(target_path)
+            else:
+                os.replace(temp_path, target_path)
+    except BaseException:
+        # Put back every original that was already replaced, and remove files that did not exist before
+        for target_path, backup_path in reversed(applied):
+            if backup_path is not None:
+                os.replace(backup_path, target_path)
+            elif os.path.lexists(target_path):
+                os.remove(target_path)
+        for temp_path, _ in staged:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+        raise
+
+    for _, backup_path in applied:
+        if backup_path is not None:
+            os.remove(backup_path)
+
+
+def _scan(directory):
+    """
+    Helper function for WorkspaceOverlay
+    :return: Dictionary of {relative path: stat tuple} for every file in a directory, skipping DEFAULT_LIST_EXCLUDES
+    """
+
+    files = {}
+    for dir_path, dir_names, file_names in os.walk(directory):
+        dir_names[:] = [name for name in dir_names if name not in DEFAULT_LIST_EXCLUDES]
+        for file_name in file_names:
+            file_path = os.path.join(dir_path, file_name)
+            files[os.path.relpath(file_path, directory)] = _get_stat(file_path)
+    return files
+
+
+def _get_stat(file_path):
+    """
+    Helper function for WorkspaceOverlay
+    :return: (mtime_ns, size, mode) tuple of a file, or None if it does not exist
+    """
+
+    try:
+        stat = os.lstat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_mode
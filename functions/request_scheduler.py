@@ -0,0 +1,465 @@
+"""
+Module to define the scheduler every request to the Gemini API goes through. ScheduledClient wraps a genai.Client the
+same way FakeClient stands in for one, so the agent loop, batch mode, context caching and server mode all use it without
+changes. For every model call the scheduler:
+- Waits for room under the requests per minute and tokens per minute limits, shared by every session using the client.
+  Both are token buckets that refill continuously, and each request reserves its estimated token count up front, then
+  settles the difference once the response reports the real usage.
+- Retries rate limits (429), server errors and dropped connections with jittered exponential backoff, waiting at least
+  as long as the API asks to. A 429 also pauses every other request, so the sessions stop hitting the quota together.
+  A response that arrives without usage metadata is retried too. Streamed responses are only retried if they fail
+  before their first chunk, as by then the agent may already have printed text or started function calls.
+- Optionally hedges slow requests: if a response has not arrived after hedge_after seconds, an identical request is
+  sent and whichever answers first is used. Hedges are only sent when the rate limits have room for them right away.
+
+Counters of requests, retries, hedges and time spent queueing are kept for stats().
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import (CHARS_PER_TOKEN, MAX_CONCURRENT_SESSIONS, MAX_RETRIES, REQUESTS_PER_MINUTE, RETRY_BASE_DELAY,
+                    RETRY_MAX_DELAY, TOKENS_PER_MINUTE)
+import httpx
+from google.genai import errors
+
+
+# HTTP status codes of errors that are worth retrying
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Rate limit of a number of units per minute, refilled continuously. Callers reserve units and are told how long to
+    wait for them, so waiting happens outside the lock and reservations are served in the order they were made.
+    """
+
+    def __init__(self, per_minute):
+        """
+        :param per_minute: Number of units available per minute, which is also the most that can be used at once
+        """
+
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self._available = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """
+        Takes units from the bucket, going into debt if there are not enough
+        :param amount: Number of units to take, or a negative number to give units back
+        :return: Seconds to wait until the units have been refilled
+        """
+
+        with self._lock:
+            self._refill()
+            self._available = min(self.capacity, self._available - min(amount, self.capacity))
+            return max(0.0, -self._available / self.rate)
+
+    def try_reserve(self, amount):
+        """
+        Takes units from the bucket only if they are available right away
+        :return: True if the units were taken
+        """
+
+        with self._lock:
+            self._refill()
+            if self._available < min(amount, self.capacity):
+                return False
+            self._available -= min(amount, self.capacity)
+            return True
+
+    def pause(self, seconds):
+        """
+        Empties the bucket so that nothing more is available for a number of seconds
+        """
+
+        with self._lock:
+            self._refill()
+            self._available = min(self._available, -seconds * self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RequestScheduler:
+    """
+    Rate limits, retries and hedges model calls. Thread safe, and one scheduler is shared by every session of a run.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_retries=MAX_RETRIES, hedge_after=None, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        """
+        :param requests_per_minute: Maximum number of requests per minute, or None for no limit
+        :param tokens_per_minute: Maximum number of prompt and response tokens per minute, or None for no limit
+        :param max_retries: Number of times a failed request is retried before the error is raised
+        :param hedge_after: Seconds after which a duplicate of a slow request is sent, or None to never hedge
+        :param base_delay: Seconds of backoff before the first retry, doubling with every retry after it
+        :param max_delay: Maximum number of seconds of backoff before a retry
+        """
+
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._pool = ThreadPoolExecutor(max_workers=2 * MAX_CONCURRENT_SESSIONS, thread_name_prefix="hedge")
+        self._prefix_tokens = {}
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.queued = 0
+        self.queue_delay = 0.0
+        self.max_queue_delay = 0.0
+
+    def call(self, request, tokens=0):
+        """
+        Makes a request once the rate limits allow it, retrying it if it fails
+        :param request: Function that makes the request and returns a types.GenerateContentResponse object
+        :param tokens: Estimated number of tokens the request uses
+        :return: Response of the first attempt that succeeded
+        """
+
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self._reserve(tokens))
+            try:
+                response = self._call_hedged(request, tokens) if self.hedge_after is not None else request()
+            except Exception as e:
+                time.sleep(self._get_retry_delay(e, attempt))
+                continue
+
+            if response.usage_metadata is None and attempt < self.max_retries:
+                time.sleep(self._get_retry_delay(None, attempt))
+                continue
+            self._settle(response, tokens)
+            return response
+
+    async def call_async(self, request, tokens=0):
+        """
+        Async version of call()
+        :param request: Async function that makes the request
+        :param tokens: Estimated number of tokens the request uses
+        :return: Response of the first attempt that succeeded
+        """
+
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self._reserve(tokens))
+            try:
+                if self.hedge_after is not None:
+                    response = await self._call_hedged_async(request, tokens)
+                else:
+                    response = await request()
+            except Exception as e:
+                await asyncio.sleep(self._get_retry_delay(e, attempt))
+                continue
+
+            if response.usage_metadata is None and attempt < self.max_retries:
+                await asyncio.sleep(self._get_retry_delay(None, attempt))
+                continue
+            self._settle(response, tokens)
+            return response
+
+    def stream(self, request, tokens=0):
+        """
+        Makes a streamed request once the rate limits allow it. It is retried if it fails before the first chunk
+        arrives, but never after.
+        :param request: Function that makes the request and returns an iterator of response chunks
+        :param tokens: Estimated number of tokens the request uses
+        :return: Generator of the response chunks
+        """
+
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self._reserve(tokens))
+            try:
+                chunks = iter(request())
+                chunk = next(chunks, None)
+            except Exception as e:
+                time.sleep(self._get_retry_delay(e, attempt))
+                continue
+
+            last_chunk = chunk
+            while chunk is not None:
+                yield chunk
+                last_chunk = chunk
+                chunk = next(chunks, None)
+            if last_chunk is not None:
+                self._settle(last_chunk, tokens)
+            return
+
+    def estimate_tokens(self, contents, config=None):
+        """
+        Estimates the number of prompt tokens of a request from its size
+        :param contents: List of types.Content objects sent as the conversation
+        :param config: types.GenerateContentConfig object sent with the request
+        :return: Estimated token count, 0 if there is no token limit to check it against
+        """
+
+        if self._token_bucket is None:
+            return 0
+
+        chars = sum(len(content.model_dump_json(exclude_none=True)) for content in contents)
+        return chars // CHARS_PER_TOKEN + self._get_prefix_tokens(config)
+
+    def stats(self):
+        """
+        :return: String describing the requests made so far
+        """
+
+        with self._lock:
+            return f"Scheduler: {self.requests} requests, {self.retries} retries, {self.hedges} hedged " \
+                   f"({self.hedge_wins} won), queued {self.queued} times for {self.queue_delay:.2f} seconds " \
+                   f"(longest {self.max_queue_delay:.2f} seconds)"
+
+    def _reserve(self, tokens):
+        """
+        Reserves room for a request under both rate limits
+        :return: Seconds to wait before sending the request
+        """
+
+        delay = 0.0
+        if self._request_bucket is not None:
+            delay = self._request_bucket.reserve(1)
+        if self._token_bucket is not None:
+            delay = max(delay, self._token_bucket.reserve(tokens))
+
+        with self._lock:
+            self.requests += 1
+            if delay:
+                self.queued += 1
+                self.queue_delay += delay
+                self.max_queue_delay = max(self.max_queue_delay, delay)
+        return delay
+
+    def _try_reserve_hedge(self, tokens):
+        """
+        Reserves room for a hedged request only if both rate limits have room for it right away
+        :return: True if the hedge can be sent
+        """
+
+        if self._request_bucket is not None and not self._request_bucket.try_reserve(1):
+            return False
+        if self._token_bucket is not None and not self._token_bucket.try_reserve(tokens):
+            if self._request_bucket is not None:
+                self._request_bucket.reserve(-1)
+            return False
+
+        with self._lock:
+            self.requests += 1
+            self.hedges += 1
+        return True
+
+    def _settle(self, response, tokens):
+        """
+        Corrects the token bucket once a response reports how many tokens the request really used
+        """
+
+        usage = response.usage_metadata
+        if self._token_bucket is not None and usage is not None and usage.total_token_count:
+            self._token_bucket.reserve(usage.total_token_count - tokens)
+
+    def _get_retry_delay(self, error, attempt):
+        """
+        Decides how long to wait before retrying a failed request
+        :param error: Exception the request raised, or None if its response was incomplete
+        :param attempt: Number of the attempt that failed, counting from 0
+        :return: Seconds to wait
+        :raises Exception: The error itself if it cannot be retried or no retries are left
+        """
+
+        if error is not None and (attempt == self.max_retries or not is_retryable(error)):
+            raise error
+
+        # Full jitter spreads out the retries of sessions that failed at the same time
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if isinstance(error, errors.APIError) and error.code == 429:
+            delay = max(delay, _get_requested_delay(error) or 0.0)
+            if self._request_bucket is not None:
+                self._request_bucket.pause(delay)
+
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def _call_hedged(self, request, tokens):
+        """
+        Helper function for call()
+        Makes a request, and a duplicate of it if it is slow
+        :return: Response of whichever request succeeded first
+        """
+
+        first = self._pool.submit(request)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done or not self._try_reserve_hedge(tokens):
+            return first.result()
+
+        pending = [first, self._pool.submit(request)]
+        errors_raised = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._count_hedge_win(future is not first)
+                    return future.result()
+                errors_raised.append(future.exception())
+        raise errors_raised[0]
+
+    async def _call_hedged_async(self, request, tokens):
+        """
+        Helper function for call_async()
+        Makes a request, and a duplicate of it if it is slow. The request that loses is cancelled.
+        :return: Response of whichever request succeeded first
+        """
+
+        first = asyncio.ensure_future(request())
+        done, _ = await asyncio.wait([first], timeout=self.hedge_after)
+        if done or not self._try_reserve_hedge(tokens):
+            return await first
+
+        second = asyncio.ensure_future(request())
+        pending = {first, second}
+        errors_raised = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._count_hedge_win(task is second)
+                        return task.result()
+                    errors_raised.append(task.exception())
+            raise errors_raised[0]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _count_hedge_win(self, hedge_won):
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def _get_prefix_tokens(self, config):
+        """
+        Helper function for estimate_tokens()
+        The agent reuses a single configuration object, so the size of its system prompt and tools is only measured
+        once. Cached content is still counted, as it counts towards the token limit too.
+        :return: Estimated number of tokens of the system prompt and tool declarations
+        """
+
+        if config is None:
+            return 0
+        with self._lock:
+            if id(config) not in self._prefix_tokens:
+                size = len(config.model_dump_json(include={"system_instruction", "tools"}, exclude_none=True))
+                self._prefix_tokens[id(config)] = (config, size // CHARS_PER_TOKEN)
+            return self._prefix_tokens[id(config)][1]
+
+
+class ScheduledClient:
+    """
+    Wraps a genai.Client so that every model call goes through a RequestScheduler. Everything else is passed through
+    to the wrapped client.
+    """
+
+    def __init__(self, client, scheduler):
+        """
+        :param client: genai.Client object, or anything with the same interface such as FakeClient
+        :param scheduler: RequestScheduler object shared by every session using the client
+        """
+
+        self.scheduler = scheduler
+        self.models = _ScheduledModels(client.models, scheduler)
+        self.aio = _ScheduledAio(client.aio, scheduler)
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _ScheduledModels:
+    """
+    Stand-in for client.models
+    """
+
+    def __init__(self, models, scheduler):
+        self._models = models
+        self._scheduler = scheduler
+
+    def generate_content(self, model, contents, config=None):
+        tokens = self._scheduler.estimate_tokens(contents, config)
+        return self._scheduler.call(
+            lambda: self._models.generate_content(model=model, contents=contents, config=config), tokens)
+
+    def generate_content_stream(self, model, contents, config=None):
+        tokens = self._scheduler.estimate_tokens(contents, config)
+        return self._scheduler.stream(
+            lambda: self._models.generate_content_stream(model=model, contents=contents, config=config), tokens)
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+class _ScheduledAio:
+    """
+    Stand-in for client.aio
+    """
+
+    def __init__(self, aio, scheduler):
+        self.models = _ScheduledAsyncModels(aio.models, scheduler)
+        self._aio = aio
+
+    def __getattr__(self, name):
+        return getattr(self._aio, name)
+
+
+class _ScheduledAsyncModels:
+    """
+    Stand-in for client.aio.models
+    """
+
+    def __init__(self, models, scheduler):
+        self._models = models
+        self._scheduler = scheduler
+
+    async def generate_content(self, model, contents, config=None):
+        tokens = self._scheduler.estimate_tokens(contents, config)
+        return await self._scheduler.call_async(
+            lambda: self._models.generate_content(model=model, contents=contents, config=config), tokens)
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+def is_retryable(error):
+    """
+    :return: True if a request that raised the error may succeed if it is made again
+    """
+
+    if isinstance(error, errors.APIError):
+        return error.code in RETRY_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+def _get_requested_delay(error):
+    """
+    Helper function for RequestScheduler
+    Reads how long the API asked to wait before retrying from the RetryInfo detail of a 429 error, e.g.
+    {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "37s"}
+    :return: Seconds to wait, or None if the error does not say
+    """
+
+    details = error.details.get("error", {}).get("details", []) if isinstance(error.details, dict) else []
+    for detail in details:
+        if isinstance(detail, dict) and detail.get("@type", "").endswith("RetryInfo"):
+            try:
+                return float(str(detail.get("retryDelay", "")).rstrip("s"))
+            except ValueError:
+                return None
+    return None
@@ -0,0 +1,89 @@
+"""
+Module to define batch mode for the AI agent. Reads prompts from a JSON Lines file and runs an agent session for each
+of them concurrently over a single Gemini client, with a limit on how many sessions can be in flight at once. One JSON
+result line is written per session as soon as that session finishes, so results are not in input order.
+
+Each line of the prompts file is either a JSON string holding the prompt or a JSON object with a "prompt" key and an
+optional "id" key, e.g.
+"
+{"id": "fix-precedence", "prompt": "fix the bug: 3 + 7 * 2 shouldn't be 20"}
+"how does the calculator render results?"
+"
+"""
+
+import asyncio
+import json
+import sys
+from contextlib import redirect_stdout
+from functions.get_agent_response_async import get_agent_response_async
+
+
+def run_batch(client, batch_path, concurrency, verbose=False, context_cache=None):
+    """
+    Runs an agent session for every prompt in a JSON Lines file and writes one JSON result line per session to stdout.
+    Progress printed by the sessions themselves is sent to stderr so stdout only holds results.
+    :param client: Gemini API client object shared by every session
+    :param batch_path: Path to the JSON Lines file of prompts
+    :param concurrency: Maximum number of sessions that can run at the same time
+    :param verbose: Optional argument that enables detailed information about each API call
+    :param context_cache: Optional ContextCache object shared by every session
+    :return: string containing "success" if every session succeeded and "failure" otherwise
+    """
+
+    prompts = _read_prompts(batch_path)
+    results_file = sys.stdout
+
+    with redirect_stdout(sys.stderr):
+        return asyncio.run(_run_sessions(client, prompts, concurrency, verbose, results_file, context_cache))
+
+
+async def _run_sessions(client, prompts, concurrency, verbose, results_file, context_cache):
+    """
+    Helper function for run_batch()
+    Runs every session, writing each result as soon as it is available
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_session(prompt_id, user_prompt):
+        async with semaphore:
+            try:
+                result = await get_agent_response_async(client, user_prompt, verbose, context_cache)
+            except Exception as e:
+                result = {"status": "error", "error": str(e)}
+        return {"id": prompt_id, **result}
+
+    tasks = [asyncio.create_task(run_session(prompt_id, user_prompt)) for prompt_id, user_prompt in prompts]
+
+    all_succeeded = True
+    for task in asyncio.as_completed(tasks):
+        result = await task
+        all_succeeded = all_succeeded and result["status"] == "success"
+        results_file.write(json.dumps(result) + "\n")
+        results_file.flush()
+
+    return "success" if all_succeeded else "failure"
+
+
+def _read_prompts(batch_path):
+    """
+    Helper function for run_batch()
+    :param batch_path: Path to the JSON Lines file of prompts
+    :return: List of (id, prompt) tuples. Prompts without an id are numbered by their line in the file
+    """
+
+    prompts = []
+    with open(batch_path, "r") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"prompt": record}
+            if not isinstance(record, dict) or not isinstance(record.get("prompt"), str):
+                raise ValueError(f"Line {line_number} of \"{batch_path}\" does not contain a prompt")
+
+            prompts.append((record.get("id", line_number), record["prompt"]))
+
+    return prompts
@@ -5,52 +5,92 @@ the working directory.
 """
 
 import os
+import resource
+import stat
 import subprocess
 import sys
-from config import MAX_TIME
+from config import MAX_OUTPUT_BYTES, MAX_TIME
 from google.genai import types
+from functions.file_cache import get_file_cache
+from functions.output_capture import OutputCapture
+from functions.tracing import span
+from functions.warm_python_runner import is_warm_runner_enabled, run_warm_python
+from functions.workspace import get_workspace
 
 
-def run_python_file(working_directory, file_path, args=None):
+def run_python_file(working_directory, file_path, args=None, on_output=None):
     """
-    Runs a python file with any additionally specified arguments.
+    Runs a python file with any additionally specified arguments. Output is captured incrementally and only the start
+    and end of each stream is kept. The process is stopped early if it writes more than MAX_OUTPUT_BYTES.
     :param working_directory: Directory valid files must be located within
     :param file_path: Path to target file
     :param args: Additional arguments to call with python command
+    :param on_output: Optional function called with each chunk of output bytes while the process is still running
     :return: Result of running python file including stdout, stderr, and non-zero exit code
     """
 
     try:
         # Check for valid arguments
         working_dir_abs = os.path.abspath(working_directory)
-        target_file_path = os.path.normpath(os.path.join(working_dir_abs, file_path))
-        is_valid_target_file = os.path.commonpath([working_dir_abs, target_file_path]) == working_dir_abs
+        workspace = get_workspace(working_dir_abs)
+        target_file_path, entry = workspace.resolve(file_path)
 
-        if not is_valid_target_file:
+        if target_file_path is None:
             return f"Error: Cannot execute \"{file_path}\" as it is outside the permitted working directory"
 
-        if not os.path.isfile(target_file_path):
+        if entry is None or not stat.S_ISREG(entry.st_mode):
             return f"Error: \"{file_path}\" does not exist or is not a regular file"
 
         if not target_file_path.endswith(".py"):
             return f"Error: \"{file_path}\" is not a Python file"
 
-        # Build command to pass into subprocess
-        command = [sys.executable, target_file_path]
-        if args:
-            command.extend(args)
+        # Run the python file from the warm fork server if it is enabled, otherwise in a new interpreter
+        capture = OutputCapture(on_output=on_output)
+        warm = is_warm_runner_enabled()
+        with span(f"python {file_path}", "process", runner="warm" if warm else "cold") as trace:
+            children_usage = resource.getrusage(resource.RUSAGE_CHILDREN) if trace is not None else None
+            try:
+                if warm:
+                    returncode = run_warm_python(target_file_path, args or [], working_dir_abs, MAX_TIME, capture)
+                else:
+                    # Build command to pass into subprocess
+                    command = [sys.executable, target_file_path]
+                    if args:
+                        command.extend(args)
 
-        # Run subprocess command
-        result = subprocess.run(command, capture_output=True, cwd=working_dir_abs, text=True, timeout=MAX_TIME)
+                    returncode = _run_subprocess(command, working_dir_abs, MAX_TIME, capture)
+            finally:
+                # The script may have changed file sizes without changing the directories that hold them, and any
+                # file it changed is missed by a workspace tree that is polled
+                get_file_cache(working_dir_abs).invalidate_listings()
+                workspace.mark_stale()
+
+                if trace is not None:
+                    trace["bytes_in"] = capture.stdout.total_bytes + capture.stderr.total_bytes
+
+            if trace is not None:
+                trace["exit_code"] = returncode
+
+                # Scripts from the warm runner are children of the fork server, so only new interpreters can be
+                # measured. The time is shared with any other script that finished at the same time.
+                if not warm:
+                    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+                    trace["child_cpu_ms"] = round((usage.ru_utime + usage.ru_stime - children_usage.ru_utime
+                                                   - children_usage.ru_stime) * 1000, 3)
+
+        stdout = capture.stdout.get_text()
+        stderr = capture.stderr.get_text()
 
         # Build output string to describe subprocess result
         output = ""
-        if result.returncode:
-            output += f"Process exited with code {result.returncode}.\n"
-        if (not result.stdout) and (not result.stderr):
+        if capture.limit_exceeded:
+            output += f"Process was stopped after writing more than {MAX_OUTPUT_BYTES} bytes of output.\n"
+        if returncode:
+            output += f"Process exited with code {returncode}.\n"
+        if (not stdout) and (not stderr):
             output += "No output produced.\n"
         else:
-            output += f"STDOUT: {result.stdout}\nSTDERR: {result.stderr}"
+            output += f"STDOUT: {stdout}\nSTDERR: {stderr}"
 
         return output
 
@@ -67,6 +107,29 @@ def run_python_file(working_directory, file_path, args=None):
         return f"Error: {e}"
 
 
+def _run_subprocess(command, cwd, timeout, capture):
+    """
+    Helper function for run_python_file()
+    Runs a command in a new process, streaming its output into capture
+    :param command: Command to run
+    :param cwd: Directory the command is run in
+    :param timeout: Maximum amount of time in seconds the command may run for
+    :param capture: OutputCapture object that reads the process's output
+    :return: Exit code of the process
+    """
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+    capture.start(process.stdout, process.stderr, process.kill)
+    try:
+        return process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        capture.join(timeout)
+
+
 # Schema to describe run_python_file() to LLM
 schema_run_python_file = types.FunctionDeclaration(
     name="run_python_file",
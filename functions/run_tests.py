@@ -0,0 +1,498 @@
+"""
+This module provides a function that runs the unittest cases in the working directory. The function is intended to be
+used by an AI agent via the Gemini API to check its changes without reading the output of a whole test script. Tests
+are discovered and run by worker processes (see test_worker.py), spread over as many processes as they need, and only
+a summary and the tracebacks of the tests that did not pass are returned.
+
+Runs are change-aware. A map of the imports between the python files of the working directory is kept up to date, and
+by default only the tests whose files import a file that changed since the last run, directly or through other files,
+are run again, along with the tests that did not pass or were left out last time. A change to a file that is not python
+code can affect any test through the data it reads, so it runs every test. Imports made at runtime, e.g. with
+importlib, are not seen. The first run in a working directory runs every test.
+"""
+
+import ast
+import fnmatch
+import heapq
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from config import (MAX_REPORTED_FAILURES, MAX_TEST_WORKERS, MAX_TIME, MAX_TRACEBACK_CHARS, TEST_FILE_PATTERN,
+                    TEST_WORKER_MIN_SECONDS)
+from google.genai import types
+from functions.file_cache import get_file_cache, get_validator
+from functions.output_capture import BoundedBuffer
+from functions.tracing import span
+from functions.workspace import get_workspace
+
+
+# Script run by the worker processes
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_worker.py")
+
+# Estimated seconds of a test that has not been run before, used to decide how many processes to start
+DEFAULT_TEST_SECONDS = 0.02
+
+# Seconds to wait for the rest of a worker's stderr once it has exited
+STDERR_JOIN_SECONDS = 1.0
+
+# One history per absolute working directory
+_test_histories = {}
+_test_histories_lock = threading.Lock()
+
+
+class TestHistory:
+    """
+    What run_tests knows about the tests of a working directory from its earlier runs. Runs in the same working
+    directory take turns, as each one depends on what the one before it found.
+    """
+
+    def __init__(self, working_dir_abs):
+        """
+        :param working_dir_abs: Absolute path of the working directory
+        """
+
+        self.working_dir_abs = working_dir_abs
+        # Dictionary of {relative path: validator} of every file at the end of the last run, None before the first
+        self.files = None
+        # Dictionary of {relative path: (validator, set of (directory, module name))} of the imports of python files
+        self.imports = {}
+        # Tests found by the last discovery, and the test files and tracebacks of test files it could not import
+        self.tests = None
+        self.test_files = None
+        self.discovery_errors = []
+        # Tests that did not pass or were left out of the last run, and the seconds each test took the last time
+        self.pending = set()
+        self.durations = {}
+        self.lock = threading.Lock()
+
+    def get_affected_files(self, python_files, changed):
+        """
+        Finds the files that import a changed file, directly or through other files
+        :param python_files: Dictionary of {relative path: validator} of every python file
+        :param changed: Relative paths of the files that changed
+        :return: Set of the relative paths of the changed files and every file that imports them
+        """
+
+        self._update_imports(python_files)
+
+        importers = {}
+        for file_path, (_, references) in self.imports.items():
+            for directory, module_name in references:
+                for imported in _resolve_module(directory, module_name, python_files):
+                    importers.setdefault(imported, set()).add(file_path)
+
+        affected = set(changed)
+        queue = list(changed)
+        while queue:
+            for importer in importers.get(queue.pop(), ()):
+                if importer not in affected:
+                    affected.add(importer)
+                    queue.append(importer)
+        return affected
+
+    def _update_imports(self, python_files):
+        """
+        Helper function for get_affected_files()
+        Parses the imports of the python files that changed since they were last parsed
+        """
+
+        for file_path, validator in python_files.items():
+            entry = self.imports.get(file_path)
+            if entry is None or entry[0] != validator:
+                self.imports[file_path] = (validator, _parse_imports(self.working_dir_abs, file_path))
+
+        for file_path in set(self.imports) - set(python_files):
+            del self.imports[file_path]
+
+
+def run_tests(working_directory, tests=None, run_all=False):
+    """
+    Runs the unittest cases in the working directory that may be affected by changes since the last run
+    :param working_directory: Directory the tests are found and run in
+    :param tests: Optional list of test ids, classes or modules to run instead, e.g. ["tests.TestCalculator"]
+    :param run_all: True to run every test, whether or not it may be affected
+    :return: Summary of the run with the tracebacks of the tests that did not pass
+    """
+
+    try:
+        working_dir_abs = os.path.abspath(working_directory)
+        if not os.path.isdir(working_dir_abs):
+            return "Error: The working directory does not exist"
+
+        if tests is not None and (not isinstance(tests, list) or not all(isinstance(name, str) for name in tests)):
+            return "Error: tests must be a list of test ids, classes or modules"
+
+        workspace = get_workspace(working_dir_abs)
+        history = get_test_history(working_dir_abs)
+        with history.lock:
+            files = _get_files(workspace, working_dir_abs)
+
+            # Test ids only change with the test files, unless a test file could not be imported last time
+            test_files = {path: validator for path, validator in files.items()
+                          if fnmatch.fnmatch(os.path.basename(path), TEST_FILE_PATTERN)}
+            if history.tests is None or history.discovery_errors or test_files != history.test_files:
+                history.tests, history.discovery_errors = _discover(working_dir_abs)
+                history.test_files = test_files
+
+            test_ids = [test["id"] for test in history.tests]
+            if not test_ids and not history.discovery_errors:
+                return f"No unittest cases found in files matching \"{TEST_FILE_PATTERN}\""
+
+            # Decide which tests need to run because of what changed since the last run
+            changed = None
+            if history.files is None:
+                needed = set(test_ids)
+            else:
+                changed = sorted(path for path in files.keys() | history.files.keys()
+                                 if files.get(path) != history.files.get(path))
+                if any(not path.endswith(".py") for path in changed):
+                    needed = set(test_ids)
+                else:
+                    python_files = {path: validator for path, validator in files.items() if path.endswith(".py")}
+                    affected_files = history.get_affected_files(python_files, changed)
+                    needed = {test["id"] for test in history.tests if test["file"] in affected_files}
+                needed = (needed | history.pending) & set(test_ids)
+
+            if tests:
+                selected = [test_id for test_id in test_ids
+                            if any(test_id == name or test_id.startswith(f"{name}.") for name in tests)]
+                if not selected:
+                    return f"Error: No tests match {', '.join(tests)}"
+            elif run_all:
+                selected = test_ids
+            else:
+                selected = [test_id for test_id in test_ids if test_id in needed]
+
+            start = time.perf_counter()
+            results, worker_count = {}, 0
+            if selected:
+                try:
+                    results, worker_count = _run_workers(working_dir_abs, selected, history.durations)
+                finally:
+                    # Tests may have written files, which the workspace tree misses while it is polled
+                    get_file_cache(working_dir_abs).invalidate_listings()
+                    workspace.mark_stale()
+            seconds = time.perf_counter() - start
+
+            # Files written by the tests themselves are not changes to test against next time
+            history.files = _get_files(workspace, working_dir_abs)
+            history.pending = (needed - set(selected)) | {
+                test_id for test_id, result in results.items() if result["outcome"] in ("failed", "error")}
+            history.durations.update(
+                (test_id, result["seconds"]) for test_id, result in results.items() if result["outcome"] == "passed")
+
+            return _build_summary(len(test_ids), selected, results, seconds, worker_count, changed,
+                                  history.discovery_errors, bool(tests or run_all))
+
+    except subprocess.TimeoutExpired:
+        return f"Error: Finding the tests took more than {MAX_TIME} seconds"
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def get_test_history(working_directory):
+    """
+    Gets the test history of a working directory, creating it the first time it is used
+    :param working_directory: Directory the tests are run in
+    :return: TestHistory object for the working directory
+    """
+
+    working_dir_abs = os.path.abspath(working_directory)
+    with _test_histories_lock:
+        if working_dir_abs not in _test_histories:
+            _test_histories[working_dir_abs] = TestHistory(working_dir_abs)
+        return _test_histories[working_dir_abs]
+
+
+def _get_files(workspace, working_dir_abs):
+    """
+    Helper function for run_tests()
+    :return: Dictionary of {relative path: validator} of every file in the workspace tree
+    """
+
+    return {os.path.relpath(entry.path, working_dir_abs): get_validator(entry) for entry in workspace.get_files()}
+
+
+def _discover(working_dir_abs):
+    """
+    Helper function for run_tests()
+    Finds the tests in the working directory with a worker process
+    :return: Tuple of a list of {"id", "file"} dictionaries of every test, with "file" relative to the working directory
+             (None if the test is defined outside it), and a list of tracebacks of test files that could not be imported
+    :raises RuntimeError: If the worker process fails
+    """
+
+    process = subprocess.run([sys.executable, WORKER_PATH, "discover", TEST_FILE_PATTERN], cwd=working_dir_abs,
+                             capture_output=True, text=True, timeout=MAX_TIME)
+    if process.returncode:
+        raise RuntimeError(f"Finding the tests failed with exit code {process.returncode}:\n"
+                           f"{_truncate(process.stderr)}")
+
+    discovery = json.loads(process.stdout)
+    for test in discovery["tests"]:
+        relative_path = os.path.relpath(test["file"], working_dir_abs) if test["file"] else None
+        test["file"] = relative_path if relative_path and not relative_path.startswith(os.pardir) else None
+    return discovery["tests"], discovery["errors"]
+
+
+def _run_workers(working_dir_abs, test_ids, durations):
+    """
+    Helper function for run_tests()
+    Spreads tests over worker processes so that each one has about the same estimated run time, and runs them. No more
+    processes are started than there are CPUs to run them. Tests that do not finish within MAX_TIME are reported as
+    errors.
+    :param working_dir_abs: Absolute path of the working directory
+    :param test_ids: Ids of the tests to run, in the order they were discovered
+    :param durations: Dictionary of {test id: seconds} the tests took the last time they passed
+    :return: Tuple of a dictionary of {test id: result dictionary}, and the number of processes used
+    """
+
+    estimates = {test_id: durations.get(test_id, DEFAULT_TEST_SECONDS) for test_id in test_ids}
+    worker_count = max(1, min(MAX_TEST_WORKERS, os.process_cpu_count() or 1, len(test_ids),
+                              int(sum(estimates.values()) / TEST_WORKER_MIN_SECONDS)))
+
+    # Give the longest tests out first, each to the process with the least work so far
+    loads = [(0.0, index) for index in range(worker_count)]
+    assignments = [[] for _ in range(worker_count)]
+    for test_id in sorted(test_ids, key=lambda test_id: -estimates[test_id]):
+        load, index = heapq.heappop(loads)
+        assignments[index].append(test_id)
+        heapq.heappush(loads, (load + estimates[test_id], index))
+
+    # Each process runs its tests in discovery order, so tests of the same class run together
+    order = {test_id: index for index, test_id in enumerate(test_ids)}
+    assignments = [sorted(assigned, key=order.get) for assigned in assignments if assigned]
+
+    results = {}
+    deadline = time.monotonic() + MAX_TIME
+    with span("run_tests", "process", tests=len(test_ids), workers=len(assignments)):
+        workers = []
+        for assigned in assignments:
+            process = subprocess.Popen([sys.executable, WORKER_PATH, "run"], cwd=working_dir_abs,
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            reader = threading.Thread(target=_read_results, args=(process, assigned, results), daemon=True)
+            reader.start()
+
+            # Only the end of what the tests print is kept, which is where a crash is reported
+            stderr = BoundedBuffer(head_bytes=0, tail_bytes=MAX_TRACEBACK_CHARS)
+            stderr_reader = threading.Thread(target=_read_output, args=(process.stderr, stderr), daemon=True)
+            stderr_reader.start()
+            workers.append((process, stderr, assigned, reader, stderr_reader))
+
+        for _, _, _, reader, _ in workers:
+            reader.join(max(0.0, deadline - time.monotonic()))
+
+        for process, stderr, assigned, reader, stderr_reader in workers:
+            # A process is done once its output has been read to the end
+            timed_out = reader.is_alive()
+            if timed_out:
+                process.kill()
+            process.wait()
+            reader.join()
+            # Processes started by the tests may keep stderr open after the worker exits
+            stderr_reader.join(STDERR_JOIN_SECONDS)
+
+            missing = [test_id for test_id in assigned if test_id not in results]
+            if missing and not timed_out and process.returncode == 0:
+                # The process finished, so these tests were skipped by unittest itself
+                for test_id in missing:
+                    results[test_id] = {"outcome": "error", "seconds": 0.0,
+                                        "traceback": "Not run, as a fixture of its class or module failed"}
+            elif missing:
+                # The first test without a result is the one that was running when the process stopped
+                stderr_text = stderr.get_text().strip()
+                reason = f"Did not finish within {MAX_TIME} seconds" if timed_out else \
+                    f"Test process exited with code {process.returncode}" + (f":\n{stderr_text}" if stderr_text else "")
+                results[missing[0]] = {"outcome": "error", "seconds": 0.0, "traceback": reason}
+                for test_id in missing[1:]:
+                    results[test_id] = {"outcome": "error", "seconds": 0.0,
+                                        "traceback": f"Not run, as the test process stopped at {missing[0]}"}
+
+    return results, len(assignments)
+
+
+def _read_results(process, test_ids, results):
+    """
+    Helper function for _run_workers()
+    Sends a worker process its tests and collects the result of each test as it finishes
+    :param process: subprocess.Popen object of the worker process
+    :param test_ids: Ids of the tests the worker runs
+    :param results: Dictionary of {test id: result dictionary} to add the results to
+    """
+
+    try:
+        process.stdin.write(json.dumps(test_ids))
+        process.stdin.close()
+    except BrokenPipeError:
+        return
+
+    for line in process.stdout:
+        result = json.loads(line)
+        results[result.pop("id")] = result
+
+
+def _read_output(pipe, buffer):
+    """
+    Helper function for _run_workers()
+    Reads what a worker process prints into a bounded buffer until the process closes the pipe
+    :param pipe: File object of the read end of the pipe
+    :param buffer: BoundedBuffer object to keep the output in
+    """
+
+    try:
+        while chunk := os.read(pipe.fileno(), 65536):
+            buffer.write(chunk)
+    finally:
+        pipe.close()
+
+
+def _build_summary(test_count, selected, results, seconds, worker_count, changed, discovery_errors, chosen):
+    """
+    Helper function for run_tests()
+    Describes the outcome of a run, with the tracebacks of the first few tests that did not pass
+    :param test_count: Number of tests found in the working directory
+    :param selected: Ids of the tests that were run
+    :param results: Dictionary of {test id: result dictionary} of the tests that were run
+    :param seconds: Seconds the run took
+    :param worker_count: Number of processes used
+    :param changed: Sorted relative paths of the files that changed since the last run, or None for the first run
+    :param discovery_errors: Tracebacks of test files that could not be imported
+    :param chosen: True if the tests to run were named or run_all was set, rather than selected by changes
+    :return: Summary string
+    """
+
+    counts = {outcome: 0 for outcome in ("passed", "failed", "error", "skipped")}
+    for result in results.values():
+        counts[result["outcome"]] += 1
+
+    if selected:
+        summary = f"Ran {len(selected)} of {test_count} tests in {seconds:.2f} seconds using {worker_count} " \
+                  f"{'process' if worker_count == 1 else 'processes'}: {counts['passed']} passed, " \
+                  f"{counts['failed']} failed, {counts['error']} errors, {counts['skipped']} skipped\n"
+    else:
+        summary = f"No tests were run out of {test_count}.\n"
+
+    # Explain why tests were left out, so the agent knows when to ask for them
+    if not chosen and changed is not None and len(selected) < test_count:
+        if changed:
+            changed_files = ", ".join(changed[:5]) + (f" and {len(changed) - 5} more" if len(changed) > 5 else "")
+            summary += f"Only the tests affected by changes to {changed_files}, or that did not pass last time, " \
+                       f"were run. "
+        else:
+            summary += "No files changed since the last run, so only the tests that did not pass then were run. "
+        summary += "Use run_all to run every test.\n"
+
+    failures = [(f"{result['outcome'].upper()}: {test_id}", result["traceback"])
+                for test_id, result in results.items() if result["outcome"] in ("failed", "error")]
+    failures = [("ERROR: could not import a test file", error) for error in discovery_errors] + failures
+
+    for heading, traceback_text in failures[:MAX_REPORTED_FAILURES]:
+        summary += f"\n{heading}\n{_truncate(traceback_text)}\n"
+    if len(failures) > MAX_REPORTED_FAILURES:
+        summary += f"\n{len(failures) - MAX_REPORTED_FAILURES} more did not pass: " \
+                   f"{', '.join(heading for heading, _ in failures[MAX_REPORTED_FAILURES:])}\n"
+
+    return summary
+
+
+def _truncate(text):
+    """
+    Helper function for run_tests()
+    :return: The end of the text, where the error of a traceback is, at most MAX_TRACEBACK_CHARS characters long
+    """
+
+    text = text.strip()
+    if len(text) <= MAX_TRACEBACK_CHARS:
+        return text
+    return f"[...]\n{text[-MAX_TRACEBACK_CHARS:]}"
+
+
+def _parse_imports(working_dir_abs, file_path):
+    """
+    Helper function for TestHistory
+    Finds the modules a python file imports. A module is looked for both from the top of the working directory, as the
+    tests import it, and from the file's own directory, as a script run from there would.
+    :param working_dir_abs: Absolute path of the working directory
+    :param file_path: Path of the python file relative to the working directory
+    :return: Set of (directory, module name) tuples, with the directory relative to the working directory
+    """
+
+    try:
+        with open(os.path.join(working_dir_abs, file_path), "rb") as file:
+            tree = ast.parse(file.read())
+    except (OSError, SyntaxError, ValueError):
+        # A file that cannot be parsed fails to import, which the tests report
+        return set()
+
+    directory = os.path.dirname(file_path)
+    references = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                references.update({("", alias.name), (directory, alias.name)})
+
+        elif isinstance(node, ast.ImportFrom):
+            # Relative imports start from the file's package, going up one directory for every dot after the first
+            roots = {"", directory}
+            if node.level:
+                root = directory
+                for _ in range(node.level - 1):
+                    root = os.path.dirname(root)
+                roots = {root}
+
+            for root in roots:
+                if node.module:
+                    references.add((root, node.module))
+                # Imported names may be submodules, e.g. `from pkg import calculator`
+                for alias in node.names:
+                    references.add((root, f"{node.module}.{alias.name}" if node.module else alias.name))
+
+    return references
+
+
+def _resolve_module(directory, module_name, python_files):
+    """
+    Helper function for TestHistory
+    :param directory: Directory relative to the working directory to look for the module in
+    :param module_name: Dotted name of the module, e.g. "pkg.calculator"
+    :param python_files: Relative paths of every python file in the working directory
+    :return: List of the files that importing the module runs, the module itself and the packages it is part of
+    """
+
+    files = []
+    parts = module_name.split(".")
+    for index in range(1, len(parts) + 1):
+        module_path = os.path.join(directory, *parts[:index])
+        for candidate in (f"{module_path}.py", os.path.join(module_path, "__init__.py")):
+            if candidate in python_files:
+                files.append(candidate)
+    return files
+
+
+# Schema to describe run_tests() to LLM
+schema_run_tests = types.FunctionDeclaration(
+    name="run_tests",
+    description="Function that runs the unittest cases in the working directory in parallel and returns a summary with "
+                "the tracebacks of the tests that did not pass. By default it only runs the tests affected by files "
+                "changed since the last run and the tests that did not pass then.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "tests": types.Schema(
+                type=types.Type.ARRAY,
+                description="Test ids, classes or modules to run instead of the affected tests, e.g. "
+                            "'tests.TestCalculator' or 'tests.TestCalculator.test_addition'",
+                items=types.Schema(
+                    type=types.Type.STRING,
+                )
+            ),
+            "run_all": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Run every test, including the ones not affected by any change",
+            ),
+        },
+    )
+)
@@ -0,0 +1,151 @@
+"""
+This module provides a function that searches the contents of the files in a directory for a literal string or regular
+expression. A directory is valid if it is within the working_directory. The function is intended to be used by an AI
+agent via the Gemini API. The agent is restricted to only access files within the working directory. Matches are
+returned one per line in the following format, with context lines marked by "-" instead of ":":
+"
+FILE_PATH:LINE_NUMBER: LINE
+"
+A trigram index of the working directory narrows the search down to the files that can contain a match.
+"""
+
+import os
+import re
+import stat
+from config import MAX_SEARCH_RESULTS
+from google.genai import types
+from functions.search_index import get_required_literals, get_search_index
+from functions.workspace import get_workspace
+
+
+def search_files(working_directory, query, directory=".", regex=False, case_sensitive=True, context_lines=0):
+    """
+    Searches the files in a directory for lines matching a query
+    :param working_directory: The directory agent is allowed to access and work in
+    :param query: Literal string or regular expression to search for
+    :param directory: Relative path to the directory to search in
+    :param regex: True if query is a regular expression
+    :param case_sensitive: False to ignore case when matching
+    :param context_lines: Number of lines to show before and after each match, at most 3
+    :return: String listing each matching line with its file path and line number
+    """
+
+    try:
+        # Check for valid arguments
+        working_dir_abs = os.path.abspath(working_directory)
+        target_dir, dir_entry = get_workspace(working_dir_abs).resolve(directory)
+
+        if target_dir is None:
+            return f"Error: Cannot search \"{directory}\" as it is outside permitted working directory"
+
+        if dir_entry is None or not stat.S_ISDIR(dir_entry.st_mode):
+            return f"Error: \"{directory}\" is not a directory"
+
+        if not query:
+            return "Error: query cannot be empty"
+
+        try:
+            pattern = re.compile(query if regex else re.escape(query), 0 if case_sensitive else re.IGNORECASE)
+        except re.error as e:
+            return f"Error: Invalid regular expression \"{query}\": {e}"
+
+        context_lines = max(0, min(int(context_lines or 0), 3))
+
+        search_index = get_search_index(working_dir_abs)
+        search_index.refresh()
+        candidates = search_index.get_candidates(get_required_literals(query, regex))
+
+        results = []
+        match_count = 0
+        for file_path in candidates:
+            if os.path.commonpath([target_dir, file_path]) != target_dir:
+                continue
+
+            for result, is_match in _search_file(file_path, pattern, context_lines):
+                if is_match and match_count == MAX_SEARCH_RESULTS:
+                    results.append(f"[Search stopped after {MAX_SEARCH_RESULTS} matches. Narrow the query or "
+                                   f"directory to see more]")
+                    return '\n'.join(results)
+                match_count += is_match
+                results.append(f"{os.path.relpath(file_path, working_dir_abs)}{result}")
+
+        if not results:
+            return f"No matches found for \"{query}\" in \"{directory}\""
+
+        return '\n'.join(results)
+
+    except PermissionError as e:
+        return f"Error: {e}"
+    except TypeError as e:
+        return f"Error: {e}"
+    except ValueError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def _search_file(file_path, pattern, context_lines):
+    """
+    Helper function for search_files()
+    Finds the lines of a file that match a pattern
+    :param file_path: Absolute path of the file
+    :param pattern: Compiled regular expression to match each line against
+    :param context_lines: Number of lines to show before and after each match
+    :return: Generator of (":LINE_NUMBER: LINE" or "-LINE_NUMBER- LINE", True if the line matched) tuples
+    """
+
+    try:
+        with open(file_path, "r", errors="replace") as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return
+
+    last_shown = 0
+    for index, line in enumerate(lines):
+        if not pattern.search(line):
+            continue
+
+        for context_index in range(max(index - context_lines, last_shown), index):
+            yield f"-{context_index + 1}- {lines[context_index]}", False
+        yield f":{index + 1}: {line}", True
+
+        after = min(index + context_lines + 1, len(lines))
+        for context_index in range(index + 1, after):
+            if not pattern.search(lines[context_index]):
+                yield f"-{context_index + 1}- {lines[context_index]}", False
+        last_shown = after
+
+
+# Schema to describe search_files() to LLM
+schema_search_files = types.FunctionDeclaration(
+    name="search_files",
+    description="Searches the contents of every file in a directory relative to the working directory for a literal "
+                "string or regular expression, returning each matching line as 'path:line_number: line'",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "query": types.Schema(
+                type=types.Type.STRING,
+                description="Literal text to search for, or a regular expression if regex is true. e.g. 'def evaluate'",
+            ),
+            "directory": types.Schema(
+                type=types.Type.STRING,
+                description="Directory to search in, relative to the working directory (default is the working "
+                            "directory itself)",
+            ),
+            "regex": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Treat query as a Python regular expression (default is false)",
+            ),
+            "case_sensitive": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Match upper and lower case exactly (default is true)",
+            ),
+            "context_lines": types.Schema(
+                type=types.Type.INTEGER,
+                description="Number of lines to show before and after each match, at most 3 (default is 0)",
+            ),
+        },
+        required=["query"],
+    ),
+)
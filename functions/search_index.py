@@ -0,0 +1,301 @@
+"""
+Module to define a trigram index of the text files in a working directory, used by search_files to find the files that
+can contain a match without reading every file. Each file is split into the set of 3 character sequences it contains
+(lowercased, so case-insensitive searches can use the index too), and every trigram maps to the files containing it. A
+query can only match files that contain every trigram of the literal text it requires. Besides the postings, each file
+only keeps its validator and its trigrams concatenated into one string, which is what gets removed when it is reindexed.
+
+The index is built the first time it is searched. write_file updates the file it writes, and every search checks the
+(mtime_ns, size, inode) of each file in the workspace tree so changes made by running code are picked up as well.
+"""
+
+import os
+import re
+import threading
+from config import BINARY_CHECK_BYTES, MAX_INDEX_FILE_BYTES
+from functions.file_cache import get_validator
+from functions.workspace import get_workspace
+
+
+# Escapes of characters that stand for themselves, e.g. \n
+_CHARACTER_ESCAPES = {"a": "\a", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+
+# Escapes that match an empty string, so a run of plain characters continues across them
+_ANCHOR_ESCAPES = ("A", "b", "B", "Z")
+
+# Number of hex digits of each hex escape, e.g. \x41
+_HEX_ESCAPES = {"x": 2, "u": 4, "U": 8}
+
+# Quantifier in braces, e.g. {2,3}. A brace that does not start one is a plain character.
+_BRACE_QUANTIFIER = re.compile(r"\{\d*(,\d*)?\}")
+
+# Inline flags that apply to the whole pattern, e.g. (?ix)
+_GLOBAL_FLAGS = re.compile(r"\?([aiLmsux]+)\)")
+
+# One index per absolute working directory
+_search_indexes = {}
+_search_indexes_lock = threading.Lock()
+
+
+class SearchIndex:
+    """
+    Trigram index of a working directory. Function calls can run concurrently, so every method is thread safe.
+    """
+
+    def __init__(self, working_dir_abs):
+        """
+        :param working_dir_abs: Absolute path of the directory to index
+        """
+        self.working_dir_abs = working_dir_abs
+        self.is_built = False
+        self._files = {}
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Brings the index up to date with the files on disk, reindexing only files that changed
+        """
+
+        files = get_workspace(self.working_dir_abs).get_files()
+        with self._lock:
+            seen = set()
+            for file_entry in files:
+                if file_entry.st_size > MAX_INDEX_FILE_BYTES:
+                    continue
+                seen.add(file_entry.path)
+                entry = self._files.get(file_entry.path)
+                if entry is None or entry[0] != get_validator(file_entry):
+                    self._index_file(file_entry.path, file_entry)
+
+            for file_path in set(self._files) - seen:
+                self._remove_file(file_path)
+
+            self.is_built = True
+
+    def update_file(self, file_path):
+        """
+        Reindexes a single file after it was written. Does nothing until the index has been built.
+        :param file_path: Absolute path of the file
+        """
+
+        if not self.is_built:
+            return
+        file_entry = get_workspace(self.working_dir_abs).get_entry(file_path)
+        with self._lock:
+            if file_entry is not None and file_entry.st_size <= MAX_INDEX_FILE_BYTES:
+                self._index_file(file_path, file_entry)
+            else:
+                self._remove_file(file_path)
+
+    def get_candidates(self, literals):
+        """
+        Gets the files that contain every trigram of the given literal strings
+        :param literals: Strings that every match must contain
+        :return: Sorted list of absolute paths of files that can contain a match
+        """
+
+        with self._lock:
+            candidates = None
+            for literal in literals:
+                for trigram in _get_trigrams(literal.lower()):
+                    files = self._postings.get(trigram, set())
+                    candidates = set(files) if candidates is None else candidates & files
+                    if not candidates:
+                        return []
+
+            if candidates is None:
+                candidates = set(self._files)
+            return sorted(candidates)
+
+    def _index_file(self, file_path, file_stat):
+        self._remove_file(file_path)
+        try:
+            with open(file_path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return
+
+        # Binary files are skipped entirely, so they are never searched
+        if b"\0" in data[:BINARY_CHECK_BYTES]:
+            return
+
+        trigrams = _get_trigrams(data.decode(errors="replace").lower())
+        self._files[file_path] = (get_validator(file_stat), "".join(trigrams))
+        for trigram in trigrams:
+            self._postings.setdefault(trigram, set()).add(file_path)
+
+    def _remove_file(self, file_path):
+        entry = self._files.pop(file_path, None)
+        if entry is None:
+            return
+        trigrams = entry[1]
+        for index in range(0, len(trigrams), 3):
+            trigram = trigrams[index:index + 3]
+            files = self._postings.get(trigram)
+            files.discard(file_path)
+            if not files:
+                del self._postings[trigram]
+
+
+def get_search_index(working_directory):
+    """
+    Gets the search index for a working directory, creating it the first time it is used. The index is empty until it
+    is refreshed.
+    :param working_directory: Directory the index covers
+    :return: SearchIndex object for the working directory
+    """
+
+    working_dir_abs = os.path.abspath(working_directory)
+    with _search_indexes_lock:
+        if working_dir_abs not in _search_indexes:
+            _search_indexes[working_dir_abs] = SearchIndex(working_dir_abs)
+        return _search_indexes[working_dir_abs]
+
+
+def get_required_literals(pattern, is_regex):
+    """
+    Gets literal strings that every match of a query must contain. For regular expressions these are the runs of plain
+    characters at the top level of the pattern, anything more complex is left for the regex itself to check. Patterns
+    are read by a small parser of their own rather than the private re._parser module, which changes between Python
+    versions, and anything it does not recognize only ends the current run.
+    :param pattern: The query, a valid regular expression if is_regex is True
+    :param is_regex: True if the query is a regular expression
+    :return: List of literal strings, empty if nothing is known to be required
+    """
+
+    if not is_regex:
+        return [pattern]
+
+    literals = []
+    run = ""
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        index += 1
+        quantifier = _BRACE_QUANTIFIER.match(pattern, index - 1) if char == "{" else None
+
+        if char == "\\":
+            literal, index = _parse_escape(pattern, index)
+            if literal is not None:
+                run += literal
+                continue
+        elif char in "^$":
+            # Anchors take up no characters, so the run continues across them
+            continue
+        elif char == "|":
+            # Either side of a top-level alternation can match on its own, so nothing is required
+            return []
+        elif char in "*+?" or quantifier:
+            # The character before a quantifier can be left out or repeated, so it is not part of the run
+            run = run[:-1]
+            if quantifier:
+                index = quantifier.end()
+        elif char == "[":
+            index = _skip_class(pattern, index)
+        elif char == "(":
+            flags = _GLOBAL_FLAGS.match(pattern, index)
+            if flags and "x" in flags.group(1):
+                # Whitespace and comments in verbose patterns are not matched, so no run can be trusted
+                return []
+            index = _skip_group(pattern, index)
+        elif char != ".":
+            run += char
+            continue
+
+        literals.append(run)
+        run = ""
+    literals.append(run)
+
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def _parse_escape(pattern, index):
+    """
+    Helper function for get_required_literals()
+    :param pattern: Regular expression
+    :param index: Index of the character after a backslash
+    :return: Tuple of (the character the escape stands for, an empty string for an anchor, or None if it matches
+             anything else, index after the escape)
+    """
+
+    char = pattern[index]
+    index += 1
+    if char in _ANCHOR_ESCAPES:
+        return "", index
+    if char in _CHARACTER_ESCAPES:
+        return _CHARACTER_ESCAPES[char], index
+    if char in _HEX_ESCAPES:
+        digits = pattern[index:index + _HEX_ESCAPES[char]]
+        return chr(int(digits, 16)), index + len(digits)
+    if char == "N":
+        # Named character, e.g. \N{EM DASH}
+        return None, pattern.index("}", index) + 1
+    if char.isdigit():
+        # Backreference or octal escape, of up to 3 digits
+        end = index
+        while end < min(len(pattern), index + 2) and pattern[end].isdigit():
+            end += 1
+        return None, end
+    if char.isascii() and char.isalnum():
+        # Character class such as \d or \w
+        return None, index
+    return char, index
+
+
+def _skip_class(pattern, index):
+    """
+    Helper function for get_required_literals()
+    :param pattern: Regular expression
+    :param index: Index of the character after the opening bracket of a character class
+    :return: Index after the closing bracket
+    """
+
+    if pattern.startswith("^", index):
+        index += 1
+    # A closing bracket straight after the opening one is a member of the class
+    if pattern.startswith("]", index):
+        index += 1
+    while index < len(pattern):
+        char = pattern[index]
+        index += 2 if char == "\\" else 1
+        if char == "]":
+            break
+    return index
+
+
+def _skip_group(pattern, index):
+    """
+    Helper function for get_required_literals()
+    :param pattern: Regular expression
+    :param index: Index of the character after the opening parenthesis of a group
+    :return: Index after the matching closing parenthesis
+    """
+
+    # Comments end at the first closing parenthesis, whatever they contain
+    if pattern.startswith("?#", index):
+        return pattern.index(")", index) + 1
+
+    depth = 1
+    while index < len(pattern) and depth:
+        char = pattern[index]
+        index += 1
+        if char == "\\":
+            index += 1
+        elif char == "[":
+            index = _skip_class(pattern, index)
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+    return index
+
+
+def _get_trigrams(text):
+    """
+    Helper function for SearchIndex
+    :return: Set of every 3 character string in the text
+    """
+
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
@@ -0,0 +1,219 @@
+"""
+Module to define persistent agent sessions. Every session is saved to an append-only JSON Lines file in
+SESSIONS_DIRECTORY as it runs: a header record with the prompt and working directory, then one record per agent turn
+holding the messages added during that turn and a digest of every workspace file the turn read, wrote, ran or found in
+search results. A turn record can start by replacing the last message saved before it, when a resumed session added its
+note to that message.
+
+A saved session can be resumed with the conversation it had so far. The agent is told which of the files it saw have
+changed since, so it only needs to look at those again instead of exploring the workspace from the start.
+"""
+
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+from config import SESSIONS_DIRECTORY
+from google.genai import types
+from functions.overlay import resolve_working_directory
+
+
+# Functions whose file_path argument is a workspace file the agent has seen the content or output of
+FILE_FUNCTIONS = ("edit_file", "get_file_content", "run_python_file", "write_file")
+
+# Path at the start of each matching or context line of search_files output, relative to the working directory
+SEARCH_RESULT_PATH = re.compile(r"^(.+?)(?::\d+:|-\d+-) ", re.MULTILINE)
+
+
+class AgentSession:
+    """
+    A saved agent session. Records are only ever appended, so an interrupted session loses at most the turn that was
+    running.
+    """
+
+    def __init__(self, session_id, path, working_directory, messages=None, file_digests=None):
+        """
+        :param session_id: Identifier of the session, used with --resume
+        :param path: Path of the session's JSON Lines file
+        :param working_directory: Directory the session's function calls ran in
+        :param messages: List of types.Content objects saved so far
+        :param file_digests: Dictionary of {relative path: digest, or None if missing} for the files the session saw
+        """
+
+        self.session_id = session_id
+        self.path = path
+        self.working_directory = working_directory
+        self.messages = messages or []
+        self.file_digests = file_digests or {}
+        self._saved_messages = len(self.messages)
+        self._replaced_messages = 0  # Number of saved messages the next turn record rewrites
+
+    @classmethod
+    def create(cls, user_prompt, working_directory, sessions_directory=SESSIONS_DIRECTORY):
+        """
+        Starts a new saved session
+        :param user_prompt: The user's prompt for the AI agent
+        :param working_directory: Directory the session's function calls run in
+        :param sessions_directory: Directory to save the session in
+        :return: AgentSession object
+        """
+
+        sessions_directory = os.path.expanduser(sessions_directory)
+        os.makedirs(sessions_directory, exist_ok=True)
+        session_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        session = cls(session_id, os.path.join(sessions_directory, f"{session_id}.jsonl"),
+                      os.path.abspath(working_directory))
+        session._append({"type": "session", "id": session_id, "prompt": user_prompt,
+                         "working_directory": session.working_directory, "created": time.time()})
+        return session
+
+    @classmethod
+    def load(cls, session_id, sessions_directory=SESSIONS_DIRECTORY):
+        """
+        Loads a saved session so it can be resumed
+        :param session_id: Identifier of the session
+        :param sessions_directory: Directory the session was saved in
+        :return: AgentSession object holding the saved conversation
+        """
+
+        if os.path.basename(session_id) != session_id:
+            raise ValueError(f"Invalid session id: {session_id}")
+
+        path = os.path.join(os.path.expanduser(sessions_directory), f"{session_id}.jsonl")
+        if not os.path.isfile(path):
+            raise ValueError(f"No saved session with id {session_id}")
+
+        working_directory = None
+        messages = []
+        file_digests = {}
+        with open(path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last record is incomplete if the session was killed while writing it
+                    break
+                if record["type"] == "session":
+                    working_directory = record["working_directory"]
+                elif record["type"] == "turn":
+                    del messages[len(messages) - record.get("replaces", 0):]
+                    messages.extend(types.Content.model_validate_json(json.dumps(message))
+                                    for message in record["messages"])
+                    file_digests.update(record["files"])
+
+        return cls(session_id, path, working_directory, messages, file_digests)
+
+    def save_turn(self, messages):
+        """
+        Appends the messages added since the last saved turn, with digests of the files the turn's function calls used
+        :param messages: The whole conversation so far, as a list of types.Content objects
+        """
+
+        new_messages = messages[self._saved_messages:]
+        if not new_messages:
+            return
+
+        # Files are digested where the function calls saw them, which is the overlay for files with pending changes. A
+        # rewritten message had its files digested when it was first saved.
+        files = {}
+        for message in new_messages[self._replaced_messages:]:
+            for part in message.parts or []:
+                file_paths = []
+                if part.function_call and part.function_call.name in FILE_FUNCTIONS:
+                    file_paths.append((part.function_call.args or {}).get("file_path"))
+                if part.function_response and part.function_response.name == "search_files":
+                    # The agent has seen lines of every file named in the results
+                    result = (part.function_response.response or {}).get("result")
+                    if isinstance(result, str):
+                        file_paths += SEARCH_RESULT_PATH.findall(result)
+
+                for file_path in file_paths:
+                    if isinstance(file_path, str):
+                        relative_path = os.path.normpath(file_path)
+                        working_directory = resolve_working_directory(self.working_directory, "get_file_content",
+                                                                      {"file_path": relative_path})
+                        files[relative_path] = _get_digest(os.path.join(working_directory, relative_path))
+
+        self.file_digests.update(files)
+        record = {"type": "turn", "files": files, "messages": new_messages}
+        if self._replaced_messages:
+            record["replaces"] = self._replaced_messages
+        self._append(record)
+        self._saved_messages = len(messages)
+        self._replaced_messages = 0
+
+    def get_changed_files(self):
+        """
+        :return: List of (relative path, "modified" or "deleted") tuples for the files the session saw that have changed
+                 since it last saw them
+        """
+
+        changed_files = []
+        for relative_path, digest in sorted(self.file_digests.items()):
+            current_digest = _get_digest(os.path.join(self.working_directory, relative_path))
+            if current_digest != digest:
+                changed_files.append((relative_path, "deleted" if current_digest is None else "modified"))
+        return changed_files
+
+    def build_resume_message(self, user_prompt=None):
+        """
+        Builds the text telling the agent that the session is being resumed and which files have changed since
+        :param user_prompt: Optional new instructions from the user
+        :return: String to add to the conversation
+        """
+
+        changed_files = self.get_changed_files()
+        if changed_files:
+            file_note = "These files changed since you last saw them, read them again before relying on them: " + \
+                        ", ".join(f"{path} ({change})" for path, change in changed_files) + "."
+        else:
+            file_note = "No files you read or wrote have changed since, so there is no need to read them again."
+
+        return f"This session stopped earlier and is now being resumed. {file_note} " \
+               f"{user_prompt or 'Continue the task from where you left off.'}"
+
+    def get_resume_messages(self, user_prompt=None):
+        """
+        Builds the conversation to continue the session with
+        :param user_prompt: Optional new instructions from the user
+        :return: List of types.Content objects
+        """
+
+        messages = list(self.messages)
+        part = types.Part(text=self.build_resume_message(user_prompt))
+
+        # Turns alternate between the user and the model, so a session that stopped after sending function responses
+        # gets the note added to that last user message, which the next saved turn then rewrites
+        if messages and messages[-1].role == "user":
+            messages[-1] = types.Content(role="user", parts=[*(messages[-1].parts or []), part])
+            self._saved_messages = len(messages) - 1
+            self._replaced_messages = 1
+        else:
+            messages.append(types.Content(role="user", parts=[part]))
+        return messages
+
+    def _append(self, record):
+        # Messages are serialized by the SDK, which knows how to encode bytes such as inline data
+        messages = record.pop("messages", None)
+        line = json.dumps(record, separators=(",", ":"))
+        if messages is not None:
+            serialized = ",".join(message.model_dump_json(exclude_none=True) for message in messages)
+            line = f'{line[:-1]},"messages":[{serialized}]}}'
+
+        with open(self.path, "a") as file:
+            file.write(line + "\n")
+
+
+def _get_digest(file_path):
+    """
+    Helper function for AgentSession
+    :return: Digest of a file's content, or None if it does not exist
+    """
+
+    try:
+        with open(file_path, "rb") as file:
+            return hashlib.blake2b(file.read(), digest_size=16).hexdigest()
+    except OSError:
+        return None
@@ -0,0 +1,152 @@
+"""
+Worker process used by run_tests.py. It is started as its own interpreter in the working directory, so the code under
+test never runs inside the agent, and it only imports the standard library.
+
+Usage:
+python test_worker.py discover <pattern>
+    Prints a JSON object {"tests": [{"id", "file"}, ...], "errors": [TRACEBACK, ...]} describing every unittest case
+    found in files matching the pattern, and every test file that could not be imported
+python test_worker.py run
+    Reads a JSON list of test ids from stdin and runs them in that order, printing a JSON line
+    {"id", "outcome", "seconds", "traceback"} as each test finishes. The outcome is "passed", "failed", "error" or
+    "skipped"
+
+Results are written to the worker's original stdout. Anything the tests print goes to stderr instead, so it cannot be
+mistaken for a result.
+"""
+
+import json
+import os
+import sys
+import time
+import unittest
+
+
+# Outcomes of a test, from the least to the most severe
+_OUTCOMES = ("passed", "skipped", "failed", "error")
+
+
+class _StreamingResult(unittest.TestResult):
+    """
+    Test result that prints the outcome of every test as soon as it finishes. Output printed by a test is captured and
+    added to its traceback if it fails.
+    """
+
+    def __init__(self, results):
+        super().__init__()
+        self.buffer = True
+        self._results = results
+        self._current = None
+
+    def startTest(self, test):
+        super().startTest(test)
+        self._current = {"id": test.id(), "outcome": "passed", "start": time.perf_counter(), "traceback": []}
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        current, self._current = self._current, None
+        self._report(current["id"], current["outcome"], time.perf_counter() - current["start"],
+                     "\n".join(current["traceback"]))
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._record(test, "failed", self.failures[-1][1])
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self._record(test, "error", self.errors[-1][1])
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            failed = issubclass(err[0], test.failureException)
+            traceback_text = (self.failures if failed else self.errors)[-1][1]
+            self._record(test, "failed" if failed else "error", f"{subtest}\n{traceback_text}")
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._record(test, "skipped", reason)
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._record(test, "failed", "Unexpected success of a test marked as an expected failure")
+
+    def _record(self, test, outcome, traceback_text):
+        """
+        Records the outcome of the running test. Errors in class and module fixtures happen outside of any test, so
+        they are reported straight away under the fixture's own id.
+        """
+
+        if self._current is None or test.id() != self._current["id"]:
+            self._report(test.id(), outcome, 0.0, traceback_text)
+            return
+
+        # An error takes precedence over a failure, which takes precedence over a skip
+        if _OUTCOMES.index(outcome) > _OUTCOMES.index(self._current["outcome"]):
+            self._current["outcome"] = outcome
+        self._current["traceback"].append(traceback_text)
+
+    def _report(self, test_id, outcome, seconds, traceback_text):
+        self._results.write(json.dumps({"id": test_id, "outcome": outcome, "seconds": round(seconds, 6),
+                                        "traceback": traceback_text}) + "\n")
+        self._results.flush()
+
+
+def discover(pattern, results):
+    """
+    Finds the tests in the current directory and prints them as JSON
+    :param pattern: Pattern of the file names to look for tests in, e.g. "test*.py"
+    :param results: Stream to print the result to
+    """
+
+    loader = unittest.TestLoader()
+    suite = loader.discover(".", pattern=pattern, top_level_dir=".")
+
+    tests = []
+    for test in _iter_tests(suite):
+        # Modules that failed to import show up as placeholder tests, their tracebacks are in loader.errors
+        if type(test).__module__ == "unittest.loader":
+            continue
+        file_path = getattr(sys.modules.get(type(test).__module__), "__file__", None)
+        tests.append({"id": test.id(), "file": os.path.abspath(file_path) if file_path else None})
+
+    json.dump({"tests": tests, "errors": loader.errors}, results)
+    results.flush()
+
+
+def run(test_ids, results):
+    """
+    Runs tests in the given order, printing the outcome of each one as a JSON line
+    :param test_ids: List of test ids, e.g. "tests.TestCalculator.test_addition"
+    :param results: Stream to print the outcomes to
+    """
+
+    suite = unittest.defaultTestLoader.loadTestsFromNames(test_ids)
+    suite.run(_StreamingResult(results))
+
+
+def _iter_tests(suite):
+    """
+    Helper function for discover()
+    :return: Generator of the individual tests in a suite, in the order they run
+    """
+
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _iter_tests(test)
+        else:
+            yield test
+
+
+if __name__ == "__main__":
+    # Tests import their modules from the working directory, not from the directory holding this file
+    sys.path[0] = os.getcwd()
+
+    # Keep the original stdout for results and send everything else written to stdout to stderr
+    results_stream = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+
+    if sys.argv[1] == "discover":
+        discover(sys.argv[2], results_stream)
+    else:
+        run(json.load(sys.stdin), results_stream)
@@ -0,0 +1,118 @@
+"""
+Module to define an executor that runs the function calls from a single agent turn concurrently. Read-only functions
+run in parallel on a thread pool, while functions that change the working directory or run code inside it wait for any
+earlier call that touches the same paths. Results are always returned in the order the agent made the calls.
+"""
+
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import MAX_TOOL_WORKERS
+from functions.call_function import READ_ONLY_FUNCTIONS, call_function
+
+
+# Functions that run code from the working directory and may read or change any file within it
+EXECUTE_FUNCTIONS = {"run_python_file", "run_tests"}
+
+
+class ToolExecutor:
+    """
+    Runs function calls on a thread pool. Each submitted call waits only for the earlier calls it conflicts with, so
+    calls can also be submitted one at a time as they become available.
+    """
+
+    def __init__(self, verbose=False, max_workers=MAX_TOOL_WORKERS):
+        """
+        :param verbose: Optional argument that enables detailed information about the functions being called
+        :param max_workers: Maximum number of function calls that can run at the same time
+        """
+        self.verbose = verbose
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._submitted = []
+
+    def submit(self, function_call):
+        """
+        Schedules a function call to run once every earlier conflicting call has finished
+        :param function_call: The function the Agent is attempting to call
+        :return: Future that resolves to the types.Content object returned by call_function()
+        """
+
+        dependencies = [future for earlier_call, future in self._submitted if _calls_conflict(earlier_call, function_call)]
+        # Calls run in the context they were submitted from, so they see the working directory of the request
+        future = self._pool.submit(contextvars.copy_context().run, self._call_after, dependencies, function_call)
+        self._submitted.append((function_call, future))
+        return future
+
+    def _call_after(self, dependencies, function_call):
+        # Earlier calls were submitted first, so they have always been picked up by a worker before this one
+        wait(dependencies)
+        return call_function(function_call, self.verbose)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+def call_functions(function_calls, verbose=False):
+    """
+    Function that calls every function requested in a single agent turn, running independent calls concurrently
+    :param function_calls: The functions the Agent is attempting to call, in the order it requested them
+    :param verbose: Optional argument that enables detailed information about the functions being called
+    :return: List of types.Content objects in the same order as function_calls
+    """
+
+    with ToolExecutor(verbose) as executor:
+        futures = [executor.submit(call) for call in function_calls]
+        return [future.result() for future in futures]
+
+
+def _calls_conflict(earlier, later):
+    """
+    Helper function for ToolExecutor
+    Decides if a later function call has to wait for an earlier one to finish
+    :param earlier: Function call made first by the agent
+    :param later: Function call made after earlier
+    :return: True if the calls must run in order, False if they can run at the same time
+    """
+
+    if earlier.name in READ_ONLY_FUNCTIONS and later.name in READ_ONLY_FUNCTIONS:
+        return False
+
+    paths_overlap = _paths_overlap(_call_path(earlier), _call_path(later))
+
+    # A script can import or change any file, so only reads of unrelated paths may run alongside it
+    if earlier.name in EXECUTE_FUNCTIONS or later.name in EXECUTE_FUNCTIONS:
+        other = later if earlier.name in EXECUTE_FUNCTIONS else earlier
+        return other.name not in READ_ONLY_FUNCTIONS or paths_overlap
+
+    return paths_overlap
+
+
+def _call_path(function_call):
+    """
+    Helper function for _calls_conflict()
+    Gets the path a function call operates on, normalized so it can be compared with other calls. Calls to unknown
+    functions are treated as touching the whole working directory.
+    :param function_call: The function the Agent is attempting to call
+    :return: Absolute-style path rooted at the working directory, e.g. '/pkg/calculator.py'
+    """
+
+    args = dict(function_call.args) if function_call.args else {}
+    path = args.get("file_path") or args.get("directory") or "."
+    if not isinstance(path, str):
+        path = "."
+    return os.path.normpath(os.path.join(os.sep, path))
+
+
+def _paths_overlap(first, second):
+    """
+    Helper function for _calls_conflict()
+    :return: True if the paths are the same or one is a parent directory of the other
+    """
+
+    return os.path.commonpath([first, second]) in (first, second)
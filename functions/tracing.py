@@ -0,0 +1,112 @@
+"""
+Module to define tracing of the agent loop. While tracing is enabled, each API call, function call and subprocess is
+recorded as a span with its wall time, the CPU time of the thread that ran it and details such as bytes in and out and
+token counts. Spans are written as a Chrome trace (JSON), which chrome://tracing or https://ui.perfetto.dev can open to
+show whether model latency or tool execution dominates a session.
+
+Tracing is off by default, and span() then only costs a check of a module variable.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Spans recorded since tracing was enabled, or None while tracing is disabled
+_events = None
+_events_lock = threading.Lock()
+_start_time = 0.0
+
+# Names of the threads spans ran on, kept as the tool worker threads may have exited by the time the trace is written
+_thread_names = {}
+
+
+def enable_tracing():
+    """
+    Starts recording spans, discarding any recorded before
+    """
+
+    global _events, _start_time
+    with _events_lock:
+        _events = []
+        _thread_names.clear()
+        _start_time = time.perf_counter()
+
+
+def is_tracing_enabled():
+    """
+    :return: True if spans are being recorded
+    """
+
+    return _events is not None
+
+
+@contextmanager
+def span(name, category, **details):
+    """
+    Records the code run inside the with block as a span. More details can be added to the yielded dictionary while
+    the span is open, e.g. the token counts of a response once it has arrived.
+    :param name: Name shown for the span
+    :param category: Kind of span, e.g. "api", "tool" or "process"
+    :param details: Details to record with the span
+    :return: Dictionary of details recorded with the span, or None while tracing is disabled
+    """
+
+    if _events is None:
+        yield None
+        return
+
+    start = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield details
+    finally:
+        details["cpu_ms"] = round((time.thread_time() - start_cpu) * 1000, 3)
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - _start_time) * 1_000_000, 1),
+            "dur": round((time.perf_counter() - start) * 1_000_000, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": details,
+        }
+        with _events_lock:
+            if _events is not None:
+                _events.append(event)
+                _thread_names[event["tid"]] = threading.current_thread().name
+
+
+def get_content_bytes(contents):
+    """
+    Measures the size of a conversation the way it is sent to the API. Only worth calling while tracing is enabled.
+    :param contents: List of types.Content objects
+    :return: Size in bytes of the contents serialized as JSON
+    """
+
+    return sum(len(content.model_dump_json(exclude_none=True).encode()) for content in contents)
+
+
+def write_trace(path):
+    """
+    Stops recording spans and writes the ones recorded to a Chrome trace file
+    :param path: Path of the JSON file to write
+    :return: Number of spans written
+    """
+
+    global _events
+    with _events_lock:
+        events, _events = _events or [], None
+
+    # Name each thread so the trace viewer shows which spans ran on the main thread and which on tool workers
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+        for tid, name in _thread_names.items()
+    ]
+
+    with open(path, "w") as file:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, file, default=str)
+    return len(events)
@@ -0,0 +1,151 @@
+"""
+This module provides a pre-warmed alternative to starting a new interpreter for every run_python_file call. A fork
+server (warm_python_server.py) is started once with commonly used modules already imported. Each python file is then
+run in a clean child forked from it, with the same working directory, argv, timeout, and stdout/stderr capture as a
+cold `python <file.py> [args]`.
+"""
+
+import atexit
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from config import USE_WARM_RUNNER, WARM_RUNNER_PRELOAD
+
+
+_warm_runner_enabled = USE_WARM_RUNNER
+_server = None
+_server_lock = threading.Lock()
+
+
+def set_warm_runner_enabled(enabled):
+    """
+    Turns the warm runner on or off for every following run_python_file call. Turning it on starts the fork server
+    right away on a background thread, so neither the caller nor the first python file has to wait for it. If it fails
+    to start, the first run starts it again and reports the error.
+    :param enabled: True to run python files from the fork server
+    """
+
+    global _warm_runner_enabled
+    _warm_runner_enabled = enabled
+    if enabled:
+        threading.Thread(target=_start_server_quietly, name="warm-runner-start", daemon=True).start()
+
+
+def is_warm_runner_enabled():
+    """
+    :return: True if run_python_file should run python files from the fork server
+    """
+
+    return _warm_runner_enabled
+
+
+def run_warm_python(target_file_path, args, cwd, timeout, capture):
+    """
+    Runs a python file in a child of the fork server and waits for it to finish
+    :param target_file_path: Absolute path to the python file
+    :param args: Additional arguments passed to the python file
+    :param cwd: Directory the python file is run in
+    :param timeout: Maximum amount of time in seconds the python file may run for
+    :param capture: OutputCapture object that reads the output of the python file
+    :return: Exit code of the python file
+    """
+
+    stdout_reader, stdout_writer = os.pipe()
+    stderr_reader, stderr_writer = os.pipe()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(_get_server_socket_path())
+            request = json.dumps({"file_path": target_file_path, "args": list(args), "cwd": cwd}) + "\n"
+            socket.send_fds(connection, [request.encode()], [stdout_writer, stderr_writer])
+        except BaseException:
+            os.close(stdout_reader)
+            os.close(stderr_reader)
+            raise
+        finally:
+            # Only the child may hold the write ends, otherwise the readers never see the end of the output
+            os.close(stdout_writer)
+            os.close(stderr_writer)
+
+        stdout_file = open(stdout_reader, "rb", buffering=0)
+        stderr_file = open(stderr_reader, "rb", buffering=0)
+        connection.settimeout(timeout)
+        replies = connection.makefile("r")
+        try:
+            pid = int(replies.readline())
+        except BaseException:
+            stdout_file.close()
+            stderr_file.close()
+            raise
+
+        capture.start(stdout_file, stderr_file, lambda: _kill(pid))
+        try:
+            exit_code = int(replies.readline())
+        except TimeoutError:
+            _kill(pid)
+            raise subprocess.TimeoutExpired(target_file_path, timeout)
+        finally:
+            capture.join(timeout)
+
+    return exit_code
+
+
+def _kill(pid):
+    """
+    Helper function for run_warm_python()
+    Kills a child of the fork server if it is still running
+    """
+
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _get_server_socket_path():
+    """
+    Helper function for run_warm_python()
+    Starts the fork server the first time it is needed, or again if it has died
+    :return: Path of the fork server's Unix socket
+    """
+
+    global _server
+    with _server_lock:
+        if _server is not None and _server[0].poll() is None:
+            return _server[1]
+
+        socket_dir = tempfile.mkdtemp(prefix="aiagent-warm-")
+        socket_path = os.path.join(socket_dir, "server.sock")
+        server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_python_server.py")
+        process = subprocess.Popen([sys.executable, server_script, socket_path, *WARM_RUNNER_PRELOAD],
+                                   stdout=subprocess.PIPE, text=True)
+        if process.stdout.readline().strip() != "ready":
+            raise RuntimeError("Warm python server failed to start")
+
+        atexit.register(_stop_server, process, socket_dir)
+        _server = (process, socket_path)
+        return socket_path
+
+
+def _start_server_quietly():
+    """
+    Helper function for set_warm_runner_enabled()
+    Starts the fork server, leaving any error to be reported by the first run that needs it
+    """
+
+    try:
+        _get_server_socket_path()
+    except Exception:
+        pass
+
+
+def _stop_server(process, socket_dir):
+    process.kill()
+    process.wait()
+    shutil.rmtree(socket_dir, ignore_errors=True)
@@ -0,0 +1,168 @@
+"""
+Fork server used by warm_python_runner.py. It is started once as its own interpreter, imports commonly used modules, and
+then forks a clean child for every python file it is asked to run. It only imports the standard library so that the
+children start out as close to a fresh interpreter as possible.
+
+Usage: python warm_python_server.py <socket path> [modules to preload...]
+
+Protocol, one connection per python file:
+1. The client sends a JSON request line {"file_path", "args", "cwd"} along with the write ends of its stdout and stderr
+   pipes
+2. The server replies with the process id running the file on its own line, then with the exit code on its own line
+   once the file finishes. Exit codes follow subprocess conventions (negative for a signal)
+"""
+
+import importlib
+import json
+import os
+import runpy
+import signal
+import socket
+import sys
+import traceback
+
+
+def serve(socket_path, preload):
+    """
+    Preloads modules and then forks a child for every connection on the socket until the server is killed
+    :param socket_path: Path of the Unix socket to listen on
+    :param preload: Names of modules to import before forking
+    """
+
+    for module_name in preload:
+        importlib.import_module(module_name)
+
+    # Children are reaped automatically and interrupting the agent should not take the server down with it
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen()
+
+    # Let the client know the server is ready to accept requests
+    print("ready", flush=True)
+
+    while True:
+        connection, _ = listener.accept()
+        if os.fork() == 0:
+            # The child must never return to the accept loop, even if the client went away
+            try:
+                listener.close()
+                _handle(connection)
+            finally:
+                os._exit(0)
+        connection.close()
+
+
+def _handle(connection):
+    """
+    Helper function for serve()
+    Runs in a child of the server. Forks the process that runs the requested file and reports its exit code.
+    """
+
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    request, (stdout_fd, stderr_fd) = _receive_request(connection)
+
+    pid = os.fork()
+    if pid == 0:
+        connection.close()
+        _run_script(request, stdout_fd, stderr_fd)
+
+    os.close(stdout_fd)
+    os.close(stderr_fd)
+    connection.sendall(f"{pid}\n".encode())
+
+    _, status = os.waitpid(pid, 0)
+    try:
+        connection.sendall(f"{os.waitstatus_to_exitcode(status)}\n".encode())
+    except BrokenPipeError:
+        # The client stopped waiting because the file ran past its timeout
+        pass
+
+
+def _receive_request(connection):
+    """
+    Helper function for _handle()
+    :return: Tuple of the decoded request and the file descriptors sent with it
+    """
+
+    message, fds, _, _ = socket.recv_fds(connection, 65536, 2)
+    while not message.endswith(b"\n"):
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        message += chunk
+    return json.loads(message), fds
+
+
+def _run_script(request, stdout_fd, stderr_fd):
+    """
+    Helper function for _handle()
+    Sets up the process to look like `python <file.py> [args]`, runs the file as __main__, and exits the way the
+    interpreter would. Never returns.
+    """
+
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    os.close(stdout_fd)
+    os.close(stderr_fd)
+
+    # Recreate the standard streams so buffering matches a fresh interpreter writing to a pipe
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", buffering=1, errors="backslashreplace", closefd=False)
+
+    file_path = request["file_path"]
+    os.chdir(request["cwd"])
+    sys.argv = [file_path, *request["args"]]
+    sys.path[0] = os.path.dirname(file_path)
+
+    exit_code = 0
+    try:
+        runpy.run_path(file_path, run_name="__main__")
+    except SystemExit as e:
+        exit_code = _get_exit_code(e)
+    except BaseException as e:
+        _print_script_traceback(e, file_path)
+        exit_code = 1
+
+    try:
+        import atexit
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        exit_code = exit_code or 120
+    os._exit(exit_code)
+
+
+def _get_exit_code(error):
+    """
+    Helper function for _run_script()
+    Converts SystemExit into an exit code the same way the interpreter does
+    """
+
+    if error.code is None:
+        return 0
+    if isinstance(error.code, int):
+        return error.code
+    print(error.code, file=sys.stderr)
+    return 1
+
+
+def _print_script_traceback(error, file_path):
+    """
+    Helper function for _run_script()
+    Prints a traceback starting at the script's own frame, leaving out the frames used to run it
+    """
+
+    traceback_frames = error.__traceback__
+    while traceback_frames is not None and traceback_frames.tb_frame.f_code.co_filename != file_path:
+        traceback_frames = traceback_frames.tb_next
+    traceback.print_exception(type(error), error, traceback_frames)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,510 @@
+"""
+Module to define the workspace, an in-memory tree of the files in a working directory that the tools look paths up in
+instead of the disk. The tree records the type, size, mtime and inode of every path and the target of every symlink, so:
+- Paths are resolved and checked against the working directory one component at a time, following symlinks the way
+  os.path.realpath does. A path is rejected if it, or any symlink along it, leads outside the working directory.
+- Listings and checks that a path exists or is a file are dictionary lookups instead of stat calls.
+
+On Linux the tree is kept current through inotify, called through ctypes. Every directory is watched, and the events
+queued since the last lookup are applied before the next one. The kernel queues an event before the call that changed
+the file returns, so a lookup always sees every change that finished before it. Elsewhere, or once a directory cannot be
+watched (e.g. the inotify watch limit is reached), the tree is rescanned when it is older than WORKSPACE_POLL_INTERVAL,
+and the tools update the paths they change themselves. A tree that fell back to polling stays polled, so rescans do not
+use up the watch limit again.
+
+Directories in DEFAULT_LIST_EXCLUDES are recorded but not scanned or watched, paths inside them are looked up on disk.
+"""
+
+import ctypes
+import errno
+import os
+import stat
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from config import DEFAULT_LIST_EXCLUDES, WORKSPACE_POLL_INTERVAL
+
+
+# inotify event flags, from <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_DONT_FOLLOW = 0x2000000
+IN_EXCL_UNLINK = 0x4000000
+
+# Events watched for on every directory in the tree
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_EXCL_UNLINK)
+
+# Header of each event read from an inotify file descriptor: wd, mask, cookie and length of the name that follows
+EVENT_HEADER = struct.Struct("iIII")
+
+# Maximum number of symlinks followed while resolving a single path, the same limit Linux uses
+MAX_SYMLINK_HOPS = 40
+
+# Metadata of a path in the tree. The field names match os.stat_result, so file_cache.get_validator() accepts entries.
+WorkspaceEntry = namedtuple("WorkspaceEntry", ["path", "name", "st_mode", "st_size", "st_mtime_ns", "st_ino",
+                                               "link_target"])
+
+# One workspace per absolute working directory, shared by every tool call made within it
+_workspaces = {}
+_workspaces_lock = threading.Lock()
+
+
+class Workspace:
+    """
+    In-memory tree of a working directory. Function calls can run concurrently, so every method is thread safe.
+    """
+
+    def __init__(self, working_dir_abs):
+        """
+        :param working_dir_abs: Absolute path of the working directory. The tree is built the first time it is used.
+        """
+
+        self.working_dir_abs = working_dir_abs
+        self._real_dir = os.path.realpath(working_dir_abs)
+        self._entries = {}
+        self._children = {}
+        self._watches = {}
+        self._watched_dirs = {}
+        self._inotify = None
+        self._is_polling = False
+        self._scanned_at = None
+        self._is_stale = False
+        self._lock = threading.Lock()
+
+    def is_watching(self):
+        """
+        :return: True if the tree is kept current through inotify, False if it is polled
+        """
+
+        with self._lock:
+            self._sync()
+            return self._inotify is not None
+
+    def resolve(self, path, follow_symlinks=True):
+        """
+        Resolves a path given by the agent against the tree, following symlinks along it
+        :param path: Path relative to the working directory, or an absolute path within it
+        :param follow_symlinks: False to leave a symlink at the end of the path unresolved
+        :return: Tuple of (absolute path, WorkspaceEntry or None if nothing exists there), or (None, None) if the path
+                 leads outside the working directory
+        :raises OSError: If the path goes through too many symlinks
+        """
+
+        with self._lock:
+            self._sync()
+            return self._resolve(path, follow_symlinks)
+
+    def get_entry(self, path):
+        """
+        :param path: Absolute path within the working directory, symlinks are not followed
+        :return: WorkspaceEntry of the path, or None if it does not exist
+        """
+
+        with self._lock:
+            self._sync()
+            return self._lookup(path)
+
+    def follow(self, entry):
+        """
+        :param entry: WorkspaceEntry, usually from a listing
+        :return: WorkspaceEntry the entry leads to once symlinks are followed, or None if it is a broken symlink or
+                 one that leads outside the working directory
+        """
+
+        if not stat.S_ISLNK(entry.st_mode):
+            return entry
+        with self._lock:
+            try:
+                return self._resolve(entry.path, True)[1]
+            except OSError:
+                return None
+
+    def list_directory(self, dir_path):
+        """
+        :param dir_path: Absolute path of a directory within the working directory
+        :return: List of WorkspaceEntry objects of the directory's contents, sorted by name
+        """
+
+        with self._lock:
+            self._sync()
+            if dir_path in self._children:
+                return [self._entries[os.path.join(dir_path, name)] for name in sorted(self._children[dir_path])]
+
+        # Directories that are not part of the tree are listed from disk
+        with os.scandir(dir_path) as scanner:
+            return sorted((_build_entry(dir_entry.path, dir_entry.stat(follow_symlinks=False)) for dir_entry in scanner),
+                          key=lambda entry: entry.name)
+
+    def get_files(self):
+        """
+        :return: List of WorkspaceEntry objects of every regular file in the tree
+        """
+
+        with self._lock:
+            self._sync()
+            return [entry for entry in self._entries.values() if stat.S_ISREG(entry.st_mode)]
+
+    def update_path(self, path):
+        """
+        Brings a path and its parent directory up to date after a tool changed it. Only needed while polling, as
+        inotify reports the change anyway.
+        :param path: Absolute path that was written, created or removed
+        """
+
+        with self._lock:
+            if self._scanned_at is not None and self._inotify is None:
+                self._refresh_path(os.path.dirname(path))
+                self._refresh_path(path)
+
+    def mark_stale(self):
+        """
+        Makes the next lookup rescan the tree if it is being polled. Used after running code that may have changed
+        any file.
+        """
+
+        with self._lock:
+            self._is_stale = True
+
+    def close(self):
+        """
+        Stops watching the working directory and drops the tree
+        """
+
+        with self._lock:
+            self._stop_watching()
+            self._entries = {}
+            self._children = {}
+            self._scanned_at = None
+
+    def _sync(self):
+        """
+        Brings the tree up to date before a lookup, from queued inotify events or by rescanning if polling
+        """
+
+        if self._scanned_at is None:
+            self._rescan()
+        elif self._inotify is not None:
+            self._read_events()
+        elif self._is_stale or time.monotonic() - self._scanned_at >= WORKSPACE_POLL_INTERVAL:
+            self._rescan()
+
+    def _rescan(self):
+        self._stop_watching()
+        self._inotify = None if self._is_polling else _start_inotify()
+        self._entries = {}
+        self._children = {}
+
+        root_stat = os.stat(self.working_dir_abs)
+        self._entries[self.working_dir_abs] = _build_entry(self.working_dir_abs, root_stat)
+        if stat.S_ISDIR(root_stat.st_mode):
+            self._scan_directory(self.working_dir_abs)
+
+        self._scanned_at = time.monotonic()
+        self._is_stale = False
+
+    def _scan_directory(self, dir_path):
+        """
+        Adds the contents of a directory to the tree, along with the contents of every directory within it
+        """
+
+        # The watch is added before listing the directory, so nothing created in between is missed
+        self._watch(dir_path)
+        self._children[dir_path] = set()
+        try:
+            with os.scandir(dir_path) as scanner:
+                dir_entries = list(scanner)
+        except OSError:
+            return
+
+        for dir_entry in dir_entries:
+            try:
+                entry = _build_entry(dir_entry.path, dir_entry.stat(follow_symlinks=False))
+            except OSError:
+                continue
+            self._add_entry(entry)
+
+    def _add_entry(self, entry):
+        self._entries[entry.path] = entry
+        self._children[os.path.dirname(entry.path)].add(entry.name)
+        if stat.S_ISDIR(entry.st_mode) and entry.name not in DEFAULT_LIST_EXCLUDES:
+            self._scan_directory(entry.path)
+
+    def _refresh_path(self, path):
+        """
+        Brings a single path up to date with the disk, scanning it if it became a directory and dropping it along with
+        its contents if it no longer exists
+        """
+
+        if path == self.working_dir_abs:
+            try:
+                self._entries[path] = _build_entry(path, os.stat(path))
+            except OSError:
+                self._is_stale = True
+            return
+
+        parent = os.path.dirname(path)
+        if parent not in self._children:
+            # Paths inside directories that are not scanned are not part of the tree. Paths whose parent was created
+            # after the last scan bring the parent in, which scans the path with it.
+            if parent not in self._entries and parent != path:
+                self._refresh_path(parent)
+            return
+
+        try:
+            entry = _build_entry(path, os.lstat(path))
+        except OSError:
+            self._remove_path(path)
+            return
+
+        old_entry = self._entries.get(path)
+        if old_entry is not None and stat.S_ISDIR(old_entry.st_mode):
+            if stat.S_ISDIR(entry.st_mode) and old_entry.st_ino == entry.st_ino:
+                self._entries[path] = entry
+                return
+            self._remove_path(path)
+        self._add_entry(entry)
+
+    def _remove_path(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        self._children.get(os.path.dirname(path), set()).discard(entry.name)
+
+        # A directory that was moved keeps its watch, which would report its new location's events under the old path
+        for name in self._children.pop(path, ()):
+            self._remove_path(os.path.join(path, name))
+        self._unwatch(path)
+
+    def _lookup(self, path):
+        """
+        :return: WorkspaceEntry of an absolute path, looked up on disk if it is inside a directory that is not scanned
+        """
+
+        entry = self._entries.get(path)
+        if entry is not None or path == self.working_dir_abs:
+            return entry
+
+        parent = os.path.dirname(path)
+        while parent not in self._entries and parent != self.working_dir_abs:
+            parent = os.path.dirname(parent)
+
+        parent_entry = self._entries.get(parent)
+        if parent_entry is None or not stat.S_ISDIR(parent_entry.st_mode) or parent in self._children:
+            return None
+        try:
+            return _build_entry(path, os.lstat(path))
+        except OSError:
+            return None
+
+    def _resolve(self, path, follow_symlinks):
+        if os.path.isabs(path):
+            components = self._get_components(path)
+            if components is None:
+                return None, None
+        else:
+            components = _split_path(path)
+
+        # Components still to resolve are kept reversed, so the targets of symlinks can be pushed onto the end
+        pending = components[::-1]
+        current = self.working_dir_abs
+        entry = self._entries.get(current)
+        hops = 0
+        while pending:
+            name = pending.pop()
+            if name == "..":
+                if current == self.working_dir_abs:
+                    return None, None
+                current = os.path.dirname(current)
+                entry = self._lookup(current)
+                continue
+
+            current = os.path.join(current, name)
+            if entry is None or not stat.S_ISDIR(entry.st_mode):
+                # Nothing exists below a missing path or a file, but the rest of the path is still checked
+                entry = None
+                continue
+
+            entry = self._lookup(current)
+            if entry is None or not stat.S_ISLNK(entry.st_mode) or not (pending or follow_symlinks):
+                continue
+
+            hops += 1
+            if hops > MAX_SYMLINK_HOPS:
+                raise OSError(errno.ELOOP, os.strerror(errno.ELOOP), path)
+
+            if os.path.isabs(entry.link_target):
+                target_components = self._get_components(entry.link_target)
+                if target_components is None:
+                    return None, None
+                current = self.working_dir_abs
+            else:
+                target_components = _split_path(entry.link_target)
+                current = os.path.dirname(current)
+            entry = self._lookup(current)
+            pending.extend(target_components[::-1])
+
+        return current, entry
+
+    def _get_components(self, path):
+        """
+        :param path: Absolute path
+        :return: List of the path's components relative to the working directory, or None if it is outside of it
+        """
+
+        for root in (self.working_dir_abs, self._real_dir):
+            if path == root:
+                return []
+            if path.startswith(root.rstrip(os.sep) + os.sep):
+                return _split_path(path[len(root):])
+        return None
+
+    def _watch(self, dir_path):
+        if self._inotify is None:
+            return
+
+        # The working directory itself may be a symlink, nothing inside it is followed
+        mask = WATCH_MASK | (IN_DONT_FOLLOW if dir_path != self.working_dir_abs else 0)
+        watch = self._inotify[0].inotify_add_watch(self._inotify[1], os.fsencode(dir_path), mask)
+        if watch >= 0:
+            self._watches[watch] = dir_path
+            self._watched_dirs[dir_path] = watch
+        else:
+            # A directory without a watch would never be updated, e.g. once out of watches, so the tree is polled from
+            # now on
+            self._is_polling = True
+            self._stop_watching()
+
+    def _unwatch(self, dir_path):
+        watch = self._watched_dirs.pop(dir_path, None)
+        if watch is not None and self._inotify is not None:
+            self._watches.pop(watch, None)
+            self._inotify[0].inotify_rm_watch(self._inotify[1], watch)
+
+    def _stop_watching(self):
+        if self._inotify is not None:
+            os.close(self._inotify[1])
+        self._inotify = None
+        self._watches = {}
+        self._watched_dirs = {}
+
+    def _read_events(self):
+        """
+        Applies every inotify event queued since the last lookup
+        """
+
+        changed_paths = {}
+        while True:
+            try:
+                data = os.read(self._inotify[1], 65536)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + name_length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped, so nothing short of a rescan can be trusted
+                    self._rescan()
+                    return
+
+                dir_path = self._watches.get(watch)
+                if mask & IN_IGNORED:
+                    if dir_path is not None and self._watched_dirs.get(dir_path) == watch:
+                        del self._watched_dirs[dir_path]
+                    self._watches.pop(watch, None)
+                    continue
+                if dir_path is None:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and dir_path == self.working_dir_abs:
+                    self._rescan()
+                    return
+
+                # Changes to a directory's contents change its mtime too, which has no event of its own
+                changed_paths[dir_path] = None
+                if name:
+                    changed_paths[os.path.join(dir_path, os.fsdecode(name))] = None
+
+        # Each path is looked at once however many events it had, e.g. a file written in many small chunks
+        for path in changed_paths:
+            self._refresh_path(path)
+
+
+def get_workspace(working_directory):
+    """
+    Gets the workspace of a working directory, creating it the first time it is used
+    :param working_directory: Directory the workspace covers
+    :return: Workspace object for the working directory
+    """
+
+    working_dir_abs = os.path.abspath(working_directory)
+    with _workspaces_lock:
+        if working_dir_abs not in _workspaces:
+            _workspaces[working_dir_abs] = Workspace(working_dir_abs)
+        return _workspaces[working_dir_abs]
+
+
+def close_workspace(working_directory):
+    """
+    Stops tracking a working directory that is about to be removed, such as the scratch copy of an overlay
+    :param working_directory: Directory the workspace covers
+    """
+
+    with _workspaces_lock:
+        workspace = _workspaces.pop(os.path.abspath(working_directory), None)
+    if workspace is not None:
+        workspace.close()
+
+
+def _start_inotify():
+    """
+    Helper function for Workspace
+    :return: Tuple of (libc, non-blocking inotify file descriptor), or None if inotify is not available
+    """
+
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        file_descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    return (libc, file_descriptor) if file_descriptor >= 0 else None
+
+
+def _build_entry(path, stat_result):
+    """
+    Helper function for Workspace
+    :param path: Absolute path
+    :param stat_result: os.stat_result of the path, not following symlinks
+    :return: WorkspaceEntry of the path
+    """
+
+    link_target = os.readlink(path) if stat.S_ISLNK(stat_result.st_mode) else None
+    return WorkspaceEntry(path, os.path.basename(path), stat_result.st_mode, stat_result.st_size,
+                          stat_result.st_mtime_ns, stat_result.st_ino, link_target)
+
+
+def _split_path(path):
+    """
+    Helper function for Workspace
+    :return: List of the components of a path, without empty and "." components
+    """
+
+    return [part for part in path.replace(os.sep, "/").split("/") if part not in ("", ".")]
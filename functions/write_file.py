@@ -2,10 +2,18 @@
 This module provides a function that writes to a specified file. A file is valid if it is within the working_directory.
 The function is intended to be used by an AI agent via the Gemini API. The agent is restricted to only access files
 within the working directory.
+
+Files are written atomically: content goes to a temporary file in the same directory which then replaces the target,
+so a failed write never leaves a partially written file behind.
 """
 
 import os
+import secrets
+import stat
 from google.genai import types
+from functions.file_cache import get_file_cache
+from functions.search_index import get_search_index
+from functions.workspace import get_workspace
 
 
 def write_file(working_directory, file_path, content):
@@ -20,13 +28,12 @@ def write_file(working_directory, file_path, content):
     try:
         # Check for valid arguments
         working_dir_abs = os.path.abspath(working_directory)
-        target_file_path = os.path.normpath(os.path.join(working_dir_abs, file_path))
-        is_valid_target_file = os.path.commonpath([working_dir_abs, target_file_path]) == working_dir_abs
+        target_file_path, entry = get_workspace(working_dir_abs).resolve(file_path)
 
-        if not is_valid_target_file:
+        if target_file_path is None:
             return f"Error: Cannot write to \"{file_path}\" as it is outside the permitted working directory"
 
-        if os.path.isdir(target_file_path):
+        if entry is not None and stat.S_ISDIR(entry.st_mode):
             return f"Error: Cannot write to \"{file_path}\" as it is a directory"
 
         # Create parent directories to the target file if they don't already exist
@@ -34,12 +41,11 @@ def write_file(working_directory, file_path, content):
         os.makedirs(parent_dir, exist_ok=True)
 
         # Write to file
-        with open(target_file_path, "w") as file:
-            chars_written = file.write(content)
-            content_length = len(content)
-            if chars_written != content_length:
-                return f"Error: Unable to write entire provided content to \"{file_path}\". {chars_written} out of "\
-                       f"{content_length} characters written"
+        chars_written = write_file_atomic(working_dir_abs, target_file_path, content)
+        content_length = len(content)
+        if chars_written != content_length:
+            return f"Error: Unable to write entire provided content to \"{file_path}\". {chars_written} out of "\
+                   f"{content_length} characters written"
 
         return f"Successfully wrote to \"{file_path}\" ({len(content)} characters written)"
 
@@ -55,6 +61,60 @@ def write_file(working_directory, file_path, content):
         return f"Error: {e}"
 
 
+def write_file_atomic(working_dir_abs, target_file_path, content):
+    """
+    Writes content to a file by writing a temporary file next to it and renaming it over the target, then brings the
+    file cache, workspace tree and search index up to date. The target keeps its permissions if it already exists.
+    :param working_dir_abs: Absolute path of the working directory
+    :param target_file_path: Absolute path of the file to write
+    :param content: String to write to the file
+    :return: Number of characters written, the file is left untouched if this is not len(content)
+    """
+
+    file_descriptor, temp_path = _create_temp_file(os.path.dirname(target_file_path))
+    try:
+        with os.fdopen(file_descriptor, "w") as file:
+            chars_written = file.write(content)
+
+        if chars_written != len(content):
+            os.remove(temp_path)
+            return chars_written
+
+        try:
+            os.chmod(temp_path, os.stat(target_file_path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+
+        os.replace(temp_path, target_file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # Cached reads of the file and listings of its parent directories are out of date once it is written to
+    get_file_cache(working_dir_abs).invalidate(target_file_path)
+    get_workspace(working_dir_abs).update_path(target_file_path)
+    get_search_index(working_dir_abs).update_file(target_file_path)
+
+    return chars_written
+
+
+def _create_temp_file(directory):
+    """
+    Helper function for write_file_atomic(). Unlike tempfile.mkstemp, which creates files only the owner can read, the
+    file is created with the mode open() would use, so a new file gets the process umask without having to change it.
+    :param directory: Directory to create the file in
+    :return: Tuple of the file descriptor open for writing and the path of the file
+    """
+
+    while True:
+        temp_path = os.path.join(directory, f".tmp-{secrets.token_hex(8)}")
+        try:
+            return os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
 # Schema to describe write_file() to LLM
 schema_write_file = types.FunctionDeclaration(
     name="write_file",
@@ -5,19 +5,75 @@ Guided project from Boot.dev to create an AI agent using Gemini API, python, and
 
 import argparse
 import os
-from dotenv import load_dotenv  # import environmental variables
-from google import genai        # import google's genai library
-from functions.get_agent_response import get_agent_response
+import sys
+from config import MAX_CONCURRENT_SESSIONS, REQUESTS_PER_MINUTE, SERVE_SOCKET, TOKENS_PER_MINUTE, WORKING_DIRECTORY
 
 
 def main():
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="AI agent code assistant")
-    parser.add_argument("user_prompt", type=str, help="user prompt for Gemini")
+    parser.add_argument("user_prompt", type=str, nargs="?", help="user prompt for Gemini")
     parser.add_argument("--verbose", action="store_true", help="enable verbose output")
+    parser.add_argument("--stream", action="store_true",
+                        help="print the agent's response as it arrives and start function calls as soon as they do")
+    parser.add_argument("--batch", type=str, metavar="PROMPTS_JSONL",
+                        help="run every prompt in a JSON Lines file, printing one JSON result line per prompt")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_SESSIONS,
+                        help="maximum number of prompts to run at the same time in batch mode")
+    parser.add_argument("--warm-runner", action="store_true",
+                        help="run python files from a pre-warmed fork server instead of a new interpreter each time")
+    parser.add_argument("--cache", action="store_true",
+                        help="keep the system prompt and tool declarations in Gemini context caching, reused across "
+                             "turns and sessions")
+    parser.add_argument("--resume", type=str, metavar="SESSION_ID",
+                        help="continue a saved session, optionally with a new user prompt")
+    parser.add_argument("--overlay", action="store_true",
+                        help="hold file changes in a scratch copy of the working directory, committed together only if "
+                             "the agent succeeds")
+    parser.add_argument("--working-directory", type=str, default=WORKING_DIRECTORY,
+                        help="directory the agent works in (default is %(default)s)")
+    parser.add_argument("--serve", action="store_true",
+                        help="keep running and handle prompts sent with --connect, so later prompts skip the startup")
+    parser.add_argument("--connect", action="store_true",
+                        help="send the prompt to an agent started with --serve instead of running it in this process")
+    parser.add_argument("--socket", type=str, default=SERVE_SOCKET,
+                        help="Unix socket used by --serve and --connect (default is %(default)s)")
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE,
+                        help="maximum number of API requests per minute, 0 for no limit (default is "
+                             f"{REQUESTS_PER_MINUTE or 'no limit'})")
+    parser.add_argument("--tpm", type=int, default=TOKENS_PER_MINUTE,
+                        help="maximum number of tokens sent and received per minute, 0 for no limit (default is "
+                             f"{TOKENS_PER_MINUTE or 'no limit'})")
+    parser.add_argument("--hedge-after", type=float, metavar="SECONDS",
+                        help="send a duplicate of any API request that has not been answered after SECONDS and use "
+                             "whichever answers first")
+    parser.add_argument("--trace", type=str, metavar="TRACE_JSON",
+                        help="write a Chrome trace of every API call, function call and subprocess to a JSON file")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the agent loop with cProfile and print the slowest functions to stderr")
     args = parser.parse_args()
 
+    if args.serve and (args.user_prompt is not None or args.resume or args.batch or args.connect):
+        parser.error("--serve cannot be combined with a user prompt, --resume, --batch or --connect")
+    if args.batch and (args.user_prompt is not None or args.resume):
+        parser.error("--batch cannot be combined with a user prompt or --resume")
+    if not (args.batch or args.serve) and args.user_prompt is None and not args.resume:
+        parser.error("provide a user prompt, --batch, --resume or --serve")
+    if (args.batch or args.serve or args.connect) and (args.trace or args.profile or args.overlay):
+        parser.error("--trace, --profile and --overlay can only be used with a single user prompt")
+    if args.connect and (args.batch or args.warm_runner or args.cache or args.hedge_after is not None):
+        parser.error("--batch, --warm-runner, --cache and --hedge-after are options of the agent started with --serve")
+    if (args.rpm or 0) < 0 or (args.tpm or 0) < 0 or (args.hedge_after is not None and args.hedge_after <= 0):
+        parser.error("--rpm and --tpm cannot be negative and --hedge-after must be positive")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    # The agent server does all the work, so the client needs neither the API key nor the Gemini SDK
+    if args.connect:
+        connect(args)
+
     # Load environmental variables and get API key from os
+    from dotenv import load_dotenv  # import environmental variables
     load_dotenv()
     api_key = os.environ.get("GEMINI_API_KEY")
 
@@ -25,11 +81,144 @@ def main():
     if not api_key:
         raise RuntimeError("API key not found")
 
-    # Create an instance of a Gemini client
-    client = genai.Client(api_key=api_key)
+    # Start the fork server now so it warms up while the Gemini SDK is imported
+    if args.warm_runner:
+        from functions.warm_python_runner import set_warm_runner_enabled
+        set_warm_runner_enabled(True)
+
+    # The Gemini SDK takes most of the startup time, so it is only imported once the arguments are known to be valid
+    from google import genai        # import google's genai library
+    from functions.call_function import use_working_directory
+    from functions.get_agent_response import get_agent_response
+    from functions.request_scheduler import RequestScheduler, ScheduledClient
+    from functions.run_batch import run_batch
+    from functions.sessions import AgentSession
+    from functions.tracing import enable_tracing, write_trace
+
+    # Create an instance of a Gemini client. Every request goes through the scheduler, which keeps all sessions of the
+    # run within the rate limits and retries requests that fail.
+    scheduler = RequestScheduler(args.rpm or None, args.tpm or None, hedge_after=args.hedge_after)
+    client = ScheduledClient(genai.Client(api_key=api_key), scheduler)
+
+    context_cache = None
+    if args.cache:
+        from functions.context_cache import ContextCache
+        context_cache = ContextCache(client)
+
+    if args.serve:
+        from config import MODEL
+        from functions.agent_server import serve
+
+        # Open the connection to the API now, so the first request does not wait for the TLS handshake either
+        try:
+            client.models.get(model=MODEL)
+        except Exception as e:
+            print(f"Warning: Could not reach the Gemini API yet: {e}", file=sys.stderr)
+
+        serve(client, args.socket, context_cache)
+        exit(0)
+
+    if args.batch:
+        with use_working_directory(args.working_directory):
+            status = run_batch(client, args.batch, args.concurrency, args.verbose, context_cache)
+        if args.verbose:
+            print(scheduler.stats(), file=sys.stderr)
+        if status == "failure":
+            exit(1)
+        exit(0)
+
+    # Every turn is saved so the session can be picked up again if it runs out of API calls or is interrupted
+    if args.resume:
+        try:
+            session = AgentSession.load(args.resume)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        session = AgentSession.create(args.user_prompt, args.working_directory)
+    print(f"Session {session.session_id}", file=sys.stderr)
+
+    overlay = None
+    if args.overlay:
+        from functions.overlay import OverlayConflictError, WorkspaceOverlay, activate_overlay
+        overlay = WorkspaceOverlay(session.working_directory)
+        activate_overlay(overlay)
+
+    if args.trace:
+        enable_tracing()
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # A resumed session keeps running in the working directory it was started in
+    status = "failure"
+    try:
+        with use_working_directory(session.working_directory):
+            status = get_agent_response(client, args, context_cache, session)
+    finally:
+        # Changes are only kept if the agent finished, otherwise the working directory is left as it was
+        if overlay is not None:
+            activate_overlay(None)
+            if status == "success":
+                try:
+                    print(f"Committed changes to {overlay.commit()} files", file=sys.stderr)
+                except OverlayConflictError as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    status = "failure"
+                except OSError as e:
+                    # Nothing was applied, as the batch is rolled back, and the scratch copy is kept
+                    print(f"Error: Unable to commit changes: {e}. Pending changes are kept in {overlay.scratch_dir}",
+                          file=sys.stderr)
+                    status = "failure"
+            else:
+                print(f"Discarded pending changes to {overlay.discard()} files", file=sys.stderr)
+        if args.verbose:
+            print(scheduler.stats(), file=sys.stderr)
+        if profiler:
+            # Only the main thread is profiled, time spent in function calls on worker threads shows up as waiting
+            profiler.disable()
+            import pstats
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+        if args.trace:
+            print(f"Wrote {write_trace(args.trace)} trace spans to {args.trace}", file=sys.stderr)
+
+    if status == "failure":
+        print("Failed to get agent response")
+        print(f"Continue it with: python main.py --resume {session.session_id}")
+        exit(1)
+
+    exit(0)
+
+
+def connect(args):
+    """
+    Sends the prompt to an agent server started with --serve and prints the agent's output as it arrives
+    :param args: Arguments declared when the program was run
+    """
+
+    from functions.agent_client import send_request
+
+    request = {
+        "prompt": args.user_prompt,
+        "resume": args.resume,
+        "working_directory": os.path.abspath(args.working_directory),
+        "verbose": args.verbose,
+        "stream": args.stream,
+    }
+    try:
+        reply = send_request(request, args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"Error: No agent server is listening on {args.socket}, start one with: python main.py --serve",
+              file=sys.stderr)
+        exit(1)
 
-    if get_agent_response(client, args) == "failure":
+    if reply["status"] == "error":
+        print(f"Error: {reply['error']}", file=sys.stderr)
+    if reply["status"] != "success":
         print("Failed to get agent response")
+        if reply.get("session_id"):
+            print(f"Continue it with: python main.py --connect --resume {reply['session_id']}")
         exit(1)
 
     exit(0)
@@ -0,0 +1,120 @@
+"""
+Tests for agent_server.py and agent_client.py, run against the fake client
+"""
+
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.fake_client import FakeClient
+from functions.agent_client import send_request
+from functions.agent_server import AgentServer
+
+
+# Every request lists its working directory, then answers
+SESSION = {
+    "turns": [
+        {"function_calls": [{"name": "get_files_info", "args": {"directory": "."}}]},
+        {"function_calls": [{"name": "get_files_info", "args": {"directory": "."}}]},
+        {"text": "Listed."},
+        {"text": "Listed."},
+    ],
+}
+
+
+def run_request(socket_path, prompt, working_directory, results, key):
+    output = io.StringIO()
+    reply = send_request({"prompt": prompt, "working_directory": working_directory, "verbose": True}, socket_path,
+                         output)
+    results[key] = (reply, output.getvalue())
+
+
+def main():
+    temp_dir = tempfile.mkdtemp()
+    socket_path = os.path.join(temp_dir, "agent.sock")
+    other_directory = os.path.join(temp_dir, "other")
+    os.makedirs(other_directory)
+    with open(os.path.join(other_directory, "notes.txt"), "w") as file:
+        file.write("only in the other directory")
+
+    client = FakeClient(SESSION, latency=0.2)
+    server = AgentServer(client, socket_path, sessions_directory=os.path.join(temp_dir, "sessions"))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print("Expecting two concurrent requests to each list their own working directory and get their own output")
+    results = {}
+    threads = [
+        threading.Thread(target=run_request, args=(socket_path, "list calculator", os.path.abspath("calculator"),
+                                                   results, "calculator")),
+        threading.Thread(target=run_request, args=(socket_path, "list other", other_directory, results, "other")),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for key, (reply, output) in sorted(results.items()):
+        print(f"{key}: status {reply['status']}, sees main.py: {'main.py' in output}, "
+              f"sees notes.txt: {'notes.txt' in output}, answer: {output.strip().splitlines()[-1]}")
+    print()
+
+    print("Expecting a later request to reach the API within a few milliseconds")
+    client.latency = 0.0
+    start = time.perf_counter()
+    send_request({"prompt": "hello", "working_directory": other_directory}, socket_path, io.StringIO())
+    print(f"under 50 ms: {(client.requests[-1]['start'] - start) * 1000 < 50}")
+    print()
+
+    print("Expecting an error for a working directory that does not exist")
+    print(send_request({"prompt": "hello", "working_directory": os.path.join(temp_dir, "missing")}, socket_path))
+    print()
+
+    print("Expecting an error reply for a session file that cannot be loaded")
+    with open(os.path.join(temp_dir, "sessions", "damaged.jsonl"), "w") as file:
+        file.write('{"type": "turn"}\n')
+    print(send_request({"resume": "damaged"}, socket_path))
+    print()
+
+    print("Expecting the output of a script run with verbose to reach the client that asked for it")
+    server.client = FakeClient({"turns": [
+        {"function_calls": [{"name": "run_python_file", "args": {"file_path": "main.py", "args": ["3 + 5"]}}]},
+        {"text": "Ran it."},
+    ]})
+    output = io.StringIO()
+    send_request({"prompt": "run it", "working_directory": os.path.abspath("calculator"), "verbose": True},
+                 socket_path, output)
+    # The streamed output has the result on a line of its own, the function response printed after it does not
+    print(f"sees the result as it is printed: {'\n  \"result\": 8\n' in output.getvalue()}")
+    print()
+
+    print("Expecting connections closed without a request to be ignored without a traceback")
+    server_stderr = io.StringIO()
+    sys.stderr = server_stderr
+    try:
+        for _ in range(3):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.connect(socket_path)
+        print(send_request({"prompt": "hello", "working_directory": other_directory}, socket_path,
+                           io.StringIO())["status"])
+    finally:
+        sys.stderr = sys.__stderr__
+    print(f"traceback: {'Traceback' in server_stderr.getvalue()}")
+    print()
+
+    print("Expecting an error for a second server on the same socket")
+    try:
+        AgentServer(client, socket_path)
+    except RuntimeError as e:
+        print(f"Error: {e}".replace(temp_dir, "TEMP_DIR"))
+    print()
+
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
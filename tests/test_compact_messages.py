@@ -0,0 +1,93 @@
+"""
+Tests for compact_messages.py
+"""
+
+from config import MAX_CHARS
+from google.genai import types
+from functions.compact_messages import compact_messages
+
+
+def build_turn(name, args, result):
+    call = types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))])
+    response = types.Content(role="user", parts=[types.Part.from_function_response(name=name,
+                                                                                    response={"result": result})])
+    return [call, response]
+
+
+def print_messages(messages):
+    for message in messages:
+        for part in message.parts:
+            if part.function_call:
+                print(f"  {message.role}: {part.function_call.name}({str(part.function_call.args)[:70]})")
+            if part.function_response:
+                print(f"  {message.role}: -> {str(part.function_response.response['result'])[:90]}")
+
+
+def main():
+    messages = [types.Content(role="user", parts=[types.Part(text="fix the calculator")])]
+    messages += build_turn("get_file_content", {"file_path": "pkg/calculator.py"}, "old calculator " * 500)
+    messages += build_turn("run_python_file", {"file_path": "tests.py"}, "FAILED " * 500)
+    messages += build_turn("write_file", {"file_path": "pkg/calculator.py", "content": "new calculator " * 500},
+                           "Successfully wrote to \"pkg/calculator.py\"")
+    messages += build_turn("get_file_content", {"file_path": "./pkg/calculator.py"}, "new calculator " * 500)
+    messages += build_turn("run_python_file", {"file_path": "tests.py"}, "OK " * 500)
+
+    print("Expecting nothing compacted while under the token budget")
+    print(f"Tokens saved: {compact_messages(messages, prompt_tokens=1000, token_budget=30000)}")
+    print()
+
+    print("Expecting the first read and first run stubbed, the latest versions kept")
+    print(f"Tokens saved: {compact_messages(messages, prompt_tokens=40000, token_budget=30000)}")
+    print_messages(messages)
+    print()
+
+    print("Expecting nothing more to compact on a second pass")
+    print(f"Tokens saved: {compact_messages(messages, prompt_tokens=40000, token_budget=30000)}")
+    print()
+
+    print("Expecting written content to be kept when only part of the file is read back")
+    messages = [types.Content(role="user", parts=[types.Part(text="write the renderer")])]
+    messages += build_turn("write_file", {"file_path": "pkg/render.py", "content": "new renderer " * 500},
+                           "Successfully wrote to \"pkg/render.py\"")
+    messages += build_turn("get_file_content", {"file_path": "pkg/render.py", "start_line": 1, "end_line": 2},
+                           "new renderer")
+    print(f"Tokens saved: {compact_messages(messages, prompt_tokens=40000, token_budget=30000)}")
+    print_messages(messages)
+    print()
+
+    print("Expecting written content to be kept when reading it back was cut off at MAX_CHARS")
+    messages = [types.Content(role="user", parts=[types.Part(text="write a long file")])]
+    messages += build_turn("write_file", {"file_path": "long.txt", "content": "long line " * 2000},
+                           "Successfully wrote to \"long.txt\"")
+    messages += build_turn("get_file_content", {"file_path": "long.txt"},
+                           ("long line " * 2000)[:MAX_CHARS] + f'[...File "long.txt" truncated at {MAX_CHARS} '
+                                                                 f'characters. Use start_line or offset to read the rest]')
+    compact_messages(messages, prompt_tokens=40000, token_budget=30000, keep_recent=2)
+    print_messages(messages)
+    print()
+
+    print("Expecting only the output of the earlier run with the same arguments to be stubbed")
+    messages = [types.Content(role="user", parts=[types.Part(text="check the calculator")])]
+    messages += build_turn("run_python_file", {"file_path": "main.py", "args": ["3 + 5"]}, "8 " * 1000)
+    messages += build_turn("run_python_file", {"file_path": "main.py", "args": ["2 * 3"]}, "6 " * 1000)
+    messages += build_turn("run_python_file", {"file_path": "main.py", "args": ["2 * 3"]}, "6 " * 1000)
+    print(f"Tokens saved: {compact_messages(messages, prompt_tokens=40000, token_budget=39000, keep_recent=3)}")
+    print_messages(messages)
+    print()
+
+    print("Expecting a read and a write followed by an edit of the same file to be stubbed")
+    messages = [types.Content(role="user", parts=[types.Part(text="fix the renderer")])]
+    messages += build_turn("get_file_content", {"file_path": "pkg/render.py"}, "old renderer " * 500)
+    messages += build_turn("write_file", {"file_path": "pkg/main.py", "content": "new main " * 500},
+                           "Successfully wrote to \"pkg/main.py\"")
+    messages += build_turn("edit_file", {"file_path": "pkg/render.py", "diff": "@@ -1 +1 @@"},
+                           "Successfully edited \"pkg/render.py\"")
+    messages += build_turn("edit_file", {"file_path": "pkg/main.py", "diff": "@@ -1 +1 @@"},
+                           "Successfully edited \"pkg/main.py\"")
+    print(f"Tokens saved: {compact_messages(messages, prompt_tokens=40000, token_budget=30000)}")
+    print_messages(messages)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Tests for context_cache.py, run against the fake client
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import httpx
+from benchmarks.fake_client import FakeClient
+from functions.context_cache import ContextCache
+from functions.get_agent_response import get_agent_response
+from google.genai import errors
+
+
+SESSION = {
+    "prompt": "what is in the pkg directory?",
+    "turns": [
+        {"function_calls": [{"name": "get_files_info", "args": {"directory": "pkg"}}]},
+        {"text": "The pkg directory holds the calculator and its renderer."},
+    ],
+}
+
+
+def fail_with(error):
+    def create(model, config):
+        raise error
+    return create
+
+
+def main():
+    args = argparse.Namespace(user_prompt=SESSION["prompt"], verbose=False, stream=False)
+    cache_file = os.path.join(tempfile.mkdtemp(), "context_cache.json")
+
+    print("Expecting cached tokens in the token usage, and the cached content to be created once")
+    client = FakeClient(SESSION)
+    get_agent_response(client, args, ContextCache(client, cache_file=cache_file))
+    print(f"created: {client.caches.created}")
+    print()
+
+    print("Expecting a later session to reuse the cached content recorded in the cache file")
+    second_client = FakeClient(SESSION)
+    second_client.caches = client.caches
+    context_cache = ContextCache(second_client, cache_file=cache_file)
+    get_agent_response(second_client, args, context_cache)
+    print(f"created: {client.caches.created}, same name: {context_cache.name == 'cachedContents/fake-1'}")
+    print()
+
+    print("Expecting the request to fall back to the full configuration when the cached content expires, and new "
+          "cached content to be created for the next request")
+    client.caches.expire(context_cache.name)
+    third_client = FakeClient(SESSION)
+    third_client.caches = client.caches
+    context_cache.client = third_client
+    print(get_agent_response(third_client, args, context_cache))
+    print(f"created: {client.caches.created}, name: {context_cache.name}")
+    print()
+
+    print("Expecting the TTL to be refreshed once less than half of it is left")
+    context_cache.ttl = 10 ** 6
+    context_cache.get_config()
+    print(f"updated: {client.caches.updated}")
+    print()
+
+    print("Expecting temporary errors to fall back to the full configuration for a while, and a rejection to turn "
+          "caching off")
+    for error in (errors.ServerError(503, {"error": {"code": 503, "message": "Service unavailable"}}),
+                  httpx.ConnectError("Connection refused"),
+                  errors.ClientError(400, {"error": {"code": 400, "message": "Cached content is too small"}})):
+        client = FakeClient(SESSION)
+        client.caches.create = fail_with(error)
+        context_cache = ContextCache(client, cache_file=os.path.join(tempfile.mkdtemp(), "context_cache.json"))
+        with contextlib.redirect_stderr(io.StringIO()):
+            cached = context_cache.get_config().cached_content is not None
+        print(f"{type(error).__name__}: cached: {cached}, disabled: {context_cache.disabled}, "
+              f"retried later: {context_cache.retry_at > 0}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
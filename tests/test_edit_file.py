@@ -0,0 +1,54 @@
+"""
+Tests for edit_file.py
+"""
+
+import os
+from functions.edit_file import edit_file
+from functions.get_file_content import get_file_content
+from functions.write_file import write_file
+
+
+def main():
+    write_file("calculator", "edit_test.py", "def add(a, b):\n    return a - b\n\n\nprint(add(1, 2))\n")
+
+    print("Expecting line 2 to be fixed with a search/replace hunk")
+    print(edit_file("calculator", "edit_test.py", edits=[{"old_text": "a - b", "new_text": "a + b"}]))
+    print(get_file_content("calculator", "edit_test.py"))
+    print()
+
+    print("Expecting a unified diff with an outdated line number to still apply where its context matches")
+    print(edit_file("calculator", "edit_test.py", diff="--- a/edit_test.py\n+++ b/edit_test.py\n@@ -9,2 +9,3 @@\n"
+                                                       "     return a + b\n+\n+# Adds two numbers\n"))
+    print(get_file_content("calculator", "edit_test.py"))
+    print()
+
+    print("Expecting a removed line starting with \"-- \" and an added line starting with \"++ \" to be applied")
+    write_file("calculator", "edit_test.txt", "-- old comment\nkeep\n")
+    print(edit_file("calculator", "edit_test.txt", diff="--- a/edit_test.txt\n+++ b/edit_test.txt\n@@ -1,2 +1,2 @@\n"
+                                                        "--- old comment\n+++ new comment\n keep\n"))
+    print(get_file_content("calculator", "edit_test.txt"))
+    os.remove(os.path.join("calculator", "edit_test.txt"))
+    print()
+
+    print("Expecting error for old_text that is not unique")
+    print(edit_file("calculator", "edit_test.py", edits=[{"old_text": "add", "new_text": "plus"}]))
+    print()
+
+    print("Expecting error for a hunk whose context does not match, leaving the file unchanged")
+    print(edit_file("calculator", "edit_test.py", diff="@@ -1,2 +1,2 @@\n def add(a, b):\n-    return b + a\n"
+                                                       "+    return a + b\n"))
+    print()
+
+    print("Expecting error for file that does not exist")
+    print(edit_file("calculator", "missing.py", edits=[{"old_text": "a", "new_text": "b"}]))
+    print()
+
+    print("Expecting error for file outside working directory")
+    print(edit_file("calculator", "/bin/cat", edits=[{"old_text": "a", "new_text": "b"}]))
+    print()
+
+    os.remove(os.path.join("calculator", "edit_test.py"))
+
+
+if __name__ == "__main__":
+    main()
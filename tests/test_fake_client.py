@@ -0,0 +1,43 @@
+"""
+Tests for benchmarks/fake_client.py
+"""
+
+import argparse
+import asyncio
+from benchmarks.fake_client import FakeClient
+from functions.get_agent_response import get_agent_response
+from functions.get_agent_response_async import get_agent_response_async
+
+
+SESSION = {
+    "prompt": "what is in the pkg directory?",
+    "turns": [
+        {"function_calls": [{"name": "get_files_info", "args": {"directory": "pkg"}}]},
+        {"text": "The pkg directory holds the calculator and its renderer."},
+    ],
+}
+
+
+def main():
+    print("Expecting a function call, then the scripted answer and success")
+    client = FakeClient(SESSION)
+    print(get_agent_response(client, argparse.Namespace(user_prompt=SESSION["prompt"], verbose=False, stream=False)))
+    print()
+
+    print("Expecting 2 requests, the second one carrying the function response (3 messages)")
+    print([request["messages"] for request in client.requests])
+    print()
+
+    print("Expecting the same answer streamed in chunks")
+    client = FakeClient(SESSION)
+    print(get_agent_response(client, argparse.Namespace(user_prompt=SESSION["prompt"], verbose=False, stream=True)))
+    print()
+
+    print("Expecting the async agent loop to reach the same answer in 2 API calls")
+    result = asyncio.run(get_agent_response_async(FakeClient(SESSION), SESSION["prompt"]))
+    print(result["status"], result["api_calls"], result["response"])
+    print()
+
+
+if __name__ == "__main__":
+    main()
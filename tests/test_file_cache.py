@@ -0,0 +1,51 @@
+"""
+Tests for file_cache.py
+"""
+
+from functions.file_cache import FileCache, get_file_cache, tracks_seen_outputs
+from functions.get_file_content import get_file_content
+from functions.get_files_info import get_files_info
+from functions.write_file import write_file
+
+
+@tracks_seen_outputs
+def run_session(*calls):
+    # Stands in for an agent session, returning the output of its last call
+    return [call() for call in calls][-1]
+
+
+def main():
+    print("Expecting the second read to be served from the cache and flagged as unchanged")
+    print(run_session(lambda: get_file_content("calculator", "lorem.txt"),
+                      lambda: get_file_content("calculator", "lorem.txt")))
+    print()
+
+    print("Expecting a new session to be served from the cache without the flag, as it has not seen the file")
+    print(run_session(lambda: get_file_content("calculator", "lorem.txt")))
+    print()
+
+    print("Expecting a fresh read after write_file invalidates the cached file")
+    print(run_session(lambda: write_file("calculator", "lorem.txt", "wait, this isn't lorem ipsum"),
+                      lambda: get_file_content("calculator", "lorem.txt")))
+    print()
+
+    print("Expecting the second listing to be served from the cache and flagged as unchanged, but not in a new session")
+    print(run_session(lambda: get_files_info("calculator", "pkg"), lambda: get_files_info("calculator", "pkg")))
+    print(run_session(lambda: get_files_info("calculator", "pkg")))
+    print()
+
+    print("Expecting 4 hits and 3 misses")
+    print(get_file_cache("calculator").stats())
+    print()
+
+    print("Expecting the least recently used entry to be evicted once over the memory limit")
+    file_cache = FileCache(max_bytes=200)
+    file_cache.put("content", "/a", (1, 1, 1), "a" * 100)
+    file_cache.put("content", "/b", (1, 1, 1), "b" * 100)
+    print(f"/a cached: {file_cache.get('content', '/a', (1, 1, 1)) is not None}")
+    print(f"/b cached: {file_cache.get('content', '/b', (1, 1, 1)) is not None}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,10 @@
 Tests for get_file_content.py
 """
 
+import os
+from config import MAX_CHARS
 from functions.get_file_content import get_file_content
+from functions.write_file import write_file
 
 
 def main():
@@ -21,6 +24,26 @@ def main():
     print(get_file_content("calculator", "/bin/cat"))
     print()
 
+    # Test line range
+    print("Result for lines 3-5 of pkg/calculator.py in calculator directory:")
+    print(get_file_content("calculator", "pkg/calculator.py", start_line=3, end_line=5))
+    print()
+
+    # Test byte range
+    print("Result for 20 bytes from offset 2 of pkg/calculator.py in calculator directory:")
+    print(get_file_content("calculator", "pkg/calculator.py", offset=2, length=20))
+    print()
+
+    # Test a line longer than MAX_CHARS, which can only be continued by offset
+    print("Result for the end of line 2 of a file whose line 2 does not fit in one read:")
+    write_file("calculator", "long_line.txt", "short\n" + "x" * MAX_CHARS + "end\nlast\n")
+    first_part = get_file_content("calculator", "long_line.txt", start_line=2)
+    print(first_part.splitlines()[0], first_part[-40:])
+    offset = int(first_part.rsplit("offset=", 1)[1].rstrip("]"))
+    print(get_file_content("calculator", "long_line.txt", offset=offset))
+    os.remove(os.path.join("calculator", "long_line.txt"))
+    print()
+
     # Test non-existent file
     print("Result for 'pkg/does_not_exits.py' in calculator directory:")
     print(get_file_content("calculator", "pkg/does_not_exist.py"))
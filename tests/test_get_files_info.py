@@ -26,6 +26,21 @@ def main():
     print(get_files_info("calculator", "../"))
     print()
 
+    # Test recursive listing filtered to python files
+    print("Result for recursive listing of python files in current directory:")
+    print(get_files_info("calculator", ".", recursive=True, include=["*.py"]))
+    print()
+
+    # Test recursive listing limited to one level below the current directory
+    print("Result for recursive listing with max_depth=2 excluding 'pkg':")
+    print(get_files_info("calculator", ".", recursive=True, max_depth=2, exclude=["pkg"]))
+    print()
+
+    # Test continuing a listing from a cursor
+    print("Result for recursive listing continuing after 'pkg/calculator.py':")
+    print(get_files_info("calculator", ".", recursive=True, cursor="pkg/calculator.py"))
+    print()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
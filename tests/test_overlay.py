@@ -0,0 +1,83 @@
+"""
+Tests for overlay.py, run against a temporary copy of the calculator directory
+"""
+
+import os
+import shutil
+import tempfile
+from functions.get_file_content import get_file_content
+from functions.overlay import OverlayConflictError, WorkspaceOverlay, activate_overlay, resolve_working_directory
+from functions.run_python_file import run_python_file
+from functions.write_file import write_file
+
+
+def main():
+    temp_dir = tempfile.mkdtemp()
+    working_directory = shutil.copytree("calculator", os.path.join(temp_dir, "calculator"))
+    overlay = WorkspaceOverlay(working_directory)
+    activate_overlay(overlay)
+
+    print("Expecting reads to use the working directory until something may change")
+    read_dir = resolve_working_directory(working_directory, "get_file_content", {"file_path": "main.py"})
+    print(read_dir == working_directory)
+    print()
+
+    print("Expecting a write to go to the scratch directory and be seen by reads, leaving the original untouched")
+    scratch_dir = resolve_working_directory(working_directory, "write_file", {"file_path": "overlay_test.py"})
+    print(write_file(scratch_dir, "overlay_test.py", 'print("from the overlay")'))
+    read_dir = resolve_working_directory(working_directory, "get_file_content", {"file_path": "./overlay_test.py"})
+    print(get_file_content(read_dir, "overlay_test.py"))
+    print(f"in working directory: {os.path.exists(os.path.join(working_directory, 'overlay_test.py'))}")
+    print()
+
+    print("Expecting untouched files to stay out of the scratch directory until code runs")
+    read_dir = resolve_working_directory(working_directory, "get_file_content", {"file_path": "main.py"})
+    print(read_dir == working_directory)
+    print(resolve_working_directory(working_directory, "get_files_info", {"directory": "pkg"}) == working_directory)
+    print(f"scratch directory: {os.listdir(scratch_dir)}")
+    print()
+
+    print("Expecting run_python_file to see the overlay and the rest of the working directory")
+    run_dir = resolve_working_directory(working_directory, "run_python_file", {"file_path": "main.py"})
+    print(run_python_file(run_dir, "overlay_test.py"))
+    print(f"main.py in scratch directory: {os.path.exists(os.path.join(scratch_dir, 'main.py'))}")
+    print()
+
+    print("Expecting the pending changes to be listed")
+    os.remove(os.path.join(scratch_dir, "README.md"))
+    print(overlay.get_changes())
+    print()
+
+    print("Expecting commit to apply both changes to the working directory")
+    print(f"committed: {overlay.commit()}")
+    print(f"overlay_test.py exists: {os.path.exists(os.path.join(working_directory, 'overlay_test.py'))}")
+    print(f"README.md exists: {os.path.exists(os.path.join(working_directory, 'README.md'))}")
+    print(f"leftover files: {[name for name in os.listdir(working_directory) if name.startswith('.tmp-')]}")
+    print()
+
+    print("Expecting discard to drop pending changes")
+    scratch_dir = resolve_working_directory(working_directory, "write_file", {"file_path": "overlay_test.py"})
+    write_file(scratch_dir, "overlay_test.py", 'print("discarded")')
+    print(f"discarded: {overlay.discard()}")
+    print(get_file_content(working_directory, "overlay_test.py"))
+    print()
+
+    print("Expecting a conflict error when the working directory changed under a pending change")
+    scratch_dir = resolve_working_directory(working_directory, "write_file", {"file_path": "overlay_test.py"})
+    write_file(scratch_dir, "overlay_test.py", 'print("from the overlay again")')
+    with open(os.path.join(working_directory, "overlay_test.py"), "w") as file:
+        file.write('print("changed outside the overlay")')
+    try:
+        overlay.commit()
+    except OverlayConflictError as e:
+        print(f"Error: {e}")
+    print(get_file_content(working_directory, "overlay_test.py"))
+    overlay.discard()
+    print()
+
+    activate_overlay(None)
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Tests for request_scheduler.py, run against the fake client with injected faults and slow requests
+"""
+
+import argparse
+import asyncio
+import time
+from benchmarks.fake_client import FakeClient, build_response
+from functions.get_agent_response import get_agent_response
+from functions.get_agent_response_async import get_agent_response_async
+from functions.request_scheduler import RequestScheduler, ScheduledClient, TokenBucket
+from google.genai import errors
+
+
+SESSION = {
+    "prompt": "what is in the pkg directory?",
+    "turns": [
+        {"function_calls": [{"name": "get_files_info", "args": {"directory": "pkg"}}]},
+        {"text": "The pkg directory holds the calculator and its renderer."},
+    ],
+}
+
+
+def run_session(client, stream=False):
+    args = argparse.Namespace(user_prompt=SESSION["prompt"], verbose=False, stream=stream)
+    return get_agent_response(client, args)
+
+
+def main():
+    print("Expecting a rate limit, a server error and a response without usage metadata to be retried")
+    scheduler = RequestScheduler(None, None, base_delay=0.01)
+    fake_client = FakeClient(SESSION, faults=[429, 503, None, "empty"])
+    print(run_session(ScheduledClient(fake_client, scheduler)))
+    print(f"attempts: {fake_client.attempts}, turns used: {len(fake_client.requests)}")
+    print(scheduler.stats())
+    print()
+
+    print("Expecting a bad request to be raised without retrying")
+    scheduler = RequestScheduler(None, None, base_delay=0.01)
+    try:
+        run_session(ScheduledClient(FakeClient(SESSION, faults=[400]), scheduler))
+    except errors.ClientError as e:
+        print(f"Error: {e.code}")
+    print(scheduler.stats())
+    print()
+
+    print("Expecting the error to be raised once the retries run out")
+    scheduler = RequestScheduler(None, None, max_retries=2, base_delay=0.01)
+    try:
+        run_session(ScheduledClient(FakeClient(SESSION, faults=[503, 503, 503]), scheduler))
+    except errors.ServerError as e:
+        print(f"Error: {e.code}")
+    print(scheduler.stats())
+    print()
+
+    print("Expecting a streamed request that fails before its first chunk to be retried")
+    scheduler = RequestScheduler(None, None, base_delay=0.01)
+    print(run_session(ScheduledClient(FakeClient(SESSION, faults=[None, 502]), scheduler), stream=True))
+    print(scheduler.stats())
+    print()
+
+    print("Expecting requests over the requests per minute limit to be queued")
+    scheduler = RequestScheduler(600, None)
+    response = build_response({"text": "Done."}, 0)
+    start = time.perf_counter()
+    for _ in range(602):
+        scheduler.call(lambda: response)
+    print(f"took at least 0.15 seconds: {time.perf_counter() - start >= 0.15}, queued: {scheduler.queued}")
+    print()
+
+    print("Expecting a token bucket to go into debt for a large reservation and be paid back by settling")
+    bucket = TokenBucket(6000)
+    print(f"wait for 3000 tokens: {bucket.reserve(3000):.0f} seconds")
+    print(f"wait for 6000 more: {bucket.reserve(6000):.0f} seconds")
+    print(f"wait after giving 6000 back: {bucket.reserve(-6000):.0f} seconds")
+    print(f"3000 fit right away: {bucket.try_reserve(3000)}, 1000 more fit: {bucket.try_reserve(1000)}")
+    print()
+
+    print("Expecting a slow request to be hedged and the hedge to win, with the session taking the usual turns")
+    scheduler = RequestScheduler(None, None, hedge_after=0.05)
+    fake_client = FakeClient(SESSION, latencies=[1.0])
+    start = time.perf_counter()
+    print(run_session(ScheduledClient(fake_client, scheduler)))
+    print(f"under 1 second: {time.perf_counter() - start < 1.0}, turns used: {len(fake_client.requests)}")
+    print(scheduler.stats())
+    print()
+
+    print("Expecting the same from the async agent loop")
+    scheduler = RequestScheduler(None, None, hedge_after=0.05)
+    fake_client = FakeClient(SESSION, latencies=[1.0])
+    start = time.perf_counter()
+    result = asyncio.run(get_agent_response_async(ScheduledClient(fake_client, scheduler), SESSION["prompt"]))
+    print(result["status"], result["api_calls"], result["response"])
+    print(f"under 1 second: {time.perf_counter() - start < 1.0}, turns used: {len(fake_client.requests)}")
+    print(scheduler.stats())
+    print()
+
+    print("Expecting no hedge when the requests per minute limit has no room for one")
+    scheduler = RequestScheduler(1, None, hedge_after=0.05)
+    ScheduledClient(FakeClient(SESSION, latencies=[0.2]), scheduler).models.generate_content(model="fake", contents=[])
+    print(scheduler.stats())
+    print()
+
+
+if __name__ == "__main__":
+    main()
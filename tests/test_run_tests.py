@@ -0,0 +1,96 @@
+"""
+Tests for run_tests.py, run against a temporary project with two test files
+"""
+
+import os
+import shutil
+import tempfile
+from functions.run_tests import run_tests
+from functions.workspace import close_workspace
+
+
+FILES = {
+    "shapes.py": "def area(width, height):\n    return width * height\n",
+    "geometry.py": "from shapes import area\n\n\ndef total_area(rectangles):\n    return sum(area(*r) for r in rectangles)\n",
+    "util.py": "def double(value):\n    return value * 2\n",
+    "test_geometry.py": "import unittest\nfrom geometry import total_area\n\n\n"
+                        "class TestGeometry(unittest.TestCase):\n"
+                        "    def test_total_area(self):\n        self.assertEqual(total_area([(2, 3), (1, 1)]), 7)\n\n"
+                        "    def test_empty(self):\n        self.assertEqual(total_area([]), 0)\n",
+    "test_util.py": "import unittest\nimport util\n\n\n"
+                    "class TestUtil(unittest.TestCase):\n"
+                    "    def test_double(self):\n        print('noisy test output')\n"
+                    "        self.assertEqual(util.double(4), 8)\n",
+}
+
+
+def write(working_directory, file_path, content):
+    with open(os.path.join(working_directory, file_path), "w") as file:
+        file.write(content)
+
+
+def show(result, temp_dir):
+    print(result.replace(temp_dir, "TEMP_DIR"))
+
+
+def main():
+    temp_dir = tempfile.mkdtemp()
+    working_directory = os.path.join(temp_dir, "project")
+    os.makedirs(working_directory)
+    for file_path, content in FILES.items():
+        write(working_directory, file_path, content)
+
+    print("Expecting the first run to run every test")
+    show(run_tests(working_directory), temp_dir)
+
+    print("Expecting no tests to run when nothing changed")
+    show(run_tests(working_directory), temp_dir)
+
+    print("Expecting only the geometry tests to run after shapes.py changed, as geometry.py imports it")
+    write(working_directory, "shapes.py", "def area(width, height):\n    return height * width\n")
+    show(run_tests(working_directory), temp_dir)
+
+    print("Expecting a failure with its traceback and the test's own output, after util.py broke")
+    write(working_directory, "util.py", "def double(value):\n    return value * 3\n")
+    show(run_tests(working_directory), temp_dir)
+
+    print("Expecting the failing test to run again even though nothing changed")
+    show(run_tests(working_directory), temp_dir)
+
+    print("Expecting the fixed test to pass and nothing to be left to run after it")
+    write(working_directory, "util.py", "def double(value):\n    return value + value\n")
+    show(run_tests(working_directory), temp_dir)
+    show(run_tests(working_directory), temp_dir)
+
+    print("Expecting every test to run after a file that is not python code changed")
+    write(working_directory, "data.txt", "1 2 3")
+    show(run_tests(working_directory), temp_dir)
+
+    print("Expecting only the named tests, and an error for a name that matches none")
+    show(run_tests(working_directory, tests=["test_geometry.TestGeometry.test_empty"]), temp_dir)
+    show(run_tests(working_directory, tests=["test_missing"]), temp_dir)
+    print()
+
+    print("Expecting an error for a test that stops its process, and for a test file that cannot be imported")
+    write(working_directory, "test_exit.py", "import os\nimport unittest\n\n\n"
+                                             "class TestExit(unittest.TestCase):\n"
+                                             "    def test_exit(self):\n        os._exit(3)\n")
+    write(working_directory, "test_broken.py", "import missing_module\n")
+    show(run_tests(working_directory), temp_dir)
+
+    print("Expecting only the end of what a crashing test printed to be reported")
+    os.remove(os.path.join(working_directory, "test_broken.py"))
+    write(working_directory, "test_exit.py", "import os\nimport unittest\n\n\n"
+                                             "class TestExit(unittest.TestCase):\n"
+                                             "    def test_exit(self):\n"
+                                             "        os.write(2, b'.' * 10000000 + b'\\nlast words')\n"
+                                             "        os._exit(3)\n")
+    result = run_tests(working_directory, tests=["test_exit"])
+    print(f"last words reported: {'last words' in result}, under 5000 characters: {len(result) < 5000}")
+
+    close_workspace(working_directory)
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
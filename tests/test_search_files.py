@@ -0,0 +1,50 @@
+"""
+Tests for search_files.py
+"""
+
+import os
+from functions.search_files import search_files
+from functions.search_index import get_required_literals
+from functions.write_file import write_file
+
+
+def main():
+    print("Expecting the definition of evaluate in pkg/calculator.py")
+    print(search_files("calculator", "def evaluate("))
+    print()
+
+    print("Expecting every top-level def in the pkg directory, found with a regular expression")
+    print(search_files("calculator", r"^def \w+", directory="pkg", regex=True))
+    print()
+
+    print("Expecting a case-insensitive match with one line of context either side")
+    print(search_files("calculator", "SHUNTING-YARD", case_sensitive=False, context_lines=1))
+    print()
+
+    print("Expecting a file written after the index was built to be searchable straight away")
+    print(write_file("calculator", "search_test.txt", "needle in a haystack"))
+    print(search_files("calculator", "needle in a"))
+    os.remove(os.path.join("calculator", "search_test.txt"))
+    print()
+
+    print("Expecting the literals every match must contain to be taken from the regular expression")
+    print(get_required_literals(r"def (evaluate|compile)\(self", True))
+    print(get_required_literals(r"^\s*self\.precedence\[[^]]+\] = \d+", True))
+    print(get_required_literals(r"evaluate|compile", True))
+    print()
+
+    print("Expecting no matches")
+    print(search_files("calculator", "this text is not in any file"))
+    print()
+
+    print("Expecting error for an invalid regular expression")
+    print(search_files("calculator", "def (", regex=True))
+    print()
+
+    print("Expecting error for directory outside the working directory")
+    print(search_files("calculator", "import", directory="../"))
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Tests for sessions.py, run against the fake client
+"""
+
+import argparse
+import os
+import tempfile
+from benchmarks.fake_client import FakeClient
+from functions.get_agent_response import get_agent_response
+from functions.sessions import AgentSession
+from functions.write_file import write_file
+from google.genai import types
+
+
+SESSION = {
+    "prompt": "what does session_test.txt say?",
+    "turns": [
+        {"function_calls": [{"name": "get_file_content", "args": {"file_path": "session_test.txt"}}]},
+        {"text": "It says hello."},
+    ],
+}
+
+
+def main():
+    sessions_directory = tempfile.mkdtemp()
+    write_file("calculator", "session_test.txt", "hello")
+
+    print("Expecting a session to be saved with one record per turn")
+    session = AgentSession.create(SESSION["prompt"], "calculator", sessions_directory)
+    args = argparse.Namespace(user_prompt=SESSION["prompt"], verbose=False, stream=False)
+    get_agent_response(FakeClient(SESSION), args, session=session)
+    with open(session.path) as file:
+        print([line.split(",")[0] for line in file])
+    print()
+
+    print("Expecting the saved conversation to be loaded back, with no changed files")
+    loaded = AgentSession.load(session.session_id, sessions_directory)
+    print(f"messages: {len(loaded.messages)}, changed files: {loaded.get_changed_files()}")
+    print()
+
+    print("Expecting the resumed session to be told which files changed since")
+    write_file("calculator", "session_test.txt", "goodbye")
+    print(loaded.build_resume_message("What does it say now?"))
+    print()
+
+    print("Expecting the resumed conversation to be sent in full, with the resume note as the next user message")
+    client = FakeClient({"turns": [{"text": "It says goodbye now."}]})
+    args = argparse.Namespace(user_prompt="What does it say now?", verbose=False, stream=False)
+    get_agent_response(client, args, session=loaded)
+    print(f"messages sent: {client.requests[0]['messages']}")
+    print(f"messages saved: {len(AgentSession.load(session.session_id, sessions_directory).messages)}")
+    print()
+
+    print("Expecting a file the agent only saw in search results to be reported as changed")
+    write_file("calculator", "session_search.txt", "first needle")
+    search_session = AgentSession.create("where is the needle?", "calculator", sessions_directory)
+    client = FakeClient({"turns": [
+        {"function_calls": [{"name": "search_files", "args": {"query": "needle"}}]},
+        {"text": "In session_search.txt."},
+    ]})
+    args = argparse.Namespace(user_prompt="where is the needle?", verbose=False, stream=False)
+    get_agent_response(client, args, session=search_session)
+    write_file("calculator", "session_search.txt", "second needle")
+    print(AgentSession.load(search_session.session_id, sessions_directory).get_changed_files())
+    os.remove(os.path.join("calculator", "session_search.txt"))
+    print()
+
+    print("Expecting new instructions to be saved when the session stopped on function responses")
+    stopped_session = AgentSession.create(SESSION["prompt"], "calculator", sessions_directory)
+    stopped_session.save_turn([
+        types.Content(role="user", parts=[types.Part(text=SESSION["prompt"])]),
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="get_files_info",
+                                                                                       args={}))]),
+        types.Content(role="user", parts=[types.Part.from_function_response(name="get_files_info",
+                                                                            response={"result": "- main.py"})]),
+    ])
+    resumed = AgentSession.load(stopped_session.session_id, sessions_directory)
+    args = argparse.Namespace(user_prompt="Now count the files.", verbose=False, stream=False)
+    get_agent_response(FakeClient({"turns": [{"text": "There is one file."}]}), args, session=resumed)
+    reloaded = AgentSession.load(stopped_session.session_id, sessions_directory).messages
+    print(f"roles: {[message.role for message in reloaded]}")
+    print(f"new instructions saved: {'Now count the files.' in (reloaded[2].parts[-1].text or '')}")
+    print()
+
+    print("Expecting error for a session id that does not exist")
+    try:
+        AgentSession.load("missing", sessions_directory)
+    except ValueError as e:
+        print(f"Error: {e}")
+    print()
+
+    os.remove(os.path.join("calculator", "session_test.txt"))
+
+
+if __name__ == "__main__":
+    main()
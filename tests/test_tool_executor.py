@@ -0,0 +1,45 @@
+"""
+Tests for tool_executor.py
+"""
+
+import time
+from google.genai import types
+from functions.tool_executor import call_functions, _calls_conflict
+
+
+def main():
+    read_main = types.FunctionCall(name="get_file_content", args={"file_path": "main.py"})
+    list_pkg = types.FunctionCall(name="get_files_info", args={"directory": "pkg"})
+    write_lorem = types.FunctionCall(name="write_file", args={"file_path": "lorem.txt",
+                                                              "content": "wait, this isn't lorem ipsum"})
+    read_lorem = types.FunctionCall(name="get_file_content", args={"file_path": "./lorem.txt"})
+    run_tests = types.FunctionCall(name="run_python_file", args={"file_path": "tests.py"})
+
+    print("Expecting False (two reads can run at the same time)")
+    print(_calls_conflict(read_main, list_pkg))
+    print()
+
+    print("Expecting True (read of a file that was just written)")
+    print(_calls_conflict(write_lorem, read_lorem))
+    print()
+
+    print("Expecting False (write to a file outside the listed directory)")
+    print(_calls_conflict(list_pkg, write_lorem))
+    print()
+
+    print("Expecting True (run after a write anywhere in the working directory)")
+    print(_calls_conflict(write_lorem, run_tests))
+    print()
+
+    print("Expecting results in the order the calls were made")
+    start = time.perf_counter()
+    results = call_functions([run_tests, read_main, write_lorem, read_lorem, list_pkg])
+    elapsed = time.perf_counter() - start
+    for result in results:
+        print(f"{result.parts[0].function_response.name}: {str(result.parts[0].function_response.response)[:60]}")
+    print(f"Elapsed: {elapsed:.3f} seconds")
+    print()
+
+
+if __name__ == "__main__":
+    main()
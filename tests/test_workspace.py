@@ -0,0 +1,130 @@
+"""
+Tests for workspace.py, run against a temporary copy of the calculator directory
+"""
+
+import ctypes
+import errno
+import os
+import shutil
+import tempfile
+from functions import workspace as workspace_module
+from functions.get_file_content import get_file_content
+from functions.get_files_info import get_files_info
+from functions.workspace import Workspace, close_workspace, get_workspace
+from functions.write_file import write_file
+
+
+class LimitedInotify:
+    """
+    Stands in for libc, failing to add a watch once a number of watches were added
+    """
+
+    def __init__(self, libc, limit, error):
+        self.libc = libc
+        self.limit = limit
+        self.error = error
+        self.watches = 0
+
+    def inotify_add_watch(self, file_descriptor, path, mask):
+        self.watches += 1
+        if self.watches > self.limit:
+            ctypes.set_errno(self.error)
+            return -1
+        return self.libc.inotify_add_watch(file_descriptor, path, mask)
+
+    def inotify_rm_watch(self, file_descriptor, watch):
+        return self.libc.inotify_rm_watch(file_descriptor, watch)
+
+
+def check_fallback(working_directory, error):
+    start_inotify = workspace_module._start_inotify
+    starts = 0
+
+    def start_limited_inotify():
+        nonlocal starts
+        starts += 1
+        started = start_inotify()
+        return started and (LimitedInotify(started[0], 1, error), started[1])
+
+    workspace_module._start_inotify = start_limited_inotify
+    try:
+        workspace = Workspace(working_directory)
+        watching = workspace.is_watching()
+        with open(os.path.join(working_directory, "polled.txt"), "w") as file:
+            file.write("polled")
+        workspace.mark_stale()
+        found = workspace.get_entry(os.path.join(working_directory, "polled.txt")) is not None
+        print(f"watching: {watching}, change found by polling: {found}, watches added again by the rescan: "
+              f"{starts > 1}")
+        os.remove(os.path.join(working_directory, "polled.txt"))
+        workspace.close()
+    finally:
+        workspace_module._start_inotify = start_inotify
+
+
+def main():
+    temp_dir = tempfile.mkdtemp()
+    working_directory = shutil.copytree("calculator", os.path.join(temp_dir, "calculator"))
+    workspace = get_workspace(working_directory)
+
+    print("Expecting the tree to be kept current through inotify on Linux")
+    print(f"watching: {workspace.is_watching()}")
+    print()
+
+    print("Expecting a file created outside the tools to show up in the next listing")
+    os.makedirs(os.path.join(working_directory, "notes"))
+    with open(os.path.join(working_directory, "notes", "todo.txt"), "w") as file:
+        file.write("fix precedence")
+    print(get_files_info(working_directory, "notes"))
+    print()
+
+    print("Expecting a file changed outside the tools to be read again")
+    get_file_content(working_directory, "notes/todo.txt")
+    with open(os.path.join(working_directory, "notes", "todo.txt"), "a") as file:
+        file.write(" and parentheses")
+    print(get_file_content(working_directory, "notes/todo.txt"))
+    print()
+
+    print("Expecting a renamed directory to be listed under its new name only")
+    os.rename(os.path.join(working_directory, "notes"), os.path.join(working_directory, "docs"))
+    print(get_files_info(working_directory, "docs"))
+    print(get_files_info(working_directory, "notes"))
+    print()
+
+    print("Expecting a symlink within the working directory to be followed")
+    os.symlink("docs/todo.txt", os.path.join(working_directory, "todo_link.txt"))
+    print(get_file_content(working_directory, "todo_link.txt"))
+    print()
+
+    print("Expecting symlinks leading outside the working directory to be rejected, for reads and writes")
+    with open(os.path.join(temp_dir, "secret.txt"), "w") as file:
+        file.write("secret")
+    os.symlink("../secret.txt", os.path.join(working_directory, "secret_link.txt"))
+    os.symlink(temp_dir, os.path.join(working_directory, "outside"))
+    print(get_file_content(working_directory, "secret_link.txt"))
+    print(write_file(working_directory, "outside/secret.txt", "overwritten"))
+    print(get_files_info(working_directory, "outside"))
+    print()
+
+    print("Expecting an error for a symlink loop")
+    os.symlink("loop_b", os.path.join(working_directory, "loop_a"))
+    os.symlink("loop_a", os.path.join(working_directory, "loop_b"))
+    print(get_file_content(working_directory, "loop_a"))
+    print()
+
+    print("Expecting a path that climbs above the working directory to be rejected even if it leads back into it")
+    print(f"rejected: {workspace.resolve('../calculator/docs/todo.txt')[0] is None}")
+    print(f"size of docs/../docs/todo.txt: {workspace.resolve('docs/../docs/todo.txt')[1].st_size}")
+    print()
+
+    print("Expecting the tree to be polled for good once out of watches, and when a watch fails for another reason")
+    check_fallback(working_directory, errno.ENOSPC)
+    check_fallback(working_directory, errno.EACCES)
+    print()
+
+    close_workspace(working_directory)
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@
 Tests for write_file.py
 """
 
+import os
+import shutil
+import stat
+import tempfile
 from functions.write_file import write_file
 
 
@@ -18,6 +22,18 @@ def main():
     print(write_file("calculator", "/tmp/temp.txt", "this should not be allowed"))
     print()
 
+    print("Expecting a new file to be created with the process umask applied, as open() would")
+    working_directory = tempfile.mkdtemp()
+    umask = os.umask(0o022)
+    try:
+        write_file(working_directory, "new.txt", "new")
+        mode = stat.S_IMODE(os.stat(os.path.join(working_directory, "new.txt")).st_mode)
+        print(f"mode: {oct(mode)}, no temporary files left: {os.listdir(working_directory) == ['new.txt']}")
+    finally:
+        os.umask(umask)
+        shutil.rmtree(working_directory)
+    print()
+
 
 if __name__ == "__main__":
     main()